@@ -0,0 +1,120 @@
+"""Measure zstd-compressed raw metadata storage on a copy of the database.
+
+Copies data.sqlite to a temp directory (optionally growing it to `--scale`
+rows by cloning the stored search hits under new bvids), then compares plain
+JSON text against dictionary-compressed rows: video_raw payload bytes, file
+size after VACUUM, write throughput (upsert_videos) and read throughput
+(get_raw per video and a full export_json).
+
+Usage: python scripts/bench_codec.py [--db data.sqlite] [--scale 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from bili_scraper.persist import Persist
+
+
+def grow(db_path: str, scale: int):
+    """Clone stored rows under new bvids until the database holds `scale` videos."""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT v.bvid, v.title, v.pubdate, v.url, v.scraped_at, v.hot, r.metadata_json"
+        " FROM videos v JOIN video_raw r ON r.bvid = v.bvid WHERE r.metadata_json IS NOT NULL"
+    ).fetchall()
+    n = len(rows)
+    i = 0
+    while n < scale:
+        bvid, title, pubdate, url, scraped_at, hot, metadata_json = rows[i % len(rows)]
+        new_bvid = f"{bvid[:6]}{i:06d}"
+        metadata = json.loads(metadata_json)
+        raw = metadata.get("raw") or {}
+        raw.update(bvid=new_bvid, aid=(raw.get("aid") or 0) + i, pubdate=pubdate - i, play=(raw.get("play") or 0) + i)
+        conn.execute("INSERT OR IGNORE INTO videos(bvid,title,pubdate,url,scraped_at,hot) VALUES (?,?,?,?,?,?)",
+                     (new_bvid, title, pubdate - i, url.replace(bvid, new_bvid), scraped_at, hot))
+        conn.execute("INSERT OR IGNORE INTO video_raw(bvid, metadata_json) VALUES (?,?)",
+                     (new_bvid, json.dumps(metadata, ensure_ascii=False)))
+        n += 1
+        i += 1
+    conn.commit()
+    conn.close()
+
+
+def payload_stats(db_path: str):
+    conn = sqlite3.connect(db_path)
+    rows, text_bytes, zstd_bytes = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(metadata_json AS BLOB))), 0),"
+        " COALESCE(SUM(LENGTH(metadata_zstd)), 0) FROM video_raw"
+    ).fetchone()
+    dict_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(dict)), 0) FROM raw_dicts").fetchone()[0]
+    conn.execute("VACUUM")
+    conn.close()
+    return rows, text_bytes + zstd_bytes, dict_bytes, os.path.getsize(db_path)
+
+
+async def measure(db_path: str, compress: bool, out_dir: str):
+    persist = Persist(db_path=db_path, compress_raw=compress)
+    await persist.init()
+    try:
+        if compress:
+            if persist._codec.version == 0:
+                await persist.train_raw_dictionary()
+            await persist.recompress_raw()
+        cursor = await persist.conn.execute("SELECT bvid, title, pubdate, url, hot FROM videos")
+        videos = await cursor.fetchall()
+
+        t0 = time.perf_counter()
+        raws = [await persist.get_raw(v[0]) for v in videos]
+        read_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        await persist.export_json(out_path=os.path.join(out_dir, f"export_{compress}.json"), fmt="compact")
+        export_time = time.perf_counter() - t0
+
+        items = [{"bvid": v[0], "title": v[1], "pubdate": v[2], "url": v[3], "hot": v[4], "metadata": {"raw": raw}}
+                 for v, raw in zip(videos, raws)]
+        t0 = time.perf_counter()
+        await persist.upsert_videos(items, int(time.time()))
+        write_time = time.perf_counter() - t0
+    finally:
+        await persist.close()
+    return len(videos), read_time, export_time, write_time
+
+
+async def main(db: str, scale: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "base.sqlite")
+        shutil.copy(db, base)
+        # Migrate the copy to the current schema first
+        persist = Persist(db_path=base)
+        await persist.init()
+        await persist.close()
+        if scale:
+            grow(base, scale)
+        results = {}
+        for name, compress in (("plain", False), ("zstd+dict", True)):
+            path = os.path.join(tmp, f"{name}.sqlite")
+            shutil.copy(base, path)
+            n, read_time, export_time, write_time = await measure(path, compress, tmp)
+            results[name] = payload_stats(path) + (n, read_time, export_time, write_time)
+
+    print(f"{'codec':<10} {'rows':>7} {'raw bytes':>11} {'dict':>7} {'file':>10} "
+          f"{'get_raw/s':>10} {'export/s':>10} {'upsert/s':>10}")
+    for name, (rows, payload, dict_bytes, size, n, read_time, export_time, write_time) in results.items():
+        print(f"{name:<10} {rows:>7} {payload:>11} {dict_bytes:>7} {size:>10} "
+              f"{n / read_time:>10.0f} {n / export_time:>10.0f} {n / write_time:>10.0f}")
+    plain, packed = results["plain"], results["zstd+dict"]
+    print(f"raw payload {plain[1] / max(1, packed[1] + packed[2]):.1f}x smaller (including the dictionary), "
+          f"file {plain[3] / packed[3]:.1f}x smaller")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default='data.sqlite')
+    parser.add_argument('--scale', type=int, default=0, help="grow the copy to this many videos")
+    args = parser.parse_args()
+    asyncio.run(main(args.db, args.scale))
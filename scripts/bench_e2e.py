@@ -0,0 +1,139 @@
+"""End-to-end crawl benchmark against the local stub server.
+
+Runs perform_scrape once per (keyword count, page depth) pair, each in a fresh
+child process and throwaway project directory, against StubSearchServer
+serving synthetic pages or replaying a recorded corpus (`python -m
+bili_scraper.run --record DIR`). Reports wall time, requests/sec, items/sec,
+the child's peak RSS and DB write throughput (from the run's run_metrics).
+
+--save writes the results as JSON; --compare prints the items/sec change
+against such a file, so a slower build shows up before it ships.
+
+Usage: python scripts/bench_e2e.py [--keywords 5,20] [--pages 2,5] [--corpus DIR]
+           [--latency 0.01] [--error-rate 0] [--throttle-rate 0] [--save out.json] [--compare base.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from bili_scraper.corpus import ResponseCorpus
+from bili_scraper.stub_server import StubSearchServer
+from subprocess_env import child_env
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+async def child(args):
+    """Run one scrape in the current directory and print its measurements as JSON."""
+    from bili_scraper.persist import Persist
+    from bili_scraper.service import perform_scrape
+
+    t0 = time.perf_counter()
+    result = await perform_scrape(keywords_file="keywords.txt", db_path="data.sqlite", out_path="results.json",
+                                  rate_limit=args.rate_limit, incremental=False, search_url=args.search_url,
+                                  concurrency=args.concurrency, use_cache=False)
+    elapsed = time.perf_counter() - t0
+
+    persist = Persist(db_path="data.sqlite")
+    await persist.init()
+    try:
+        series = await persist.load_run_metrics(result["run_id"])
+    finally:
+        await persist.close()
+    rows = sum(r["value"] for r in series if r["name"] == "db_rows_written_total")
+    write_seconds = sum(r["histogram"]["sum"] for r in series if r["name"] == "db_write_seconds")
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+    print(json.dumps({"wall": elapsed, "items": result["processed"], "db_rows": rows,
+                      "db_seconds": write_seconds, "peak_rss_mb": peak_rss}))
+
+
+async def run_case(server: StubSearchServer, keywords, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "keywords.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(keywords))
+        before = server.stats["requests"]
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--child", "--search-url", server.url,
+            "--rate-limit", str(args.rate_limit), "--concurrency", str(args.concurrency),
+            cwd=tmp, env=child_env(), stdout=asyncio.subprocess.PIPE,
+        )
+        out, _ = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark child exited with {proc.returncode}")
+        result = json.loads(out.decode().strip().splitlines()[-1])
+    result["requests"] = server.stats["requests"] - before
+    return result
+
+
+def report_line(name: str, r: dict) -> str:
+    rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "n/a"
+    db_rate = r["db_rows"] / r["db_seconds"] if r["db_seconds"] else 0
+    return (f"{name:<12} {r['wall']:>8.2f} {r['requests']:>7} {r['requests'] / r['wall']:>8.1f} "
+            f"{r['items']:>7} {r['items'] / r['wall']:>9.0f} {rss:>8} {db_rate:>10.0f}")
+
+
+async def main(args):
+    corpus = ResponseCorpus(args.corpus) if args.corpus else None
+    recorded = corpus.keywords() if corpus else []
+    if corpus and not recorded:
+        raise SystemExit(f"No recorded pages in {args.corpus}")
+    # Replayed keywords are as deep as they were recorded
+    depths = [None] if corpus else [int(p) for p in args.pages.split(",")]
+    server = StubSearchServer(latency=args.latency, error_rate=args.error_rate,
+                              throttle_rate=args.throttle_rate, corpus=corpus)
+    results = {}
+    async with server:
+        for count in (int(k) for k in args.keywords.split(",")):
+            keywords = recorded[:count] if corpus else [f"kw{i}" for i in range(count)]
+            for depth in depths:
+                server.total_pages = depth or 0
+                name = f"{len(keywords)}x{depth or 'rec'}"
+                runs = [await run_case(server, keywords, args) for _ in range(args.repeat)]
+                results[name] = sorted(runs, key=lambda r: r["wall"])[len(runs) // 2]
+                print(f"{name}: {results[name]['items']} items in {results[name]['wall']:.2f}s", file=sys.stderr)
+
+    print(f"{'case':<12} {'wall s':>8} {'reqs':>7} {'req/s':>8} {'items':>7} {'items/s':>9} "
+          f"{'rss MB':>8} {'db rows/s':>10}")
+    for name, r in results.items():
+        print(report_line(name, r))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("items/s against", args.compare)
+        for name, r in results.items():
+            if name in baseline:
+                old = baseline[name]["items"] / baseline[name]["wall"]
+                new = r["items"] / r["wall"]
+                print(f"  {name:<12} {old:>9.0f} -> {new:>9.0f}  ({(new - old) / old:+.1%})")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keywords', default="5,20", help="comma-separated keyword counts")
+    parser.add_argument('--pages', default="2,5", help="comma-separated page depths (synthetic pages only)")
+    parser.add_argument('--corpus', help="replay recorded pages from this directory instead")
+    parser.add_argument('--latency', type=float, default=0.01, help="stub server latency per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument('--rate-limit', type=float, default=200, help="initial crawler requests/sec")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=1, help="runs per case; the median is reported")
+    parser.add_argument('--save', help="write results to this JSON file")
+    parser.add_argument('--compare', help="compare items/sec with a file written by --save")
+    parser.add_argument('--child', action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument('--search-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child(args))
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,121 @@
+"""Benchmark search-page item extraction (items/sec).
+
+Compares the previous per-item path (an awaited coroutine per hit, uncached
+multi-regex parse_count, item dict copied into a second result dict) with
+crawler.extract_page. The corpus is the raw search hits stored in
+output/results.json, cut into pages of 20, plus `--synthetic` stub-server pages
+whose play counts are strings such as "12.3万"; it is replayed `--repeat` times.
+
+Usage: python scripts/bench_extract.py [--results output/results.json] [--synthetic 50] [--repeat 1000]
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from bili_scraper import crawler
+from bili_scraper.crawler import VIDEO_FIELDS, extract_page, parse_duration
+from bili_scraper.stub_server import synthetic_page
+
+PAGE_SIZE = 20
+
+
+def load_pages(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        videos = json.load(f)
+    hits = [v["metadata"]["raw"] for v in videos if (v.get("metadata") or {}).get("raw")]
+    return [hits[i:i + PAGE_SIZE] for i in range(0, len(hits), PAGE_SIZE)]
+
+
+def legacy_parse_count(val) -> int:
+    if val is None:
+        return 0
+    if isinstance(val, (int, float)):
+        return int(val)
+    s = str(val).strip()
+    if not s:
+        return 0
+    s = s.replace(',', '').rstrip('+')
+    try:
+        if '亿' in s:
+            m = re.search(r'[0-9]+(?:\.[0-9]+)?', s)
+            return int(float(m.group(0)) * 100000000) if m else 0
+        if '万' in s:
+            m = re.search(r'[0-9]+(?:\.[0-9]+)?', s)
+            return int(float(m.group(0)) * 10000) if m else 0
+        return int(float(s))
+    except Exception:
+        m = re.search(r'[0-9]+(?:\.[0-9]+)?', s)
+        return int(float(m.group(0))) if m else 0
+
+
+async def legacy_extract_item(raw):
+    play = raw.get("play") or raw.get("playcount")
+    if play is None:
+        stat = raw.get("stat") or {}
+        play = stat.get("view") or stat.get("play")
+    mid = raw.get("mid")
+    fields = {
+        "description": raw.get("description") or raw.get("desc") or "",
+        "author": raw.get("author") or None,
+        "mid": mid if isinstance(mid, int) else None,
+        "duration": parse_duration(raw.get("duration")),
+        "play": legacy_parse_count(play),
+        "like": legacy_parse_count(raw.get("like")),
+        "danmaku": legacy_parse_count(raw.get("danmaku") or raw.get("video_review")),
+        "tag": raw.get("tag") or None,
+    }
+    bvid = raw.get("bvid")
+    url = f"https://www.bilibili.com/video/{bvid}" if bvid else raw.get("arcurl")
+    return {"bvid": bvid, "title": raw.get("title") or "", "pubdate": raw.get("pubdate"), "url": url,
+            "hot": fields["play"] or fields["like"], "raw": raw, **fields}
+
+
+async def legacy(pages):
+    n = 0
+    for page in pages:
+        for raw in page:
+            item = await legacy_extract_item(raw)
+            if item["pubdate"] is None or not item["bvid"]:
+                continue
+            # The second dict built for every matched item
+            {"bvid": item["bvid"], "title": item["title"], "pubdate": item["pubdate"], "url": item["url"],
+             "metadata": {"raw": item["raw"]}, "hot": int(item["hot"] or 0),
+             **{name: item[name] for name in VIDEO_FIELDS}}
+            n += 1
+    return n
+
+
+def paged(pages):
+    return sum(len(extract_page(page)) for page in pages)
+
+
+def main(results_path: str, synthetic: int, repeat: int):
+    pages = load_pages(results_path)
+    pages += [synthetic_page("bench", pn, PAGE_SIZE, synthetic) for pn in range(1, synthetic + 1)]
+    pages *= repeat
+    hits = sum(len(p) for p in pages)
+    print(f"corpus: {hits} hits in {len(pages)} pages")
+
+    t0 = time.perf_counter()
+    n = asyncio.run(legacy(pages))
+    legacy_time = time.perf_counter() - t0
+
+    crawler._parse_count_str.cache_clear()
+    t0 = time.perf_counter()
+    m = paged(pages)
+    paged_time = time.perf_counter() - t0
+    assert n == m, (n, m)
+
+    print(f"{'legacy per-item':<18} {n / legacy_time:12.0f} items/s")
+    print(f"{'extract_page':<18} {m / paged_time:12.0f} items/s  ({legacy_time / paged_time:.1f}x)")
+    print(f"count cache: {crawler._parse_count_str.cache_info()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--results', default='output/results.json')
+    parser.add_argument('--synthetic', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.results, args.synthetic, args.repeat)
@@ -0,0 +1,96 @@
+"""Import-time budget for the package's entry points.
+
+Imports each entry module in a fresh interpreter under `python -X importtime`,
+from an empty working directory, and reports the median cumulative import
+time with the slowest imports it pulled in. With --check the script exits
+non-zero when a module goes over its budget, imports a module it is meant to
+leave for later (the crawl stack for the web UI, ...) or leaves files behind
+in the working directory; tests/test_import_budget.py runs it that way, so a
+regression fails the test suite.
+
+Usage: python scripts/bench_import.py [--repeat 7] [--top 8] [--check] [--scale 1.0]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Optional
+from subprocess_env import child_env
+
+# Median cumulative import time allowed per module, in milliseconds
+BUDGETS_MS = {
+    "bili_scraper.utils": 5,
+    "bili_scraper.persist": 60,
+    "bili_scraper.run": 40,
+    "bili_scraper.web": 200,
+    "bili_scraper.service": 200,
+}
+
+# Modules an entry point must not import; they are loaded on the code paths that use them
+DEFERRED = {
+    "bili_scraper.utils": {"asyncio", "aiosqlite"},
+    "bili_scraper.persist": {"aiohttp", "tenacity", "ahocorasick"},
+    "bili_scraper.run": {"aiohttp", "tenacity", "ahocorasick", "aiosqlite", "portalocker"},
+    "bili_scraper.web": {"aiohttp", "tenacity", "ahocorasick", "bili_scraper.service", "bili_scraper.search"},
+}
+
+
+def import_once(module: Optional[str], cwd: str) -> dict:
+    """Import `module` in a new interpreter; returns {name: (self_us, cumulative_us)}."""
+    code = f"import {module}" if module else "pass"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd,
+                          env=child_env(), capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module: str, repeat: int, startup: set) -> dict:
+    with tempfile.TemporaryDirectory() as cwd:
+        runs = [import_once(module, cwd) for _ in range(repeat)]
+        leftovers = sorted(os.listdir(cwd))
+    totals = sorted(run[module][1] for run in runs)
+    # Modules the interpreter loads on its own (site, .pth hooks) are not the module's cost
+    imports = {name: t for name, t in runs[-1].items() if name not in startup}
+    return {"ms": totals[len(totals) // 2] / 1000, "imports": imports, "leftovers": leftovers}
+
+
+def main(args):
+    failures = []
+    with tempfile.TemporaryDirectory() as cwd:
+        startup = set(import_once(None, cwd))
+    for module, budget in BUDGETS_MS.items():
+        result = measure(module, args.repeat, startup)
+        budget *= args.scale
+        status = "ok" if result["ms"] <= budget else "OVER"
+        print(f"{module:<24} {result['ms']:>8.1f} ms  (budget {budget:.0f} ms)  {status}")
+        top = sorted(((cum, name) for name, (_, cum) in result["imports"].items() if name != module), reverse=True)
+        for cum, name in top[:args.top]:
+            print(f"    {cum / 1000:>8.1f} ms  {name}")
+
+        if status != "ok":
+            failures.append(f"{module} took {result['ms']:.1f} ms, over its {budget:.0f} ms budget")
+        early = sorted(DEFERRED.get(module, set()) & set(result["imports"]))
+        if early:
+            failures.append(f"{module} imports {', '.join(early)} at import time")
+        if result["leftovers"]:
+            failures.append(f"importing {module} created {', '.join(result['leftovers'])}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=7, help="imports per module; the median is reported")
+    parser.add_argument('--top', type=int, default=8, help="slowest imports listed per module")
+    parser.add_argument('--check', action="store_true", help="exit with status 1 on any budget failure")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply the budgets (slow CI machines)")
+    main(parser.parse_args())
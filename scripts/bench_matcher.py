@@ -0,0 +1,73 @@
+"""Microbenchmark keyword matching cost per item.
+
+Compares the old path (one asyncio.to_thread hop per title/description) with
+page-sized match_many calls, with and without the normalized-text cache.
+Texts come from output/results.json; every page is seen once per keyword to
+mimic overlapping search results.
+
+Usage: python scripts/bench_matcher.py [--results output/results.json] [--keywords 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+from bili_scraper.keywords import KeywordMatcher
+
+PAGE_SIZE = 20
+
+
+def load_texts(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        videos = json.load(f)
+    texts = []
+    for v in videos:
+        raw = v.get("metadata", {}).get("raw", {})
+        texts.append(v.get("title") or "")
+        texts.append(raw.get("description") or raw.get("desc") or "")
+    return texts
+
+
+def load_keywords(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def legacy(matcher: KeywordMatcher, pages):
+    for page in pages:
+        for text in page:
+            if text:
+                await asyncio.to_thread(matcher._match_sync, text)
+
+
+async def batched(matcher: KeywordMatcher, pages):
+    for page in pages:
+        await matcher.match_many(page)
+
+
+async def main(results_path: str, keywords_path: str, repeat: int):
+    texts = load_texts(results_path)
+    keywords = load_keywords(keywords_path)
+    pages = [texts[i:i + 2 * PAGE_SIZE] for i in range(0, len(texts), 2 * PAGE_SIZE)] * repeat
+    n = sum(len(p) for p in pages)
+
+    cases = [
+        ("to_thread per text", legacy, KeywordMatcher(keywords, cache_size=0)),
+        ("match_many, no cache", batched, KeywordMatcher(keywords, cache_size=0)),
+        ("match_many, cached", batched, KeywordMatcher(keywords)),
+    ]
+    print(f"{n} texts ({len(texts)} unique), {len(keywords)} keywords")
+    for name, fn, matcher in cases:
+        t0 = time.perf_counter()
+        await fn(matcher, pages)
+        elapsed = time.perf_counter() - t0
+        print(f"{name:<22} {elapsed / n * 1e6:8.2f} us/item")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--results', default='output/results.json')
+    parser.add_argument('--keywords-file', default='config/keywords.txt')
+    parser.add_argument('--keywords', type=int, default=50,
+                        help='number of search keywords each page is seen under')
+    args = parser.parse_args()
+    asyncio.run(main(args.results, args.keywords_file, args.keywords))
@@ -0,0 +1,82 @@
+"""Measure how long a fresh process takes to get a KeywordMatcher ready.
+
+For each keyword count a synthetic keywords file is written and loaded by
+KeywordMatcher.from_file in a new child process twice: cold (empty matcher
+cache, so the automaton is compiled and saved) and warm (loaded from the
+pickle the cold run wrote). Reports the load time, the child's total wall
+time including interpreter startup and imports, and the cache file size.
+
+Usage: python scripts/bench_matcher_startup.py [--keywords 1000,10000,100000] [--repeat 3]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+CHARS = "abcdefghijklmnopqrstuvwxyz0123456789游戏音乐动画科技生活美食舞蹈知识鬼畜影视数码"
+
+
+def write_keywords(path: str, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(count):
+            f.write("".join(rng.choices(CHARS, k=rng.randint(2, 8))) + "\n")
+
+
+def child(args):
+    t0 = time.perf_counter()
+    from bili_scraper.keywords import KeywordMatcher
+    t1 = time.perf_counter()
+    matcher = KeywordMatcher.from_file(args.keywords_file, cache_dir=args.cache_dir)
+    t2 = time.perf_counter()
+    print(json.dumps({"import": t1 - t0, "load": t2 - t1, "keywords": len(matcher.keywords)}))
+
+
+def run_child(keywords_file: str, cache_dir: str) -> dict:
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--keywords-file", keywords_file,
+                          "--cache-dir", cache_dir], check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - t0
+    return result
+
+
+def median(runs, key):
+    values = sorted(r[key] for r in runs)
+    return values[len(values) // 2]
+
+
+def main(args):
+    print(f"{'keywords':>9} {'mode':<5} {'load ms':>9} {'process ms':>11} {'cache MB':>9}")
+    for count in (int(k) for k in args.keywords.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            keywords_file = os.path.join(tmp, "keywords.txt")
+            write_keywords(keywords_file, count)
+            cold, warm = [], []
+            for i in range(args.repeat):
+                cache_dir = os.path.join(tmp, f"cache{i}")
+                cold.append(run_child(keywords_file, cache_dir))
+                warm.append(run_child(keywords_file, cache_dir))
+            size = sum(os.path.getsize(p) for p in glob.glob(os.path.join(tmp, "cache0", "*.matcher")))
+            for mode, runs in (("cold", cold), ("warm", warm)):
+                print(f"{count:>9} {mode:<5} {median(runs, 'load') * 1000:>9.1f} "
+                      f"{median(runs, 'process') * 1000:>11.1f} {size / 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keywords', default="1000,10000,100000", help="comma-separated keyword counts")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the median is reported")
+    parser.add_argument('--child', action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument('--keywords-file', help=argparse.SUPPRESS)
+    parser.add_argument('--cache-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+    else:
+        main(args)
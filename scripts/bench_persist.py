@@ -0,0 +1,71 @@
+"""Benchmark video persistence: per-row upsert_video vs batched upsert_videos.
+
+Usage: python scripts/bench_persist.py [--sizes 1000 10000 100000] [--legacy-max 10000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from bili_scraper.persist import Persist
+
+
+def synthetic_items(n: int):
+    for i in range(n):
+        bvid = f"BV{i:010d}"
+        yield {
+            "bvid": bvid,
+            "title": f"测试视频 <em class=\"keyword\">{i}</em>",
+            "pubdate": 1700000000 + i,
+            "url": f"https://www.bilibili.com/video/{bvid}",
+            "matches": ["测试"],
+            "metadata": {"raw": {"bvid": bvid, "description": "synthetic " * 20, "play": i}},
+            "hot": i,
+        }
+
+
+async def bench_legacy(db_path: str, n: int) -> float:
+    persist = Persist(db_path=db_path)
+    await persist.init()
+    # Reproduce the connection settings of the old commit-per-video path
+    await persist.conn.execute("PRAGMA journal_mode=DELETE")
+    await persist.conn.execute("PRAGMA synchronous=FULL")
+    t0 = time.perf_counter()
+    for item in synthetic_items(n):
+        await persist.upsert_video(item, 1700000000)
+    elapsed = time.perf_counter() - t0
+    await persist.close()
+    return elapsed
+
+
+async def bench_batched(db_path: str, n: int, batch_size: int) -> float:
+    persist = Persist(db_path=db_path)
+    await persist.init()
+    t0 = time.perf_counter()
+    await persist.upsert_videos(synthetic_items(n), 1700000000, batch_size=batch_size)
+    elapsed = time.perf_counter() - t0
+    await persist.close()
+    return elapsed
+
+
+async def main(sizes, legacy_max: int, batch_size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'rows':>8} {'legacy rows/s':>15} {'batched rows/s':>15} {'speedup':>8}")
+        for n in sizes:
+            legacy = None
+            if n <= legacy_max:
+                legacy = await bench_legacy(os.path.join(tmp, f"legacy_{n}.sqlite"), n)
+            batched = await bench_batched(os.path.join(tmp, f"batched_{n}.sqlite"), n, batch_size)
+            legacy_rate = f"{n / legacy:15.0f}" if legacy else f"{'skipped':>15}"
+            speedup = f"{legacy / batched:7.1f}x" if legacy else f"{'-':>8}"
+            print(f"{n:>8} {legacy_rate} {n / batched:15.0f} {speedup}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='skip the per-row path for sizes above this (it fsyncs every row)')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.legacy_max, args.batch_size))
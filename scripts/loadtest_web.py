@@ -0,0 +1,97 @@
+"""Measure web index latency (p50/p99) against synthetic databases.
+
+Builds a throwaway project directory per size with N synthetic videos, then
+requests `/` through the ASGI app in-process (requires httpx): first pages,
+plus pages at random depths reached through keyset cursors, from
+`--concurrency` clients at once.
+
+Usage: python scripts/loadtest_web.py [--sizes 10000 1000000] [--requests 200] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+
+def populate(db_path: str, n: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS videos (bvid TEXT PRIMARY KEY, title TEXT, pubdate INTEGER,"
+        " url TEXT, scraped_at INTEGER, hot INTEGER DEFAULT 0)"
+    )
+    rnd = random.Random(0)
+    batch = []
+    for i in range(n):
+        bvid = f"BV{i:010d}"
+        batch.append((bvid, f"视频标题 <em class=\"keyword\">{i}</em>", 1700000000 + i,
+                      f"https://www.bilibili.com/video/{bvid}",
+                      1700000000 + rnd.randrange(4) * 604800, rnd.randrange(10**7)))
+        if len(batch) >= 50000:
+            conn.executemany("INSERT INTO videos VALUES (?,?,?,?,?,?)", batch)
+            batch = []
+    conn.executemany("INSERT INTO videos VALUES (?,?,?,?,?,?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+async def measure(app, cursors, requests: int, concurrency: int):
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    first, deep = [], []
+
+    async def client_loop(client, n):
+        for i in range(n):
+            for samples, params in ((first, {}), (deep, {"after": random.choice(cursors)})):
+                t0 = time.perf_counter()
+                resp = await client.get("/", params=params)
+                samples.append((time.perf_counter() - t0) * 1000)
+                resp.raise_for_status()
+
+    # ASGITransport does not send lifespan events; run the app's lifespan (connection pool) here
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            (await client.get("/")).raise_for_status()
+            t0 = time.perf_counter()
+            await asyncio.gather(*(client_loop(client, requests // concurrency) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - t0
+    return first, deep, (len(first) + len(deep)) / elapsed
+
+
+def main(sizes, requests: int, concurrency: int):
+    print(f"{'rows':>9} {'first p50':>10} {'first p99':>10} {'deep p50':>10} {'deep p99':>10}  (ms) {'req/s':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            # settings resolve relative to the working directory on first use, when the app starts
+            os.chdir(tmp)
+            populate(os.path.join(tmp, "data.sqlite"), n)
+            conn = sqlite3.connect(os.path.join(tmp, "data.sqlite"))
+            sample = conn.execute(
+                "SELECT hot, scraped_at, bvid FROM videos ORDER BY RANDOM() LIMIT 100").fetchall()
+            conn.close()
+            cursors = [f"{hot}:{scraped_at}:{bvid}" for hot, scraped_at, bvid in sample]
+            for name in [m for m in sys.modules if m.startswith("bili_scraper")]:
+                del sys.modules[name]
+            from bili_scraper.web import app
+            first, deep, rate = asyncio.run(measure(app, cursors, requests, concurrency))
+            os.chdir("/")
+        print(f"{n:>9} {percentile(first, 50):10.2f} {percentile(first, 99):10.2f} "
+              f"{percentile(deep, 50):10.2f} {percentile(deep, 99):10.2f}       {rate:8.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8, help="clients sending requests at once")
+    args = parser.parse_args()
+    main(args.sizes, args.requests, max(1, args.concurrency))
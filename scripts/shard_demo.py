@@ -0,0 +1,83 @@
+"""Run a sharded crawl locally: one coordinator and N worker processes against the stub server.
+
+Everything happens in a throwaway project directory. The stub search server
+runs in this process; the coordinator and workers are separate
+`python -m bili_scraper.run` processes sharing one data.sqlite. With
+--kill-after, one worker is killed mid-run to show its keywords being taken
+over once their leases expire.
+
+Usage: python scripts/shard_demo.py [--workers 3] [--keywords 30] [--pages 5] [--kill-after 3]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+from bili_scraper.stub_server import StubSearchServer
+from subprocess_env import child_env
+
+
+async def spawn(args, cwd: str, *extra: str):
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "bili_scraper.run", "--no-cache", *extra,
+        cwd=cwd, env=child_env(), stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "keywords.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(f"kw{i}" for i in range(args.keywords)))
+        async with StubSearchServer(total_pages=args.pages, latency=args.latency) as server:
+            t0 = time.perf_counter()
+            coordinator = await spawn(args, tmp, "--mode", "coordinator", "--keywords", "keywords.txt", "--full")
+            workers = [
+                await spawn(args, tmp, "--mode", "worker", "--search-url", server.url,
+                            "--rate-limit", str(args.rate_limit), "--concurrency", str(args.slots),
+                            "--lease", str(args.lease))
+                for _ in range(args.workers)
+            ]
+            if args.kill_after:
+                await asyncio.sleep(args.kill_after)
+                print(f"killing worker pid {workers[0].pid}")
+                workers[0].send_signal(signal.SIGKILL)
+            codes = await asyncio.gather(coordinator.wait(), *(w.wait() for w in workers))
+            elapsed = time.perf_counter() - t0
+
+        conn = sqlite3.connect(os.path.join(tmp, "data.sqlite"))
+        run = conn.execute("SELECT id, status, processed_count, errors FROM scrape_runs ORDER BY id DESC LIMIT 1").fetchone()
+        owners = conn.execute(
+            "SELECT owner, COUNT(*), SUM(processed) FROM work_items WHERE run_id = ? GROUP BY owner", (run[0],)
+        ).fetchall()
+        retried = conn.execute("SELECT COUNT(*) FROM work_items WHERE run_id = ? AND attempts > 1", (run[0],)).fetchone()[0]
+        videos = conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        # Each worker adds its counters to the run's run_metrics rows
+        written = conn.execute(
+            "SELECT value FROM run_metrics WHERE run_id = ? AND name = 'db_rows_written_total'", (run[0],)
+        ).fetchone()
+        conn.close()
+
+    expected = args.keywords * args.pages * 20
+    print(f"exit codes: coordinator={codes[0]} workers={codes[1:]}")
+    print(f"wall time {elapsed:.1f}s, server {dict(server.stats)}")
+    print(f"run {run[0]}: status={run[1]} processed={run[2]} errors={run[3]!r}")
+    print(f"videos stored {videos} (expected {expected}), keywords re-claimed after lease expiry: {retried}")
+    print(f"rows written by all workers (run_metrics): {written[0] if written else 0:.0f}")
+    for owner, n, processed in owners:
+        print(f"  {owner}: {n} keywords, {processed or 0} videos")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--slots', type=int, default=2, help="keywords crawled at a time per worker")
+    parser.add_argument('--keywords', type=int, default=30)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub server latency per request")
+    parser.add_argument('--rate-limit', type=float, default=10)
+    parser.add_argument('--lease', type=float, default=6)
+    parser.add_argument('--kill-after', type=float, default=0, help="kill one worker after this many seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,11 @@
+"""Environment for the processes the scripts start (bili_scraper.run workers, python -X importtime)."""
+import os
+import bili_scraper
+
+
+def child_env() -> dict:
+    """A copy of os.environ that puts the bili_scraper being benchmarked first on PYTHONPATH."""
+    env = dict(os.environ)
+    src = os.path.dirname(os.path.dirname(os.path.abspath(bili_scraper.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (src, env.get("PYTHONPATH")) if p)
+    return env
@@ -0,0 +1,56 @@
+"""Exercise the adaptive rate limiter against a throttling stub server.
+
+Starts bili_scraper.stub_server with a fixed allowed rate and sends search
+requests through BiliSearchClient, once with the limiter pinned at its start
+rate and once adaptive, then reports throughput and throttle counts.
+
+Usage: python scripts/throttle_harness.py [--allowed-rate 6] [--requests 120] [--mode 429|412]
+"""
+import argparse
+import asyncio
+import time
+import aiohttp
+from bili_scraper.ratelimit import AdaptiveLimiter
+from bili_scraper.search import BiliSearchClient
+from bili_scraper.stub_server import StubSearchServer
+
+
+async def run_case(name: str, limiter: AdaptiveLimiter, args):
+    server = StubSearchServer(total_pages=10**6, allowed_rate=args.allowed_rate,
+                              throttle_mode=args.mode, retry_after=args.retry_after,
+                              error_rate=args.error_rate)
+    async with server, aiohttp.ClientSession() as session:
+        client = BiliSearchClient(session=session, limiter=limiter, search_url=server.url)
+        failed = 0
+        t0 = time.perf_counter()
+
+        async def one(i):
+            nonlocal failed
+            try:
+                await client.search_videos(keyword=f"kw{i % 7}", pn=i + 1)
+            except Exception:
+                failed += 1
+
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - t0
+    snap = limiter.snapshot()
+    print(f"{name:<8} {args.requests / elapsed:7.2f} req/s  server={dict(server.stats)}  "
+          f"failed={failed}  rate={snap['current_rate']}  throttles={snap['throttle_by_reason']}")
+
+
+async def main(args):
+    print(f"server allows {args.allowed_rate} req/s ({args.mode} when exceeded)")
+    await run_case("fixed", AdaptiveLimiter(rate=args.start_rate, min_rate=args.start_rate,
+                                            max_rate=args.start_rate), args)
+    await run_case("adaptive", AdaptiveLimiter(rate=args.start_rate), args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--allowed-rate', type=float, default=6)
+    parser.add_argument('--start-rate', type=float, default=2)
+    parser.add_argument('--requests', type=int, default=120)
+    parser.add_argument('--mode', choices=['429', '412'], default='429')
+    parser.add_argument('--retry-after', type=float, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,133 @@
+"""On-disk cache of search API responses."""
+import hashlib
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+import aiosqlite
+from .utils import DEFAULT_CACHE_TTL, DEFAULT_CACHE_MAX_ENTRIES, settings
+
+_CREATE_CACHE = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    body TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL,
+    last_access REAL
+)
+"""
+
+_CREATE_CACHE_INDEX = "CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache(last_access)"
+
+
+class CacheEntry:
+    def __init__(self, data: Dict[str, Any], etag: Optional[str], last_modified: Optional[str], fresh: bool):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+
+class ResponseCache:
+    """SQLite-backed response cache with a TTL and size-bounded LRU eviction.
+
+    Entries younger than `ttl` seconds are served without touching the network.
+    Older entries are kept so the client can revalidate them with
+    If-None-Match / If-Modified-Since. Once more than `max_entries` are stored,
+    the least recently used ones are evicted.
+
+    BiliSearchClient accepts any object with the same get/put/refresh/stats
+    methods, so other stores can be plugged in.
+    """
+
+    def __init__(self, path: str = None, ttl: int = None, max_entries: int = None):
+        self.path = path or settings().cache_path
+        self.ttl = DEFAULT_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or DEFAULT_CACHE_MAX_ENTRIES
+        self.counters = Counter()
+        self.conn = None
+        self._size = 0
+
+    async def open(self):
+        self.conn = await aiosqlite.connect(self.path)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA synchronous=NORMAL")
+        await self.conn.execute(_CREATE_CACHE)
+        await self.conn.execute(_CREATE_CACHE_INDEX)
+        await self.conn.commit()
+        cursor = await self.conn.execute("SELECT COUNT(*) FROM response_cache")
+        self._size = (await cursor.fetchone())[0]
+
+    async def close(self):
+        if self.conn:
+            await self.conn.close()
+            self.conn = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @staticmethod
+    def key(url: str, params: Dict[str, Any]) -> str:
+        """Cache key from the URL and normalized (sorted, stringified) query parameters."""
+        normalized = sorted((str(k), str(v).strip()) for k, v in params.items())
+        raw = json.dumps([url, normalized], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        cursor = await self.conn.execute(
+            "SELECT body, etag, last_modified, stored_at FROM response_cache WHERE key = ?", (key,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            self.counters["misses"] += 1
+            return None
+        now = time.time()
+        await self.conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        await self.conn.commit()
+        fresh = now - row[3] < self.ttl
+        self.counters["hits" if fresh else "stale"] += 1
+        return CacheEntry(json.loads(row[0]), row[1], row[2], fresh)
+
+    async def put(self, key: str, data: Dict[str, Any], etag: str = None, last_modified: str = None):
+        now = time.time()
+        await self.conn.execute(
+            "INSERT OR REPLACE INTO response_cache(key, body, etag, last_modified, stored_at, last_access)"
+            " VALUES (?,?,?,?,?,?)",
+            (key, json.dumps(data, ensure_ascii=False), etag, last_modified, now, now),
+        )
+        # Replacing an existing key overcounts; _evict recounts exactly
+        self._size += 1
+        self.counters["stores"] += 1
+        if self._size > self.max_entries:
+            await self._evict()
+        await self.conn.commit()
+
+    async def refresh(self, key: str):
+        """Mark a stale entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        await self.conn.execute(
+            "UPDATE response_cache SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key)
+        )
+        await self.conn.commit()
+        self.counters["revalidated"] += 1
+
+    async def _evict(self):
+        """Drop least recently used entries beyond `max_entries`."""
+        cursor = await self.conn.execute("SELECT COUNT(*) FROM response_cache")
+        self._size = (await cursor.fetchone())[0]
+        excess = self._size - self.max_entries
+        if excess > 0:
+            await self.conn.execute(
+                "DELETE FROM response_cache WHERE key IN"
+                " (SELECT key FROM response_cache ORDER BY last_access LIMIT ?)", (excess,)
+            )
+            self._size -= excess
+            self.counters["evictions"] += excess
+
+    def stats(self) -> Dict[str, int]:
+        return {name: self.counters[name] for name in ("hits", "misses", "stale", "revalidated", "stores", "evictions")}
@@ -0,0 +1,63 @@
+"""Optional zstd compression of raw search-hit metadata.
+
+Search hits share most of their bytes (the same keys, the same highlight
+markup), so a dictionary trained on stored rows compresses them far better
+than zstd alone. Dictionaries are versioned: every compressed row records
+the version it was written with and all versions stay readable.
+
+`zstandard` is an optional dependency; without it rows are stored as JSON text.
+"""
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+from .utils import ZSTD_LEVEL
+
+# Version of rows compressed without a dictionary (before one has been trained)
+NO_DICTIONARY = 0
+
+
+def available() -> bool:
+    return zstandard is not None
+
+
+def train_dictionary(samples: List[bytes], dict_size: int) -> bytes:
+    """Train a zstd dictionary of at most `dict_size` bytes from sample blobs."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is not installed")
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+class RawCodec:
+    """Compresses JSON text with the newest dictionary and decompresses any known version."""
+
+    def __init__(self, level: int = None):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required for compressed raw metadata")
+        self.level = ZSTD_LEVEL if level is None else level
+        self.version = NO_DICTIONARY
+        self._dicts: Dict[int, Optional["zstandard.ZstdCompressionDict"]] = {NO_DICTIONARY: None}
+        self._compressor = zstandard.ZstdCompressor(level=self.level)
+        self._decompressors = {}
+
+    def add_dictionary(self, version: int, data: bytes):
+        self._dicts[version] = zstandard.ZstdCompressionDict(data)
+        if version > self.version:
+            self.version = version
+            self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self._dicts[version])
+
+    def compress(self, text: str) -> Tuple[bytes, int]:
+        return self._compressor.compress(text.encode("utf-8")), self.version
+
+    def decompress(self, blob: bytes, version: int) -> str:
+        decompressor = self._decompressors.get(version)
+        if decompressor is None:
+            if version not in self._dicts:
+                raise ValueError(f"Unknown raw metadata dictionary version {version}")
+            dict_data = self._dicts[version]
+            decompressor = zstandard.ZstdDecompressor(dict_data=dict_data) if dict_data else zstandard.ZstdDecompressor()
+            self._decompressors[version] = decompressor
+        return decompressor.decompress(blob).decode("utf-8")
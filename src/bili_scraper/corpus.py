@@ -0,0 +1,53 @@
+"""Recorded search responses for offline replay.
+
+A corpus is a directory with one JSON file per (keyword, page) holding the
+decoded API response exactly as BiliSearchClient returned it. Runs started
+with `--record DIR` fill it; `StubSearchServer(corpus=...)` serves it back so
+crawls can be benchmarked without touching api.bilibili.com.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+from .utils import atomic_write
+
+
+class ResponseCorpus:
+    def __init__(self, path: str):
+        self.path = path
+
+    def _file(self, keyword: str, pn: int) -> str:
+        digest = hashlib.sha1(keyword.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.path, f"{digest}_{pn:04d}.json")
+
+    def save(self, keyword: str, pn: int, ps: int, data: Dict[str, Any]):
+        """Record one response page; a page recorded again replaces the old copy."""
+        with atomic_write(self._file(keyword, pn)) as f:
+            json.dump({"keyword": keyword, "pn": pn, "ps": ps, "data": data}, f, ensure_ascii=False)
+
+    def load(self, keyword: str, pn: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file(keyword, pn), "r", encoding="utf-8") as f:
+                return json.load(f)["data"]
+        except FileNotFoundError:
+            return None
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.isdir(self.path):
+            return
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                    yield json.load(f)
+
+    def keywords(self) -> List[str]:
+        """Recorded keywords, most pages first."""
+        pages = {}
+        for entry in self.entries():
+            pages[entry["keyword"]] = pages.get(entry["keyword"], 0) + 1
+        return sorted(pages, key=lambda kw: (-pages[kw], kw))
+
+    def __len__(self) -> int:
+        if not os.path.isdir(self.path):
+            return 0
+        return sum(1 for name in os.listdir(self.path) if name.endswith(".json"))
@@ -1,17 +1,145 @@
 import asyncio
+import functools
 import re
 import logging
-from typing import List, Dict, Any
-from .search import BiliSearchClient
+from typing import TYPE_CHECKING, List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Set, Tuple
 from .keywords import KeywordMatcher
-from .utils import DEFAULT_PAGE_SIZE, DEFAULT_MAX_PAGES
+from .events import EventBus
+from .metrics import RunMetrics
+from .utils import (DEFAULT_PAGE_SIZE, DEFAULT_MAX_PAGES, DEFAULT_MIN_PAGES, DEFAULT_BATCH_SIZE,
+                    DEFAULT_QUEUE_SIZE, DEFAULT_FLUSH_INTERVAL, DEFAULT_WATERMARK_OVERLAP,
+                    DEFAULT_CONCURRENCY, DEFAULT_COUNT_CACHE_SIZE)
+
+if TYPE_CHECKING:  # aiohttp is only needed once a crawl starts
+    from .search import BiliSearchClient
 
 logger = logging.getLogger(__name__)
 
+# Sentinel put on the item queue once every keyword producer has finished
+_DONE = object()
+
+
+class _Checkpoint:
+    """Queue marker: every item a keyword yielded before this point has been queued."""
+
+    def __init__(self, snapshot: Dict[str, Any]):
+        self.snapshot = snapshot
+
+
+def page_budgets(stats: Dict[str, Tuple[int, int]], max_pages: int,
+                 min_pages: int = DEFAULT_MIN_PAGES) -> Dict[str, int]:
+    """Give keywords with higher historical match rates more pages.
+
+    `stats` maps keyword -> (results seen, results matched) from the last run.
+    The best keyword gets `max_pages`, others scale down to `min_pages`;
+    keywords without history are not listed and keep the full budget.
+    """
+    rates = {kw: matched / seen for kw, (seen, matched) in stats.items() if seen}
+    best = max(rates.values(), default=0)
+    if best <= 0:
+        return {kw: min_pages for kw in rates}
+    min_pages = min(min_pages, max_pages)
+    return {kw: min_pages + round((max_pages - min_pages) * rate / best) for kw, rate in rates.items()}
+
+
+class SeenIndex:
+    """Run-wide record of the videos already sent to extraction, of those that matched
+    and of the search keywords that surfaced each one.
+
+    Overlapping keywords return many of the same hits; only the first sighting
+    of a bvid is extracted and matched, later ones count as matched for their
+    keyword if the first sighting matched. Every keyword that surfaced a video
+    is kept in `sources`, so a matched video is attributed to all of them
+    (see Persist.save_video_sources) and not just to the one that got it first.
+    """
+
+    def __init__(self):
+        self.extracted = set()
+        self.matched = set()
+        self.sources: Dict[str, Set[str]] = {}
+
+    def first_sighting(self, bvid: str, keyword: str) -> bool:
+        """Record that `keyword` surfaced `bvid`; True the first time any keyword does."""
+        self.sources.setdefault(bvid, set()).add(keyword)
+        if bvid in self.extracted:
+            return False
+        self.extracted.add(bvid)
+        return True
+
+    def matched_sources(self) -> Dict[str, Set[str]]:
+        """The search keywords that surfaced each matched video."""
+        return {bvid: self.sources[bvid] for bvid in self.matched}
+
+
+class _KeywordState:
+    """Paging cursor and counters for one search keyword."""
+
+    def __init__(self, keyword: str, budget: int, cutoff: Optional[int]):
+        self.keyword = keyword
+        self.budget = budget
+        self.cutoff = cutoff
+        self.pn = 1
+        self.seen_bvid = set()
+        self.results = 0
+        self.matched = 0
+        self.newest = None
+        self.done = False
+
+    @property
+    def priority(self) -> float:
+        # Fraction of the page budget used so far; the scheduler serves the lowest first
+        return (self.pn - 1) / self.budget
+
+    def summary(self) -> Dict[str, Any]:
+        return {"pages": self.pn - 1, "budget": self.budget, "results": self.results,
+                "matched": self.matched, "done": self.done}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything needed to continue this keyword in a later process."""
+        newest_pubdate, newest_bvid = self.newest or (None, None)
+        return {"keyword": self.keyword, "pn": self.pn, "newest_pubdate": newest_pubdate,
+                "newest_bvid": newest_bvid, "results": self.results, "matched": self.matched,
+                "done": self.done}
+
+    def restore(self, snapshot: Dict[str, Any]):
+        self.pn = snapshot["pn"]
+        self.results = snapshot["results"]
+        self.matched = snapshot["matched"]
+        self.done = bool(snapshot["done"])
+        if snapshot["newest_pubdate"] is not None:
+            self.newest = (snapshot["newest_pubdate"], snapshot["newest_bvid"])
+
+
+# First number in a count string, e.g. "1.2" in "1.2万+"
+_NUMBER_RE = re.compile(r'[0-9]+(?:\.[0-9]+)?')
+_UNITS = (('亿', 100000000), ('万', 10000))
+
+
+@functools.lru_cache(maxsize=DEFAULT_COUNT_CACHE_SIZE)
+def _parse_count_str(s: str) -> int:
+    s = s.strip()
+    if s.isdigit():
+        return int(s)
+    # remove commas and trailing plus signs
+    s = s.replace(',', '').rstrip('+')
+    for unit, scale in _UNITS:
+        if unit in s:
+            m = _NUMBER_RE.search(s)
+            return int(float(m.group(0)) * scale) if m else 0
+    try:
+        return int(float(s))
+    except (ValueError, OverflowError):
+        # fall back to the first number in the string
+        m = _NUMBER_RE.search(s)
+        return int(float(m.group(0))) if m else 0
+
 
 def parse_count(val) -> int:
     """Parse play/like count strings which may include Chinese units (万, 亿), commas, plus signs, or plain numbers.
     Examples: '1.2万' -> 12000, '3.4亿' -> 340000000, '12,345' -> 12345, '5000' -> 5000
+
+    Strings go through one precompiled regex search; results are memoized since
+    the same short strings ("1.2万", "0", ...) repeat across pages.
     """
     if val is None:
         return 0
@@ -20,130 +148,359 @@ def parse_count(val) -> int:
             return int(val)
         except Exception:
             return 0
-    s = str(val).strip()
-    if not s:
-        return 0
-    # remove commas and trailing plus signs
-    s = s.replace(',', '').rstrip('+')
-    # try direct float conversion first
+    return _parse_count_str(str(val))
+
+# Search-hit fields stored as typed columns on the videos table
+VIDEO_FIELDS = ("description", "author", "mid", "duration", "play", "like", "danmaku", "tag")
+
+
+def parse_duration(val) -> Optional[int]:
+    """Parse a duration such as '12:23' or '1:02:03' (or plain seconds) into seconds."""
+    if val is None or val == "":
+        return None
+    if isinstance(val, (int, float)):
+        return int(val)
+    seconds = 0
     try:
-        if '亿' in s:
-            m = re.search(r'[0-9]+(?:\.[0-9]+)?', s)
-            if m:
-                return int(float(m.group(0)) * 100000000)
-            return 0
-        if '万' in s:
-            m = re.search(r'[0-9]+(?:\.[0-9]+)?', s)
-            if m:
-                return int(float(m.group(0)) * 10000)
-            return 0
-        return int(float(s))
-    except Exception:
-        # try to extract first number
-        m = re.search(r'[0-9]+(?:\.[0-9]+)?', s)
-        if m:
-            try:
-                return int(float(m.group(0)))
-            except Exception:
-                return 0
-    return 0
+        for part in str(val).strip().split(":"):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return None
+    return seconds
+
+
+def video_fields(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Pull the frequently used fields of a search hit out of its raw payload."""
+    play = raw.get("play") or raw.get("playcount")
+    if play is None:
+        stat = raw.get("stat") or {}
+        play = stat.get("view") or stat.get("play")
+    mid = raw.get("mid")
+    return {
+        "description": raw.get("description") or raw.get("desc") or "",
+        "author": raw.get("author") or None,
+        "mid": mid if isinstance(mid, int) else None,
+        "duration": parse_duration(raw.get("duration")),
+        "play": parse_count(play),
+        "like": parse_count(raw.get("like")),
+        "danmaku": parse_count(raw.get("danmaku") or raw.get("video_review")),
+        "tag": raw.get("tag") or None,
+    }
+
+
+def extract_page(result_list: List[Dict[str, Any]], keep_raw: bool = True) -> List[Dict[str, Any]]:
+    """Turn a page of raw search hits into video items in one synchronous pass.
+
+    Hits without a bvid or pubdate are skipped. Each item is built once with
+    only the stored fields; the raw hit is referenced under metadata["raw"]
+    only when `keep_raw` is set (it is what video_raw and the export store).
+    """
+    items = []
+    for raw in result_list:
+        bvid = raw.get("bvid")
+        pubdate = raw.get("pubdate")  # unix seconds
+        if not bvid or pubdate is None:
+            continue
+        item = video_fields(raw)
+        item["bvid"] = bvid
+        item["title"] = raw.get("title") or ""
+        item["pubdate"] = pubdate
+        item["url"] = f"https://www.bilibili.com/video/{bvid}"
+        # Simple hotness metric: prefer numeric `play`, fallback to `like` or 0
+        item["hot"] = item["play"] or item["like"]
+        if keep_raw:
+            item["metadata"] = {"raw": raw}
+        items.append(item)
+    return items
+
 
 class Crawler:
-    def __init__(self, search_client: BiliSearchClient, matcher: KeywordMatcher, 
-                 max_pages: int = None, page_size: int = None):
+    def __init__(self, search_client: "BiliSearchClient", matcher: KeywordMatcher, 
+                 max_pages: int = None, page_size: int = None,
+                 watermarks: Optional[Dict[str, int]] = None, overlap: int = None,
+                 budgets: Optional[Dict[str, int]] = None, concurrency: int = None,
+                 checkpoints: Optional[Dict[str, Dict[str, Any]]] = None, keep_raw: bool = True,
+                 metrics: RunMetrics = None, events: EventBus = None,
+                 on_checkpoint: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None):
         self.search_client = search_client
         self.matcher = matcher
         self.max_pages = max_pages or DEFAULT_MAX_PAGES
         self.page_size = page_size or DEFAULT_PAGE_SIZE
+        # keyword -> newest pubdate stored by a previous run; results are ordered by
+        # pubdate so paging stops once a whole page is older than this minus `overlap`
+        self.watermarks = watermarks or {}
+        self.overlap = DEFAULT_WATERMARK_OVERLAP if overlap is None else overlap
+        # keyword -> max pages to fetch this run (see page_budgets); default max_pages
+        self.budgets = budgets or {}
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        # Whether items carry the raw search hit (needed only when it is persisted)
+        self.keep_raw = keep_raw
+        self.metrics = metrics or RunMetrics()
+        # Progress events: keyword_started, page_fetched, keyword_finished
+        self.events = events or EventBus()
+        # keyword -> snapshot saved by an interrupted run; those keywords continue from there
+        self.checkpoints = checkpoints or {}
+        # Called by iter_batches with keyword snapshots once the items fetched
+        # before them have been consumed (i.e. persisted by the caller)
+        self.on_checkpoint = on_checkpoint
+        # keyword -> (newest pubdate, bvid) seen this run, set when a keyword completes
+        self.newest: Dict[str, Tuple[int, str]] = {}
+        # keyword -> pages/results/matched counters, updated as pages are fetched
+        self.progress: Dict[str, Dict[str, Any]] = {}
+        self.seen = SeenIndex()
 
-    async def _extract_item(self, raw: Dict[str, Any]) -> Dict[str, Any]:
-        # raw format expected from search result
-        title = raw.get("title") or ""
-        # remove possible highlight tags will be handled by matcher.normalize
-        bvid = raw.get("bvid") or raw.get("bvid")
-        aid = raw.get("aid")
-        pubdate = raw.get("pubdate")  # unix seconds
-        url = f"https://www.bilibili.com/video/{bvid}" if bvid else raw.get("arcurl")
-        # Determine a simple hotness metric: prefer numeric `play`, fallback to `like` or 0
-        hot = 0
-        try:
-            play = raw.get("play") or raw.get("playcount")
-            if play is None:
-                stat = raw.get("stat") or {}
-                play = stat.get("view") or stat.get("play")
-            hot = parse_count(play)
-            if hot == 0:
-                like = raw.get("like") or 0
-                hot = parse_count(like)
-        except Exception:
-            hot = 0
-        return {"bvid": bvid, "title": title, "pubdate": pubdate, "url": url, "hot": hot, "raw": raw}
+    def _new_state(self, keyword: str) -> _KeywordState:
+        watermark = self.watermarks.get(keyword)
+        cutoff = watermark - self.overlap if watermark is not None else None
+        budget = max(1, min(self.budgets.get(keyword, self.max_pages), self.max_pages))
+        state = _KeywordState(keyword, budget, cutoff)
+        if keyword in self.checkpoints:
+            state.restore(self.checkpoints[keyword])
+            if state.done and state.newest is not None:
+                self.newest[keyword] = state.newest
+        self.progress[keyword] = state.summary()
+        return state
 
-    async def crawl_keyword(self, keyword: str) -> List[Dict[str, Any]]:
-        """Search for videos using the keyword and filter by keywords.txt matches."""
-        results = []
-        seen_bvid = set()
-        matched_count = 0
-        
-        for pn in range(1, self.max_pages + 1):
-            data = await self.search_client.search_videos(keyword=keyword, pn=pn, ps=self.page_size)
-            if not data or data.get("data") is None:
-                break
+    async def _crawl_page(self, state: _KeywordState) -> List[Dict[str, Any]]:
+        """Fetch the next page for a keyword and return its matched videos.
+
+        Sets `state.done` once the keyword has no more pages worth fetching.
+        """
+        keyword, pn = state.keyword, state.pn
+        data = await self.search_client.search_videos(keyword=keyword, pn=pn, ps=self.page_size)
+        state.pn += 1
+        self.metrics.inc("crawler_pages_total", keyword=keyword)
+        result_list = []
+        if data and data.get("data") is not None:
             result_list = data["data"].get("result") or data["data"].get("vlist") or []
-            if not result_list:
-                break
-            
-            for raw in result_list:
-                item = await self._extract_item(raw)
-                pub = item.get("pubdate")
-                if pub is None:
-                    continue
-                bvid = item.get("bvid")
-                if not bvid or bvid in seen_bvid:
-                    continue
-                seen_bvid.add(bvid)
-                
-                # STRICT: Match only if keywords.txt keywords are found in title or description
-                matches = set()
-                title = item.get("title", "")
-                title_matches = await self.matcher.match(title)
-                matches.update(title_matches)
-                desc = raw.get("description") or raw.get("desc") or ""
-                if desc:
-                    desc_matches = await self.matcher.match(desc)
-                    matches.update(desc_matches)
-                
-                # Only keep if has matches from keywords.txt
-                if matches:
-                    matched_count += 1
-                    hot = int(item.get('hot') or 0)
-                    results.append({
-                        "bvid": bvid,
-                        "title": title,
-                        "pubdate": pub,
-                        "url": item.get("url"),
-                        "matches": sorted(list(matches)),
-                        "metadata": {"raw": raw},
-                        "hot": hot,
-                    })
-            # small sleep to be polite
-            await asyncio.sleep(0.1)
-        
-        logger.debug(f"Keyword '{keyword}': matched {matched_count} videos from {len(seen_bvid)} total results")
+        if not result_list:
+            self._finish(state)
+            return []
+
+        hits = []
+        for raw in result_list:
+            bvid = raw.get("bvid")
+            pubdate = raw.get("pubdate")
+            if not bvid or pubdate is None or bvid in state.seen_bvid:
+                continue
+            state.seen_bvid.add(bvid)
+            state.results += 1
+            hits.append(raw)
+            if state.newest is None or pubdate > state.newest[0]:
+                state.newest = (pubdate, bvid)
+        self.metrics.inc("crawler_results_total", len(hits), keyword=keyword)
+
+        # Incremental crawl: everything on this page was already stored by an earlier run
+        if state.cutoff is not None and hits and all(raw["pubdate"] < state.cutoff for raw in hits):
+            logger.debug(f"Keyword '{keyword}': page {pn} is below the watermark, stopping")
+            self._finish(state)
+            return []
+
+        # Only hits no keyword has surfaced yet this run are extracted and matched;
+        # sightings are recorded here, after the cutoff, so a discarded page never
+        # hides its videos from the keywords that reach them later
+        fresh = []
+        duplicates = 0
+        for raw in hits:
+            if self.seen.first_sighting(raw["bvid"], keyword):
+                fresh.append(raw)
+            else:
+                duplicates += 1
+                if raw["bvid"] in self.seen.matched:
+                    state.matched += 1
+        self.metrics.inc("crawler_duplicates_total", duplicates, keyword=keyword)
+
+        with self.metrics.time("extract_seconds"):
+            candidates = extract_page(fresh, self.keep_raw)
+
+        # STRICT: Match only if keywords.txt keywords are found in title or description.
+        # The whole page is matched in one call: titles first, then descriptions.
+        texts = [item["title"] for item in candidates]
+        texts += [item["description"] for item in candidates]
+        page_matches = await self.matcher.match_many(texts)
+        n = len(candidates)
+        results = []
+        for i, item in enumerate(candidates):
+            matches = page_matches[i] | page_matches[n + i]
+
+            # Only keep if has matches from keywords.txt
+            if matches:
+                state.matched += 1
+                self.seen.matched.add(item["bvid"])
+                item["matches"] = sorted(matches)
+                results.append(item)
+        self.metrics.inc("crawler_matched_total", len(results), keyword=keyword)
+
+        if state.pn > state.budget:
+            self._finish(state)
+        else:
+            self.progress[keyword] = state.summary()
         return results
 
+    def _finish(self, state: _KeywordState):
+        state.done = True
+        if state.newest is not None:
+            self.newest[state.keyword] = state.newest
+        self.progress[state.keyword] = state.summary()
+        self.events.publish("keyword_finished", keyword=state.keyword, **self.progress[state.keyword])
+        logger.info(f"Keyword '{state.keyword}': {state.pn - 1}/{state.budget} pages, "
+                    f"matched {state.matched} videos from {state.results} total results")
+
+    async def crawl_keyword(self, keyword: str) -> List[Dict[str, Any]]:
+        """Search for videos using the keyword and filter by keywords.txt matches."""
+        return [item async for item in self.iter_keyword(keyword)]
+
+    async def iter_keyword(self, keyword: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield matched videos for a keyword page by page as they are fetched."""
+        state = self._new_state(keyword)
+        while not state.done:
+            for item in await self._crawl_page(state):
+                yield item
+
     async def crawl_all(self, keywords: List[str]) -> List[Dict[str, Any]]:
         """Crawl all keywords and merge results, removing duplicates."""
-        logger.info(f"Starting crawl for {len(keywords)} keywords")
-        tasks = [self.crawl_keyword(k) for k in keywords]
-        res = await asyncio.gather(*tasks)
         combined = []
+        async for batch in self.iter_batches(keywords):
+            combined.extend(batch)
+        return combined
+
+    async def _schedule(self, keywords: List[str], out: asyncio.Queue):
+        """Fetch pages for all keywords with a fixed pool of workers.
+
+        Pages are handed out one at a time from a priority queue ordered by how
+        much of its page budget each keyword has used, so keywords advance
+        round-robin and a few deep keywords cannot monopolise the workers.
+        """
+        work = asyncio.PriorityQueue()
+        seq = 0
+        remaining = 0
+        # A keyword listed twice would page through the same results twice
+        for keyword in dict.fromkeys(keywords):
+            state = self._new_state(keyword)
+            if state.done:
+                # Finished before an interrupted run stopped
+                continue
+            work.put_nowait((state.priority, seq, state))
+            seq += 1
+            remaining += 1
+            self.events.publish("keyword_started", keyword=keyword, **state.summary())
+        workers = min(self.concurrency, remaining) or 1
+
+        def stop_workers():
+            for _ in range(workers):
+                work.put_nowait((float("inf"), seq, None))
+
+        async def worker():
+            nonlocal remaining, seq
+            while True:
+                _, _, state = await work.get()
+                if state is None:
+                    return
+                items = await self._crawl_page(state)
+                self.events.publish("page_fetched", keyword=state.keyword, page_matched=len(items),
+                                    **state.summary())
+                for item in items:
+                    await out.put(item)
+                if self.on_checkpoint is not None:
+                    await out.put(_Checkpoint(state.snapshot()))
+                if state.done:
+                    remaining -= 1
+                    if remaining == 0:
+                        stop_workers()
+                else:
+                    seq += 1
+                    work.put_nowait((state.priority, seq, state))
+
+        if remaining == 0:
+            stop_workers()
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def iter_batches(self, keywords: List[str], batch_size: int = None,
+                           flush_interval: float = None,
+                           queue_size: int = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Crawl all keywords concurrently and yield batches of unique matched videos.
+
+        The scheduler's workers feed a bounded queue, so memory stays bounded by the queue
+        depth and producers pause while the consumer is busy writing. A batch is
+        yielded when it reaches `batch_size` or when its oldest item has waited
+        `flush_interval` seconds, whichever comes first.
+
+        With `on_checkpoint` set, keyword snapshots are passed to it only after
+        every batch holding items fetched before them has been handed out and
+        the caller has resumed this generator, so a saved checkpoint never gets
+        ahead of the persisted data.
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        flush_interval = flush_interval or DEFAULT_FLUSH_INTERVAL
+        queue = asyncio.Queue(maxsize=queue_size or DEFAULT_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+
+        async def run_producers():
+            try:
+                await self._schedule(keywords, queue)
+            except asyncio.CancelledError:
+                # The consumer went away; nobody is left to read the sentinel
+                raise
+            except Exception:
+                await queue.put(_DONE)
+                raise
+            await queue.put(_DONE)
+
+        logger.info(f"Starting crawl for {len(keywords)} keywords with {self.concurrency} workers")
+        producer = asyncio.create_task(run_producers())
         seen = set()
-        for lst in res:
-            for item in lst:
+        batch = []
+        # Checkpoints waiting for the current batch to be consumed
+        pending = []
+        deadline = None
+
+        async def flush_checkpoints():
+            if pending:
+                await self.on_checkpoint(list(pending))
+                pending.clear()
+
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield batch
+                    batch, deadline = [], None
+                    await flush_checkpoints()
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, _Checkpoint):
+                    pending.append(item.snapshot)
+                    if not batch:
+                        await flush_checkpoints()
+                    continue
                 if item["bvid"] in seen:
                     continue
                 seen.add(item["bvid"])
-                combined.append(item)
-        logger.info(f"Crawl complete: {len(combined)} unique videos found")
-        return combined
+                batch.append(item)
+                if deadline is None:
+                    deadline = loop.time() + flush_interval
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch, deadline = [], None
+                    await flush_checkpoints()
+            if batch:
+                yield batch
+            await flush_checkpoints()
+            # Re-raise any error from the keyword producers
+            await producer
+            logger.info(f"Crawl complete: {len(seen)} unique videos found")
+        finally:
+            if not producer.done():
+                producer.cancel()
+                try:
+                    await producer
+                except (asyncio.CancelledError, Exception):
+                    pass
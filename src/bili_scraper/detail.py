@@ -0,0 +1,54 @@
+import aiohttp
+import time
+from typing import Dict, Optional
+from .metrics import RunMetrics
+from .ratelimit import AdaptiveLimiter
+from .search import ThrottledError, api_retry, raise_if_throttled
+from .utils import DEFAULT_HEADERS
+
+VIEW_URL = "https://api.bilibili.com/x/web-interface/view"
+
+
+class BiliDetailClient:
+    """Exact per-video stats from the view API, which the search API only reports rounded ("1.2万")."""
+
+    def __init__(self, session: aiohttp.ClientSession, limiter: AdaptiveLimiter,
+                 view_url: str = None, metrics: RunMetrics = None):
+        self.session = session
+        self.limiter = limiter
+        self.view_url = view_url or VIEW_URL
+        self.metrics = metrics or RunMetrics()
+
+    @api_retry("detail", attempts=3)
+    async def get_stats(self, bvid: str) -> Optional[Dict[str, int]]:
+        """Return {"play", "like", "danmaku"} for a video, or None if the API has no such video."""
+        wait_start = time.perf_counter()
+        async with self.limiter:
+            started = time.perf_counter()
+            self.metrics.observe("limiter_wait_seconds", started - wait_start, api="view")
+            outcome = "error"
+            try:
+                async with self.session.get(self.view_url, params={"bvid": bvid}, headers=DEFAULT_HEADERS,
+                                            timeout=20) as resp:
+                    raise_if_throttled(self.limiter, self.metrics, "detail", resp.status, resp.headers)
+                    if resp.status != 200:
+                        outcome = f"http_{resp.status}"
+                        return None
+                    data = await resp.json()
+                    code = data.get("code") if isinstance(data, dict) else None
+                    raise_if_throttled(self.limiter, self.metrics, "detail", resp.status, resp.headers, code)
+                    self.limiter.on_success()
+                    stat = (data.get("data") or {}).get("stat") if code == 0 else None
+                    if not stat:
+                        # Deleted or hidden videos answer with a non-zero code
+                        outcome = f"code_{code}"
+                        return None
+                    outcome = "ok"
+                    return {"play": int(stat.get("view") or 0), "like": int(stat.get("like") or 0),
+                            "danmaku": int(stat.get("danmaku") or 0)}
+            except ThrottledError as e:
+                outcome = e.reason
+                raise
+            finally:
+                self.metrics.observe("detail_request_seconds", time.perf_counter() - started, outcome=outcome)
+                self.metrics.inc("detail_requests_total", outcome=outcome)
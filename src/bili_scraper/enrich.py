@@ -0,0 +1,121 @@
+"""Background enrichment of persisted videos with exact stats from the view API.
+
+perform_scrape hands every persisted batch to `Enricher.submit`, which only
+queues the bvids, so the crawl and its database writes never wait for detail
+requests. Videos whose stats were fetched within `ttl` seconds are skipped.
+`close()` waits for the queued videos before the run is exported.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from .detail import BiliDetailClient
+from .metrics import RunMetrics
+from .persist import Persist
+from .utils import DETAIL_CONCURRENCY, DETAIL_TTL, ENRICH_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Queue sentinel telling a fetch worker to exit
+_STOP = None
+
+
+class Enricher:
+    def __init__(self, client: BiliDetailClient, persist: Persist, scraped_at: int,
+                 concurrency: int = None, ttl: int = None, metrics: RunMetrics = None,
+                 write_lock: Optional[asyncio.Lock] = None):
+        self.client = client
+        self.persist = persist
+        self.scraped_at = scraped_at
+        self.concurrency = concurrency or DETAIL_CONCURRENCY
+        self.ttl = DETAIL_TTL if ttl is None else ttl
+        self.metrics = metrics or RunMetrics()
+        # Shared with the crawl's batch writes, which use the same connection
+        self.write_lock = write_lock or asyncio.Lock()
+        self.stats = {"queued": 0, "skipped": 0, "updated": 0, "failed": 0}
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._fetch: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        self._results: List[Dict[str, Any]] = []
+        self._seen = set()
+        self._tasks: List[asyncio.Task] = []
+        self._closed = False
+
+    def start(self):
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def submit(self, items: Iterable[Dict[str, Any]]):
+        """Queue the videos of a persisted batch; never waits."""
+        bvids = [item["bvid"] for item in items if item["bvid"] not in self._seen]
+        self._seen.update(bvids)
+        if bvids:
+            self._incoming.put_nowait(bvids)
+
+    async def _dispatch(self):
+        """Drop videos with fresh stats and feed the rest to the fetch workers."""
+        while True:
+            bvids = await self._incoming.get()
+            if bvids is _STOP:
+                break
+            fresh = await self.persist.fresh_stats(bvids, int(time.time()) - self.ttl)
+            self.stats["skipped"] += len(fresh)
+            self.metrics.inc("enrich_skipped_total", len(fresh))
+            for bvid in bvids:
+                if bvid not in fresh:
+                    self.stats["queued"] += 1
+                    await self._fetch.put(bvid)
+        for _ in range(self.concurrency):
+            await self._fetch.put(_STOP)
+
+    async def _worker(self):
+        while True:
+            bvid = await self._fetch.get()
+            if bvid is _STOP:
+                return
+            try:
+                stats = await self.client.get_stats(bvid)
+            except Exception as e:
+                # The search-level counts stay; the next run tries again
+                logger.debug(f"Detail stats for {bvid} failed: {e}")
+                stats = None
+            if stats is None:
+                self.stats["failed"] += 1
+                continue
+            self._results.append({"bvid": bvid, **stats})
+            if len(self._results) >= ENRICH_BATCH_SIZE:
+                await self._flush()
+
+    async def _flush(self):
+        rows, self._results = self._results, []
+        if not rows:
+            return
+        async with self.write_lock:
+            await self.persist.update_stats(rows, self.scraped_at, int(time.time()))
+        self.stats["updated"] += len(rows)
+        self.metrics.inc("enrich_updated_total", len(rows))
+
+    async def close(self) -> Dict[str, int]:
+        """Wait until every queued video has been fetched and written; returns counts."""
+        if self._closed:
+            return dict(self.stats)
+        self._closed = True
+        self._incoming.put_nowait(_STOP)
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+        await self._flush()
+        logger.info(f"Enrichment: {self.stats}")
+        return dict(self.stats)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            for task in self._tasks:
+                task.cancel()
@@ -0,0 +1,65 @@
+"""In-process publish/subscribe for scrape progress events.
+
+The crawler and perform_scrape publish small dict events (keyword started,
+page fetched, batch persisted, run finished, ...); the web UI fans them out
+to browsers over server-sent events. `publish` never waits: every subscriber
+has a bounded queue and a subscriber that falls behind loses its oldest
+events, so a slow client can never hold up the crawl.
+"""
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, Optional, Set
+from .utils import EVENT_QUEUE_SIZE
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", queue_size: int):
+        self._bus = bus
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def _offer(self, event: Dict[str, Any]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if none arrives within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus._subscribers.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class EventBus:
+    def __init__(self, queue_size: int = None):
+        self.queue_size = queue_size or EVENT_QUEUE_SIZE
+        self._subscribers: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+
+    def publish(self, type: str, **data):
+        """Hand an event to every subscriber without blocking."""
+        event = {"id": next(self._ids), "type": type, "ts": time.time(), **data}
+        for sub in list(self._subscribers):
+            sub._offer(event)
+
+    def subscribe(self) -> Subscription:
+        """Start receiving events; use as a context manager or call `close()`."""
+        sub = Subscription(self, self.queue_size)
+        self._subscribers.add(sub)
+        return sub
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
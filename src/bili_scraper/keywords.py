@@ -1,18 +1,146 @@
-import ahocorasick
 import asyncio
+import copy
+import functools
+import glob
+import hashlib
 import html
+import logging
+import os
+import pickle
 import re
-from typing import List, Set
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, FrozenSet, List, Optional, Sequence, Set
+from .metrics import RunMetrics
+from .utils import (DEFAULT_MATCH_CACHE_SIZE, MATCH_THREAD_THRESHOLD, MATCHER_CACHE_KEEP,
+                    KEYWORDS_RELOAD_INTERVAL, settings)
+
+if TYPE_CHECKING:  # imported when an automaton is first built (unpickling imports it too)
+    import ahocorasick
+
+logger = logging.getLogger(__name__)
 
 TAG_RE = re.compile(r"<.*?>")
 
+_NO_MATCH = frozenset()
+
+# Bumped when the pickled payload changes shape; part of the cache file name
+_CACHE_FORMAT = 1
+
+
+def read_keywords_file(path: str) -> List[str]:
+    """The non-empty, stripped lines of a keywords file."""
+    if not os.path.exists(path):
+        raise ValueError(f"Keywords file not found: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        keywords = [line.strip() for line in f if line.strip()]
+    if not keywords:
+        raise ValueError(f"No keywords found in {path}")
+    return keywords
+
+
+def keywords_digest(keywords: Sequence[str]) -> str:
+    """Hash of the keyword list in file order, which the compiled automaton depends on."""
+    joined = "\n".join(k.strip() for k in keywords if k.strip())
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
 class KeywordMatcher:
-    def __init__(self, keywords: List[str]):
+    def __init__(self, keywords: List[str], cache_size: int = DEFAULT_MATCH_CACHE_SIZE,
+                 thread_threshold: int = MATCH_THREAD_THRESHOLD, metrics: RunMetrics = None,
+                 automaton: "ahocorasick.Automaton" = None):
         self.keywords = [k.strip() for k in keywords if k.strip()]
-        self.automaton = ahocorasick.Automaton()
-        for i, kw in enumerate(self.keywords):
-            self.automaton.add_word(kw, (i, kw))
-        self.automaton.make_automaton()
+        if automaton is None:
+            import ahocorasick
+
+            automaton = ahocorasick.Automaton()
+            for i, kw in enumerate(self.keywords):
+                automaton.add_word(kw, (i, kw))
+            automaton.make_automaton()
+        self.automaton = automaton
+        self.thread_threshold = thread_threshold
+        # Bounded LRU of raw text -> matches; the same titles come back for many keywords
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.metrics = metrics or RunMetrics()
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the keyword set, independent of order and duplicates."""
+        joined = "\n".join(sorted(set(self.keywords)))
+        return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+    @functools.cached_property
+    def digest(self) -> str:
+        return keywords_digest(self.keywords)
+
+    def bind(self, metrics: RunMetrics) -> "KeywordMatcher":
+        """A matcher reporting to `metrics` that shares this one's automaton and match cache."""
+        bound = copy.copy(self)
+        bound.metrics = metrics
+        return bound
+
+    def save(self, path: str):
+        """Pickle the keywords and compiled automaton to `path`, replacing it atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"format": _CACHE_FORMAT, "keywords": self.keywords, "automaton": self.automaton},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "KeywordMatcher":
+        """Load a matcher written by `save`; kwargs are passed to the constructor."""
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if not isinstance(data, dict) or data.get("format") != _CACHE_FORMAT:
+            raise ValueError(f"Unsupported matcher cache file: {path}")
+        return cls(data["keywords"], automaton=data["automaton"], **kwargs)
+
+    @classmethod
+    def cached(cls, keywords: Sequence[str], cache_dir: str = None, **kwargs) -> "KeywordMatcher":
+        """Load the compiled automaton for this keyword list from `cache_dir`, building and saving it on a miss.
+
+        Cache files are named after the keyword list's digest, so an edited
+        list never picks up a stale automaton; unreadable files are rebuilt.
+        """
+        cache_dir = cache_dir or settings().matcher_cache_dir
+        metrics = kwargs.get("metrics") or RunMetrics()
+        path = os.path.join(cache_dir, f"{keywords_digest(keywords)[:16]}.v{_CACHE_FORMAT}.matcher")
+        if os.path.exists(path):
+            try:
+                with metrics.time("matcher_load_seconds", source="cache"):
+                    matcher = cls.load(path, **kwargs)
+                metrics.inc("matcher_cache_total", outcome="hit")
+                os.utime(path)
+                return matcher
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable matcher cache {path}: {e}")
+        metrics.inc("matcher_cache_total", outcome="miss")
+        with metrics.time("matcher_load_seconds", source="build"):
+            matcher = cls(keywords, **kwargs)
+        try:
+            matcher.save(path)
+            _prune_cache(cache_dir, keep=path)
+        except OSError as e:
+            logger.warning(f"Could not write matcher cache {path}: {e}")
+        return matcher
+
+    @classmethod
+    def from_file(cls, path: str, cache_dir: str = None, **kwargs) -> "KeywordMatcher":
+        """A matcher for the keywords in `path`, using the compiled-automaton cache."""
+        return cls.cached(read_keywords_file(path), cache_dir=cache_dir, **kwargs)
 
     def _normalize(self, text: str) -> str:
         if not text:
@@ -28,6 +156,108 @@ class KeywordMatcher:
             matches.add(kw)
         return matches
 
+    def _match_cached(self, text: str) -> FrozenSet[str]:
+        if not text:
+            return _NO_MATCH
+        if not self.cache_size:
+            return frozenset(self._match_sync(text))
+        with self._cache_lock:
+            hit = self._cache.get(text)
+            if hit is not None:
+                self._cache.move_to_end(text)
+                return hit
+        result = frozenset(self._match_sync(text))
+        with self._cache_lock:
+            self._cache[text] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def match_many_sync(self, texts: Sequence[str]) -> List[FrozenSet[str]]:
+        """Match a batch of texts, returning one (read-only) set of keywords per text."""
+        return [self._match_cached(t) for t in texts]
+
+    async def match_many(self, texts: Sequence[str]) -> List[FrozenSet[str]]:
+        self.metrics.inc("match_texts_total", len(texts))
+        with self.metrics.time("match_seconds"):
+            # A scan costs microseconds, so only large batches are worth a thread hop
+            if len(texts) < self.thread_threshold:
+                return self.match_many_sync(texts)
+            return await asyncio.to_thread(self.match_many_sync, texts)
+
     async def match(self, text: str) -> Set[str]:
-        # pyahocorasick is a C extension; run in thread to avoid blocking event loop
-        return await asyncio.to_thread(self._match_sync, text)
+        return set(self._match_cached(text))
+
+
+def _prune_cache(cache_dir: str, keep: str):
+    """Delete all but the MATCHER_CACHE_KEEP most recently used cache files."""
+    files = sorted(glob.glob(os.path.join(cache_dir, "*.matcher")), key=os.path.getmtime, reverse=True)
+    for path in files[MATCHER_CACHE_KEEP:]:
+        if path != keep:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+class MatcherReloader:
+    """Keeps a KeywordMatcher in step with a keywords file for a long-running process.
+
+    `refresh` compares the file's mtime and size with the last load and only
+    then re-reads it; a changed keyword list is compiled (or loaded from the
+    cache) in a thread and swapped in with a single assignment, so callers
+    holding the previous `matcher` finish with it undisturbed. A missing or
+    broken file keeps the last good matcher.
+    """
+
+    def __init__(self, keywords_file: str, cache_dir: str = None, interval: float = None):
+        self.keywords_file = keywords_file
+        self.cache_dir = cache_dir
+        self.interval = interval or KEYWORDS_RELOAD_INTERVAL
+        self.matcher: Optional[KeywordMatcher] = None
+        self.loaded_at: Optional[float] = None
+        self._stat = None
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """Reload the matcher if the keywords file changed; returns whether it was swapped."""
+        async with self._refresh_lock:
+            try:
+                st = os.stat(self.keywords_file)
+            except OSError:
+                return False
+            stat = (st.st_mtime_ns, st.st_size)
+            if stat == self._stat:
+                return False
+            # Remembered before loading, so a broken file is reported once per edit
+            self._stat = stat
+            try:
+                matcher = await asyncio.to_thread(KeywordMatcher.from_file, self.keywords_file, self.cache_dir)
+            except Exception as e:
+                logger.warning(f"Keeping the current keywords; reloading {self.keywords_file} failed: {e}")
+                return False
+            if self.matcher is not None and matcher.digest == self.matcher.digest:
+                return False
+            self.matcher = matcher
+            self.loaded_at = time.time()
+            logger.info(f"Loaded {len(matcher.keywords)} keywords from {self.keywords_file}")
+            return True
+
+    async def _watch(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        """Load the keywords and keep watching the file in the background, without delaying the caller."""
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
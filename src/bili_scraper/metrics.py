@@ -0,0 +1,122 @@
+"""Per-run counters and latency histograms for the scrape hot paths.
+
+One RunMetrics object is shared by the search client, crawler, matcher and
+Persist for the duration of a run, saved to the run_metrics table when the run
+ends, and served by the web UI as JSON or in the Prometheus text format.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Tuple
+from .utils import METRICS_BUCKETS
+
+METRICS_PREFIX = "bili_scraper_"
+
+
+class Histogram:
+    """Fixed-bucket histogram; `counts[i]` holds observations <= buckets[i], the last one the rest."""
+
+    def __init__(self, buckets: Iterable[float] = None):
+        self.buckets = list(buckets or METRICS_BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: Dict[str, Any]):
+        """Add the counts of a histogram stored with `to_dict` (same buckets)."""
+        if other["buckets"] != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other["counts"])]
+        self.sum += other["sum"]
+        self.count += other["count"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"buckets": self.buckets, "counts": self.counts, "sum": round(self.sum, 6), "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        hist = cls(data["buckets"])
+        hist.merge(data)
+        return hist
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class RunMetrics:
+    """In-memory counters and histograms keyed by metric name and labels."""
+
+    def __init__(self):
+        self.counters: Dict[Tuple, float] = {}
+        self.histograms: Dict[Tuple, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """Observe the wall time of the block, in seconds, into histogram `name`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def series(self) -> List[Dict[str, Any]]:
+        """All metrics as rows for the run_metrics table / JSON API."""
+        rows = [{"name": name, "labels": dict(labels), "kind": "counter", "value": value}
+                for (name, labels), value in self.counters.items()]
+        rows += [{"name": name, "labels": dict(labels), "kind": "histogram", "value": hist.count,
+                  "histogram": hist.to_dict()}
+                 for (name, labels), hist in self.histograms.items()]
+        return sorted(rows, key=lambda r: (r["name"], sorted(r["labels"].items())))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, Any], **extra) -> str:
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def format_prometheus(series: List[Dict[str, Any]], gauges: Dict[str, float] = None) -> str:
+    """Render run metrics (and extra unlabelled gauges) in the Prometheus text exposition format."""
+    lines = []
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {METRICS_PREFIX}{name} gauge")
+        lines.append(f"{METRICS_PREFIX}{name} {value}")
+    typed = set()
+    for row in series:
+        name = METRICS_PREFIX + row["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} {row['kind']}")
+            typed.add(name)
+        if row["kind"] == "counter":
+            lines.append(f"{name}{_labels(row['labels'])} {row['value']}")
+            continue
+        hist = row["histogram"]
+        cumulative = 0
+        for bound, count in zip(hist["buckets"] + ["+Inf"], hist["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(row['labels'], le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(row['labels'])} {hist['sum']}")
+        lines.append(f"{name}_count{_labels(row['labels'])} {hist['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,25 +1,127 @@
 import aiosqlite
 import json
-import os
-from typing import Any, Dict, List
-from .utils import DB_PATH, DEFAULT_OUTPUT_FILE
+import logging
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .utils import (DEFAULT_BATCH_SIZE, DEFAULT_EXPORT_FORMAT,
+                    EXPORT_CHUNK_SIZE, DEFAULT_COMPRESS_RAW, ZSTD_DICT_SIZE, ZSTD_TRAIN_SAMPLES,
+                    ZSTD_MIN_TRAIN_ROWS, STATS_FULL_RESOLUTION_DAYS, STATS_DOWNSAMPLE_SECONDS,
+                    STATS_RETENTION_DAYS, TREND_WINDOWS, DETAIL_TTL, DB_BUSY_TIMEOUT, SEARCH_PROBE_ROWS,
+                    atomic_write, settings)
 from .keywords import KeywordMatcher
+from .crawler import VIDEO_FIELDS, video_fields
+from .metrics import Histogram, RunMetrics
+from . import codec
 
-_SCHEMA_INITIALIZED = False
-_SCHEMA_LOCK = None
+logger = logging.getLogger(__name__)
 
+# Database paths whose schema has already been created in this process
+_SCHEMA_INITIALIZED = set()
+
+# Applied on every connection. WAL lets readers (the web UI) keep working while
+# a scrape writes, and synchronous=NORMAL only fsyncs at checkpoints in WAL mode.
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# `id` is an explicit rowid alias: VACUUM may renumber implicit rowids, and
+# videos_fts is keyed on it
 _CREATE_VIDEOS = """
 CREATE TABLE IF NOT EXISTS videos (
-    bvid TEXT PRIMARY KEY,
+    id INTEGER PRIMARY KEY,
+    bvid TEXT NOT NULL UNIQUE,
     title TEXT,
     pubdate INTEGER,
     url TEXT,
-    metadata_json TEXT,
     scraped_at INTEGER,
-    hot INTEGER DEFAULT 0
+    hot INTEGER DEFAULT 0,
+    description TEXT,
+    author TEXT,
+    mid INTEGER,
+    duration INTEGER,
+    play INTEGER,
+    likes INTEGER,
+    danmaku INTEGER,
+    tag TEXT,
+    stats_at INTEGER
+)
+"""
+
+# Typed columns added to videos by the metadata normalization migration
+_VIDEO_COLUMNS = {
+    "description": "TEXT",
+    "author": "TEXT",
+    "mid": "INTEGER",
+    "duration": "INTEGER",
+    "play": "INTEGER",
+    "likes": "INTEGER",
+    "danmaku": "INTEGER",
+    "tag": "TEXT",
+}
+
+# The full search hit, kept out of the videos table so scans stay narrow.
+# Only read when exporting or when a caller asks for the raw payload.
+# Stored either as JSON text (metadata_json) or zstd-compressed (metadata_zstd)
+# with the version of the raw_dicts dictionary it was compressed with.
+_CREATE_VIDEO_RAW = """
+CREATE TABLE IF NOT EXISTS video_raw (
+    bvid TEXT PRIMARY KEY,
+    metadata_json TEXT,
+    metadata_zstd BLOB,
+    codec_version INTEGER
+)
+"""
+
+# Trained zstd dictionaries for video_raw; old versions are kept for old rows
+_CREATE_RAW_DICTS = """
+CREATE TABLE IF NOT EXISTS raw_dicts (
+    version INTEGER PRIMARY KEY,
+    dict BLOB NOT NULL,
+    trained_at INTEGER,
+    samples INTEGER
 )
 """
 
+# Which configured keywords each stored video matched, or was found by searching
+# for (see save_video_sources); lets cleanup and the keyword filters work per keyword
+_CREATE_VIDEO_MATCHES = """
+CREATE TABLE IF NOT EXISTS video_matches (
+    bvid TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    PRIMARY KEY (bvid, keyword)
+) WITHOUT ROWID
+"""
+
+_CREATE_VIDEO_MATCHES_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_video_matches_keyword ON video_matches(keyword)"
+)
+
+_CREATE_VIDEO_MATCHES_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS videos_delete_matches AFTER DELETE ON videos
+BEGIN
+    DELETE FROM video_matches WHERE bvid = old.bvid;
+END
+"""
+
+# Small key/value store for state such as the keyword-set fingerprint
+_CREATE_META = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)
+"""
+
+_CREATE_VIDEO_RAW_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS videos_delete_raw AFTER DELETE ON videos
+BEGIN
+    DELETE FROM video_raw WHERE bvid = old.bvid;
+END
+"""
+
 _CREATE_RUNS = """
 CREATE TABLE IF NOT EXISTS scrape_runs (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -27,25 +129,294 @@ CREATE TABLE IF NOT EXISTS scrape_runs (
     finished_at INTEGER,
     status TEXT,
     processed_count INTEGER,
-    errors TEXT
+    errors TEXT,
+    metrics_json TEXT
+)
+"""
+
+# Per-keyword paging progress of a run, written as its pages are persisted so an
+# interrupted run can be resumed (see Crawler checkpoints)
+_CREATE_RUN_CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS run_checkpoints (
+    run_id INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    pn INTEGER,
+    newest_pubdate INTEGER,
+    newest_bvid TEXT,
+    results INTEGER,
+    matched INTEGER,
+    done INTEGER,
+    PRIMARY KEY (run_id, keyword)
+) WITHOUT ROWID
+"""
+
+# Counters and histograms recorded during a run (see metrics.RunMetrics).
+# `labels` is a sorted JSON object so it can be part of the key.
+_CREATE_RUN_METRICS = """
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    kind TEXT,
+    value REAL,
+    histogram TEXT,
+    PRIMARY KEY (run_id, name, labels)
+) WITHOUT ROWID
+"""
+
+# Runs in these states did not finish and can be continued with resume
+RESUMABLE_STATUSES = ("running", "interrupted", "failed")
+
+_CREATE_KEYWORD_STATE = """
+CREATE TABLE IF NOT EXISTS keyword_state (
+    keyword TEXT PRIMARY KEY,
+    last_pubdate INTEGER,
+    last_bvid TEXT,
+    updated_at INTEGER,
+    results_seen INTEGER DEFAULT 0,
+    results_matched INTEGER DEFAULT 0
 )
 """
 
+# Backs the hot-ordered listing (web index, /api/videos) and its keyset pagination
+_CREATE_VIDEOS_RANK_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_videos_rank ON videos(hot DESC, scraped_at DESC, bvid)"
+)
+
+# Full-text index over titles and descriptions for /api/search. The trigram
+# tokenizer indexes every 3-character substring, which works for Chinese text
+# without word segmentation. Rows are keyed on videos.id; the
+# search-highlight markup Bilibili puts in titles is stripped before indexing.
+_CREATE_VIDEOS_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(title, description, tokenize='trigram')"
+)
+
+# Title matches weigh ten times more than description matches in bm25 ranking
+_FTS_RANK = "bm25(10.0, 1.0)"
+
+
+def _fts_text(column: str) -> str:
+    return f"replace(replace({column}, '<em class=\"keyword\">', ''), '</em>', '')"
+
+
+# The trigram index cannot look up terms shorter than three characters, which
+# most Chinese words are. videos_fts_chars indexes every character as its own
+# token, so such a term is looked up as a phrase of its characters; matches are
+# candidates that search_videos confirms with LIKE (punctuation is not a token
+# and can sit between the characters). Contentless: only the index is stored.
+_CREATE_VIDEOS_FTS_CHARS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts_chars"
+    " USING fts5(title, description, content='', tokenize='unicode61')"
+)
+
+# Character positions used to split text into space-separated characters in SQL
+# (triggers cannot use recursive CTEs); text beyond the last one is not indexed
+_CREATE_CHAR_POSITIONS = "CREATE TABLE IF NOT EXISTS char_positions (i INTEGER PRIMARY KEY)"
+_FILL_CHAR_POSITIONS = (
+    "INSERT OR IGNORE INTO char_positions(i)"
+    " WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 65535) SELECT i FROM n"
+)
+
+
+def _fts_chars(column: str) -> str:
+    # group_concat follows the char_positions rowid scan, i.e. text order. The
+    # LIMIT keeps SQLite from flattening the subquery, which would strip the
+    # markup again for every character.
+    return (f"(SELECT group_concat(substr(t, i, 1), ' ') FROM (SELECT {_fts_text(column)} AS t LIMIT 1)"
+            f" JOIN char_positions ON i <= length(t))")
+
+
+def _chars_match(terms: List[str]) -> str:
+    """videos_fts_chars query for short search terms, each a phrase of its characters."""
+    phrases = []
+    for term in terms:
+        # unicode61 makes tokens of letters, digits and private-use characters only
+        chars = [ch for ch in term if unicodedata.category(ch)[0] in "LN" or unicodedata.category(ch) == "Co"]
+        if chars:
+            phrases.append('"' + " ".join(chars) + '"')
+    return " AND ".join(phrases)
+
+
+_FTS_INSERT = (
+    f"INSERT INTO videos_fts(rowid, title, description)"
+    f" VALUES (new.id, {_fts_text('new.title')}, {_fts_text('new.description')});"
+    f" INSERT INTO videos_fts_chars(rowid, title, description)"
+    f" VALUES (new.id, {_fts_chars('new.title')}, {_fts_chars('new.description')});"
+)
+
+# A contentless table deletes a row given the exact values it was indexed with
+_FTS_DELETE = (
+    "DELETE FROM videos_fts WHERE rowid = old.id;"
+    " INSERT INTO videos_fts_chars(videos_fts_chars, rowid, title, description)"
+    f" VALUES ('delete', old.id, {_fts_chars('old.title')}, {_fts_chars('old.description')});"
+)
+
+_VIDEOS_FTS_TRIGGER_NAMES = ("videos_fts_insert", "videos_fts_update", "videos_fts_delete")
+
+_CREATE_VIDEOS_FTS_TRIGGERS = (
+    f"""
+CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos
+BEGIN
+    {_FTS_INSERT}
+END
+""",
+    # Re-scrapes rewrite every row; only reindex text that actually changed
+    f"""
+CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF title, description ON videos
+WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+BEGIN
+    {_FTS_DELETE}
+    {_FTS_INSERT}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos
+BEGIN
+    {_FTS_DELETE}
+END
+""",
+)
+
+# Play/like/danmaku counts of every video at every run that saw it, appended by
+# the upsert path (ts is the run's scraped_at). Old samples are thinned out by
+# compact_video_stats.
+_CREATE_VIDEO_STATS = """
+CREATE TABLE IF NOT EXISTS video_stats (
+    bvid TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    play INTEGER,
+    likes INTEGER,
+    danmaku INTEGER,
+    hot INTEGER,
+    PRIMARY KEY (bvid, ts)
+) WITHOUT ROWID
+"""
+
+# Growth of each video over each TREND_WINDOWS window, recomputed from
+# video_stats after every run so /api/trending is a single index scan
+_CREATE_VIDEO_TRENDS = """
+CREATE TABLE IF NOT EXISTS video_trends (
+    window_seconds INTEGER NOT NULL,
+    bvid TEXT NOT NULL,
+    play_delta INTEGER,
+    likes_delta INTEGER,
+    danmaku_delta INTEGER,
+    play_per_day REAL,
+    base_play INTEGER,
+    since INTEGER,
+    until INTEGER,
+    PRIMARY KEY (window_seconds, bvid)
+) WITHOUT ROWID
+"""
+
+_CREATE_VIDEO_TRENDS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_video_trends_rank ON video_trends(window_seconds, play_per_day DESC)"
+)
+
+_CREATE_VIDEO_STATS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS videos_delete_stats AFTER DELETE ON videos
+BEGIN
+    DELETE FROM video_stats WHERE bvid = old.bvid;
+    DELETE FROM video_trends WHERE bvid = old.bvid;
+END
+"""
+
+# Copies the counts a video holds after its upsert (exact ones included)
+_INSERT_VIDEO_STATS = (
+    "INSERT OR REPLACE INTO video_stats(bvid, ts, play, likes, danmaku, hot)"
+    " SELECT bvid, ?, play, likes, danmaku, hot FROM videos WHERE bvid = ?"
+)
+
+# Search index format; a stored value lower than this rebuilds videos_fts and videos_fts_chars
+_FTS_VERSION = "3"
+
+# Columns shown by the web UI
+_LIST_COLUMNS = "bvid, title, pubdate, url, hot, scraped_at"
+
+# Exact counts from the view API (stats_at, see enrich.Enricher) are kept over
+# the rounded search-level ones for DETAIL_TTL seconds
+_KEEP_EXACT = f"videos.stats_at > excluded.scraped_at - {DETAIL_TTL}"
+
+_UPSERT_VIDEO = (
+    "INSERT INTO videos(bvid,title,pubdate,url,scraped_at,hot,description,author,mid,duration,play,likes,danmaku,tag)"
+    " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+    " ON CONFLICT(bvid) DO UPDATE SET title=excluded.title, pubdate=excluded.pubdate, url=excluded.url,"
+    " scraped_at=excluded.scraped_at, description=excluded.description, author=excluded.author,"
+    " mid=excluded.mid, duration=excluded.duration, tag=excluded.tag,"
+    + ", ".join(f"{col}=CASE WHEN {_KEEP_EXACT} THEN videos.{col} ELSE excluded.{col} END"
+                for col in ("hot", "play", "likes", "danmaku"))
+)
+
+_UPSERT_RAW = (
+    "INSERT OR REPLACE INTO video_raw(bvid, metadata_json, metadata_zstd, codec_version) VALUES (?,?,?,?)"
+)
+
+
+async def connect(db_path: str = None) -> aiosqlite.Connection:
+    """Open a connection to the video database with the standard pragmas applied.
+
+    Sharded runs have several processes writing to the database, so a
+    connection waits up to DB_BUSY_TIMEOUT for another one's write lock.
+    """
+    conn = await aiosqlite.connect(db_path or settings().db_path, timeout=DB_BUSY_TIMEOUT)
+    for pragma in _PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+
+def encode_cursor(item: Dict[str, Any]) -> str:
+    """Keyset cursor for a listed video: its (hot, scraped_at, bvid) sort key."""
+    return f"{int(item.get('hot') or 0)}:{int(item.get('scraped_at') or 0)}:{item['bvid']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, str]:
+    try:
+        hot, scraped_at, bvid = cursor.split(":", 2)
+        return int(hot), int(scraped_at), bvid
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
 
 class Persist:
-    def __init__(self, db_path: str = None):
-        self.db_path = db_path or DB_PATH
-        self.conn = None
+    def __init__(self, db_path: str = None, store_raw: bool = True, compress_raw: bool = None,
+                 metrics: RunMetrics = None, conn: aiosqlite.Connection = None):
+        self.db_path = db_path or settings().db_path
+        # Whether to keep each video's raw search hit in video_raw
+        self.store_raw = store_raw
+        # Whether new raw hits are written zstd-compressed (see codec.RawCodec)
+        self.compress_raw = DEFAULT_COMPRESS_RAW if compress_raw is None else compress_raw
+        # A connection passed in (e.g. from the web app's pool) is used as is
+        # and left open by close(); otherwise init() opens one and close() closes it
+        self.conn = conn
+        self._owns_conn = conn is None
+        # Loaded on first use: when writing compressed rows or reading one back
+        self._codec = None
+        self.metrics = metrics or RunMetrics()
 
     async def init(self):
         """Initialize database connection and schema once."""
-        global _SCHEMA_INITIALIZED, _SCHEMA_LOCK
-        
-        self.conn = await aiosqlite.connect(self.db_path)
-        
-        if not _SCHEMA_INITIALIZED:
+        if self._owns_conn:
+            self.conn = await connect(self.db_path)
+
+        if self.db_path not in _SCHEMA_INITIALIZED:
             await self.conn.execute(_CREATE_VIDEOS)
             await self.conn.execute(_CREATE_RUNS)
+            await self.conn.execute(_CREATE_KEYWORD_STATE)
+            await self.conn.execute(_CREATE_VIDEO_RAW)
+            await self.conn.execute(_CREATE_VIDEO_RAW_TRIGGER)
+            await self.conn.execute(_CREATE_VIDEO_MATCHES)
+            await self.conn.execute(_CREATE_VIDEO_MATCHES_INDEX)
+            await self.conn.execute(_CREATE_VIDEO_MATCHES_TRIGGER)
+            await self.conn.execute(_CREATE_META)
+            await self.conn.execute(_CREATE_RUN_CHECKPOINTS)
+            await self.conn.execute(_CREATE_RAW_DICTS)
+            await self.conn.execute(_CREATE_RUN_METRICS)
+            cur = await self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'video_stats'")
+            new_stats = await cur.fetchone() is None
+            await self.conn.execute(_CREATE_VIDEO_STATS)
+            await self.conn.execute(_CREATE_VIDEO_TRENDS)
+            await self.conn.execute(_CREATE_VIDEO_TRENDS_INDEX)
+            await self.conn.execute(_CREATE_VIDEO_STATS_TRIGGER)
             
             # Ensure `hot` column exists for older DBs (migration)
             cur = await self.conn.execute("PRAGMA table_info(videos)")
@@ -53,97 +424,902 @@ class Persist:
             col_names = [c[1] for c in cols]
             if 'hot' not in col_names:
                 await self.conn.execute("ALTER TABLE videos ADD COLUMN hot INTEGER DEFAULT 0")
+            await self._add_missing_columns("videos", _VIDEO_COLUMNS)
+            if 'metadata_json' in col_names and await self.get_meta("metadata_json_migrated") != "1":
+                await self._migrate_metadata_json()
+            await self._add_missing_columns("videos", {"stats_at": "INTEGER"})
+            if 'id' not in col_names:
+                await self._add_video_ids()
+            await self.conn.execute(_CREATE_VIDEOS_RANK_INDEX)
+            await self._add_missing_columns("scrape_runs", {"metrics_json": "TEXT"})
+            await self._add_missing_columns("video_raw", {"metadata_zstd": "BLOB", "codec_version": "INTEGER"})
+            await self._add_missing_columns("keyword_state", {
+                "results_seen": "INTEGER DEFAULT 0",
+                "results_matched": "INTEGER DEFAULT 0",
+            })
+            await self.conn.execute(_CREATE_VIDEOS_FTS)
+            await self.conn.execute(_CREATE_VIDEOS_FTS_CHARS)
+            await self.conn.execute(_CREATE_CHAR_POSITIONS)
+            fts_version = await self.get_meta("fts_version")
+            if fts_version != _FTS_VERSION:
+                # Triggers of an older index format are replaced by the current ones
+                for name in _VIDEOS_FTS_TRIGGER_NAMES:
+                    await self.conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+                await self.conn.execute(_FILL_CHAR_POSITIONS)
+            for trigger in _CREATE_VIDEOS_FTS_TRIGGERS:
+                await self.conn.execute(trigger)
+            if new_stats:
+                # Seed the history with the counts stored before it was kept
+                await self.conn.execute(
+                    "INSERT OR IGNORE INTO video_stats(bvid, ts, play, likes, danmaku, hot)"
+                    " SELECT bvid, scraped_at, play, likes, danmaku, hot FROM videos WHERE scraped_at IS NOT NULL"
+                )
+            if fts_version == "2":
+                # Version 3 only added videos_fts_chars; videos_fts is current
+                await self._index_chars()
+                await self._set_meta("fts_version", _FTS_VERSION)
+            elif fts_version != _FTS_VERSION:
+                # Index the videos stored before the search index existed
+                await self.rebuild_search_index(commit=False)
             
             await self.conn.commit()
-            _SCHEMA_INITIALIZED = True
+            _SCHEMA_INITIALIZED.add(self.db_path)
+
+        if self.compress_raw:
+            if not codec.available():
+                logger.warning("zstandard is not installed; storing raw metadata uncompressed")
+                self.compress_raw = False
+            else:
+                await self._load_codec()
+                if self._codec.version == codec.NO_DICTIONARY:
+                    await self._maybe_train_dictionary()
+
+    async def _add_missing_columns(self, table: str, columns: Dict[str, str]):
+        """Schema migration: add columns introduced after `table` was created."""
+        cur = await self.conn.execute(f"PRAGMA table_info({table})")
+        existing = {c[1] for c in await cur.fetchall()}
+        for name, decl in columns.items():
+            if name not in existing:
+                await self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    async def _add_video_ids(self):
+        """Schema migration: rebuild videos around an explicit `id INTEGER PRIMARY KEY`.
+
+        Rows keep their current rowid as id, so videos_fts stays valid. Columns
+        no longer in the schema (metadata_json) are left behind.
+        """
+        # Left over if an earlier attempt stopped before its transaction committed
+        await self.conn.execute("DROP TABLE IF EXISTS videos_new")
+        await self.conn.execute(_CREATE_VIDEOS.replace("IF NOT EXISTS videos", "videos_new"))
+        cur = await self.conn.execute("PRAGMA table_info(videos_new)")
+        new_columns = {c[1] for c in await cur.fetchall()}
+        cur = await self.conn.execute("PRAGMA table_info(videos)")
+        columns = ",".join(c[1] for c in await cur.fetchall() if c[1] in new_columns)
+        await self.conn.execute(
+            f"INSERT INTO videos_new(id,{columns}) SELECT rowid,{columns} FROM videos WHERE bvid IS NOT NULL"
+        )
+        # Dropping the table also drops its indexes and triggers; put them back
+        await self.conn.execute("DROP TABLE videos")
+        await self.conn.execute("ALTER TABLE videos_new RENAME TO videos")
+        for statement in (_CREATE_VIDEO_RAW_TRIGGER, _CREATE_VIDEO_MATCHES_TRIGGER, _CREATE_VIDEO_STATS_TRIGGER):
+            await self.conn.execute(statement)
+
+    async def _migrate_metadata_json(self):
+        """Schema migration: split the metadata_json blob into typed columns and video_raw."""
+        last_rowid = 0
+        while True:
+            cur = await self.conn.execute(
+                "SELECT rowid, bvid, metadata_json FROM videos WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, DEFAULT_BATCH_SIZE),
+            )
+            rows = await cur.fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            updates = []
+            raws = []
+            for _, bvid, metadata_json in rows:
+                if not metadata_json:
+                    continue
+                metadata = json.loads(metadata_json)
+                fields = video_fields(metadata.get("raw") or {})
+                updates.append(tuple(fields[name] for name in VIDEO_FIELDS) + (bvid,))
+                raws.append((bvid, metadata_json, None, None))
+            await self.conn.executemany(
+                "UPDATE videos SET description=?, author=?, mid=?, duration=?, play=?, likes=?, danmaku=?, tag=?"
+                " WHERE bvid=?", updates,
+            )
+            await self.conn.executemany(_UPSERT_RAW, raws)
+        try:
+            await self.conn.execute("ALTER TABLE videos DROP COLUMN metadata_json")
+        except aiosqlite.OperationalError:
+            # SQLite < 3.35 cannot drop columns; empty it instead
+            await self.conn.execute("UPDATE videos SET metadata_json = NULL")
+        # The emptied column stays on old SQLite; don't scan the table again on every init
+        await self._set_meta("metadata_json_migrated", "1")
 
     async def close(self):
-        await self.conn.close()
+        if self._owns_conn:
+            await self.conn.close()
 
-    async def upsert_video(self, item: Dict[str, Any], scraped_at: int):
-        bvid = item.get("bvid")
+    @staticmethod
+    def _video_row(item: Dict[str, Any], scraped_at: int) -> Tuple:
         hot = int(item.get("hot") or 0)
+        if "play" not in item:
+            item = {**item, **video_fields(item.get("metadata", {}).get("raw") or {})}
+        return (item.get("bvid"), item.get("title"), item.get("pubdate"), item.get("url"), scraped_at, hot) + \
+            tuple(item.get(name) for name in VIDEO_FIELDS)
+
+    async def upsert_video(self, item: Dict[str, Any], scraped_at: int):
+        await self._write_batch([item], scraped_at)
+
+    async def upsert_videos(self, items: Iterable[Dict[str, Any]], scraped_at: int,
+                            batch_size: int = None) -> int:
+        """Upsert many videos, committing once per batch instead of once per row.
+
+        Returns the number of rows written.
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        written = 0
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                written += await self._write_batch(batch, scraped_at)
+                batch = []
+        if batch:
+            written += await self._write_batch(batch, scraped_at)
+        return written
+
+    async def _write_batch(self, items: List[Dict[str, Any]], scraped_at: int) -> int:
+        # sqlite3 opens a transaction implicitly before the first INSERT, so the
+        # whole batch lands in a single transaction closed by commit().
+        rows = [self._video_row(item, scraped_at) for item in items]
+        started = time.perf_counter()
+        try:
+            matched = [item for item in items if "matches" in item]
+            if matched:
+                # Matches recorded by an earlier run are replaced. A video written again
+                # in this run (by another sharded worker's keyword) keeps the ones it has.
+                await self.conn.executemany(
+                    "DELETE FROM video_matches WHERE bvid = ?"
+                    " AND EXISTS (SELECT 1 FROM videos WHERE bvid = ? AND scraped_at IS NOT ?)",
+                    [(item["bvid"], item["bvid"], scraped_at) for item in matched],
+                )
+            await self.conn.executemany(_UPSERT_VIDEO, rows)
+            await self.conn.executemany(_INSERT_VIDEO_STATS, [(scraped_at, row[0]) for row in rows])
+            if matched:
+                await self.conn.executemany(
+                    "INSERT OR IGNORE INTO video_matches(bvid, keyword) VALUES (?,?)",
+                    [(item["bvid"], kw) for item in matched for kw in item["matches"]],
+                )
+            if self.store_raw:
+                await self.conn.executemany(_UPSERT_RAW, [
+                    (item.get("bvid"),) + self._encode_raw(json.dumps(item["metadata"], ensure_ascii=False))
+                    for item in items if item.get("metadata")
+                ])
+            await self.conn.commit()
+        except Exception:
+            await self.conn.rollback()
+            raise
+        self.metrics.observe("db_write_seconds", time.perf_counter() - started)
+        self.metrics.inc("db_rows_written_total", len(rows))
+        return len(rows)
+
+    async def fresh_stats(self, bvids: List[str], since: int) -> set:
+        """The given videos whose exact stats were fetched at or after `since`."""
+        fresh = set()
+        for i in range(0, len(bvids), 500):
+            chunk = bvids[i:i + 500]
+            cursor = await self.conn.execute(
+                f"SELECT bvid FROM videos WHERE bvid IN ({','.join('?' * len(chunk))}) AND stats_at >= ?",
+                chunk + [since],
+            )
+            fresh.update(row[0] for row in await cursor.fetchall())
+        return fresh
+
+    async def update_stats(self, rows: List[Dict[str, Any]], scraped_at: int, fetched_at: int):
+        """Store exact play/like/danmaku counts (from the view API) and the run's video_stats sample."""
+        counts = [(r["play"], r["like"], r["danmaku"], r["play"] or r["like"]) for r in rows]
+        try:
+            await self.conn.executemany(
+                "UPDATE videos SET play=?, likes=?, danmaku=?, hot=?, stats_at=? WHERE bvid=?",
+                [c + (int(fetched_at), r["bvid"]) for c, r in zip(counts, rows)],
+            )
+            await self.conn.executemany(
+                "UPDATE video_stats SET play=?, likes=?, danmaku=?, hot=? WHERE bvid=? AND ts=?",
+                [c + (r["bvid"], int(scraped_at)) for c, r in zip(counts, rows)],
+            )
+            await self.conn.commit()
+        except Exception:
+            await self.conn.rollback()
+            raise
+
+    async def compact_video_stats(self, now: int = None) -> int:
+        """Apply the video_stats retention policy; returns the number of samples removed.
+
+        Samples from the last STATS_FULL_RESOLUTION_DAYS are kept as they are.
+        Older ones are thinned to the newest sample per video per
+        STATS_DOWNSAMPLE_SECONDS bucket, and those older than
+        STATS_RETENTION_DAYS are dropped.
+        """
+        now = now or int(time.time())
+        full_cutoff = now - STATS_FULL_RESOLUTION_DAYS * 86400
+        cursor = await self.conn.execute("DELETE FROM video_stats WHERE ts < ?",
+                                         (now - STATS_RETENTION_DAYS * 86400,))
+        removed = cursor.rowcount
+        cursor = await self.conn.execute(
+            "DELETE FROM video_stats WHERE ts < :cutoff AND EXISTS ("
+            " SELECT 1 FROM video_stats newer WHERE newer.bvid = video_stats.bvid"
+            " AND newer.ts > video_stats.ts AND newer.ts < :cutoff"
+            " AND newer.ts / :bucket = video_stats.ts / :bucket)",
+            {"cutoff": full_cutoff, "bucket": STATS_DOWNSAMPLE_SECONDS},
+        )
+        removed += cursor.rowcount
+        await self.conn.commit()
+        return removed
+
+    async def refresh_trends(self, now: int = None):
+        """Recompute video_trends for every TREND_WINDOWS window from video_stats.
+
+        A video's growth over a window runs from its newest sample back to the
+        newest sample at least one window older (or, for videos first seen
+        within the window, its oldest sample). Only videos sampled within the
+        window and with two samples get a row.
+        """
+        now = now or int(time.time())
+        for window in TREND_WINDOWS.values():
+            await self.conn.execute("DELETE FROM video_trends WHERE window_seconds = ?", (window,))
+            await self.conn.execute(
+                "INSERT INTO video_trends(window_seconds, bvid, play_delta, likes_delta, danmaku_delta,"
+                " play_per_day, base_play, since, until)"
+                " SELECT :window, l.bvid, l.play - b.play, l.likes - b.likes, l.danmaku - b.danmaku,"
+                " (l.play - b.play) * 86400.0 / (l.ts - b.ts), b.play, b.ts, l.ts"
+                " FROM (SELECT bvid, MAX(ts) AS ts FROM video_stats GROUP BY bvid) latest"
+                " JOIN video_stats l ON l.bvid = latest.bvid AND l.ts = latest.ts"
+                " JOIN video_stats b ON b.bvid = l.bvid AND b.ts = COALESCE("
+                "  (SELECT MAX(ts) FROM video_stats WHERE bvid = l.bvid AND ts <= l.ts - :window),"
+                "  (SELECT MIN(ts) FROM video_stats WHERE bvid = l.bvid))"
+                " WHERE latest.ts >= :now - :window AND b.ts < l.ts",
+                {"window": window, "now": now},
+            )
+        await self.conn.commit()
+
+    async def trending(self, window: int, limit: int = 20, keyword: str = None) -> List[Dict[str, Any]]:
+        """Videos with the fastest play growth over `window` seconds (one of TREND_WINDOWS)."""
+        where, params = "t.window_seconds = ?", [window]
+        if keyword:
+            where += " AND EXISTS (SELECT 1 FROM video_matches m WHERE m.bvid = t.bvid AND m.keyword = ?)"
+            params.append(keyword)
+        cursor = await self.conn.execute(
+            "SELECT t.bvid, v.title, v.url, v.hot, t.play_delta, t.likes_delta, t.danmaku_delta,"
+            " t.play_per_day, t.base_play, t.since, t.until"
+            f" FROM video_trends t JOIN videos v ON v.bvid = t.bvid WHERE {where}"
+            " ORDER BY t.play_per_day DESC LIMIT ?",
+            params + [limit],
+        )
+        keys = ("bvid", "title", "url", "hot", "play_delta", "likes_delta", "danmaku_delta",
+                "play_per_day", "base_play", "since", "until")
+        return [dict(zip(keys, row)) for row in await cursor.fetchall()]
+
+    async def get_raw(self, bvid: str) -> Dict[str, Any]:
+        """Return the stored raw search hit of a video, or {} if none was kept."""
+        cursor = await self.conn.execute(
+            "SELECT metadata_json, metadata_zstd, codec_version FROM video_raw WHERE bvid = ?", (bvid,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return {}
+        text = await self._decode_raw(*row)
+        return (json.loads(text).get("raw") or {}) if text else {}
+
+    def _encode_raw(self, text: str) -> Tuple[Optional[str], Optional[bytes], Optional[int]]:
+        """video_raw (metadata_json, metadata_zstd, codec_version) values for a metadata JSON text."""
+        if not self.compress_raw:
+            return text, None, None
+        blob, version = self._codec.compress(text)
+        return None, blob, version
+
+    async def _decode_raw(self, text: Optional[str], blob: Optional[bytes], version: Optional[int]) -> Optional[str]:
+        """Metadata JSON text of a video_raw row, decompressing it if needed."""
+        if blob is None:
+            return text
+        if self._codec is None:
+            await self._load_codec()
+        return self._codec.decompress(blob, version)
+
+    async def _load_codec(self):
+        self._codec = codec.RawCodec()
+        cursor = await self.conn.execute("SELECT version, dict FROM raw_dicts ORDER BY version")
+        for version, data in await cursor.fetchall():
+            self._codec.add_dictionary(version, data)
+
+    async def _maybe_train_dictionary(self):
+        cursor = await self.conn.execute("SELECT COUNT(*) FROM video_raw")
+        if (await cursor.fetchone())[0] >= ZSTD_MIN_TRAIN_ROWS:
+            await self.train_raw_dictionary()
+
+    async def train_raw_dictionary(self, samples: int = None, dict_size: int = None) -> int:
+        """Train a new zstd dictionary version on a random sample of stored raw rows.
+
+        New rows are compressed with it; rows written with older versions stay
+        readable. Returns the new version.
+        """
+        if self._codec is None:
+            await self._load_codec()
+        cursor = await self.conn.execute(
+            "SELECT metadata_json, metadata_zstd, codec_version FROM video_raw ORDER BY RANDOM() LIMIT ?",
+            (samples or ZSTD_TRAIN_SAMPLES,),
+        )
+        texts = [await self._decode_raw(*row) for row in await cursor.fetchall()]
+        data = codec.train_dictionary([t.encode("utf-8") for t in texts if t], dict_size or ZSTD_DICT_SIZE)
+        cursor = await self.conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM raw_dicts")
+        version = (await cursor.fetchone())[0]
         await self.conn.execute(
-            "INSERT INTO videos(bvid,title,pubdate,url,metadata_json,scraped_at,hot) VALUES (?,?,?,?,?,?,?)"
-            " ON CONFLICT(bvid) DO UPDATE SET title=excluded.title, pubdate=excluded.pubdate, url=excluded.url, metadata_json=excluded.metadata_json, scraped_at=excluded.scraped_at, hot=excluded.hot",
-            (bvid, item.get("title"), item.get("pubdate"), item.get("url"), json.dumps(item.get("metadata", {}), ensure_ascii=False), scraped_at, hot),
+            "INSERT INTO raw_dicts(version, dict, trained_at, samples) VALUES (?,?,?,?)",
+            (version, data, int(time.time()), len(texts)),
         )
         await self.conn.commit()
+        self._codec.add_dictionary(version, data)
+        logger.info(f"Trained raw metadata dictionary v{version} ({len(data)} bytes) on {len(texts)} rows")
+        return version
+
+    async def recompress_raw(self, batch_size: int = None) -> int:
+        """Rewrite stored raw rows not yet in the current encoding; returns the number rewritten.
 
-    async def write_run(self, started_at: int, finished_at: int, status: str, processed_count: int, errors: str = ""):
+        With compression on, rows are brought to the newest dictionary; with it
+        off, compressed rows are turned back into JSON text.
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        if self.compress_raw:
+            current = ("metadata_zstd IS NULL OR codec_version != ?", (self._codec.version,))
+        else:
+            current = ("metadata_zstd IS NOT NULL", ())
+        rewritten = 0
+        last_rowid = 0
+        while True:
+            cursor = await self.conn.execute(
+                f"SELECT rowid, bvid, metadata_json, metadata_zstd, codec_version FROM video_raw"
+                f" WHERE rowid > ? AND ({current[0]}) ORDER BY rowid LIMIT ?",
+                (last_rowid,) + current[1] + (batch_size,),
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            updates = []
+            for _, bvid, text, blob, version in rows:
+                text = await self._decode_raw(text, blob, version)
+                if text is not None:
+                    updates.append(self._encode_raw(text) + (bvid,))
+            await self.conn.executemany(
+                "UPDATE video_raw SET metadata_json = ?, metadata_zstd = ?, codec_version = ? WHERE bvid = ?",
+                updates,
+            )
+            await self.conn.commit()
+            rewritten += len(updates)
+        return rewritten
+
+    async def write_run(self, started_at: int, finished_at: int, status: str, processed_count: int, errors: str = "",
+                        metrics: Dict[str, Any] = None):
         await self.conn.execute(
-            "INSERT INTO scrape_runs(started_at,finished_at,status,processed_count,errors) VALUES (?,?,?,?,?)",
-            (started_at, finished_at, status, processed_count, errors),
+            "INSERT INTO scrape_runs(started_at,finished_at,status,processed_count,errors,metrics_json) VALUES (?,?,?,?,?,?)",
+            (started_at, finished_at, status, processed_count, errors,
+             json.dumps(metrics, ensure_ascii=False) if metrics else None),
         )
         await self.conn.commit()
 
-    async def cleanup_unmatched_videos(self, matcher: KeywordMatcher, current_scraped_at: int):
-        """Remove videos that no longer match the current keywords configuration."""
+    async def start_run(self, started_at: int) -> int:
+        """Record a new run as running and return its id.
+
+        Runs left `running` by a process that died are marked `interrupted`.
+        """
+        await self.conn.execute("UPDATE scrape_runs SET status = 'interrupted' WHERE status = 'running'")
         cursor = await self.conn.execute(
-            "SELECT bvid, title, metadata_json FROM videos WHERE scraped_at < ?",
-            (current_scraped_at,)
+            "INSERT INTO scrape_runs(started_at,status,processed_count) VALUES (?,'running',0)", (started_at,)
         )
-        rows = await cursor.fetchall()
+        run_id = cursor.lastrowid
+        await self.conn.execute("DELETE FROM run_checkpoints WHERE run_id != ?", (run_id,))
+        await self.conn.commit()
+        return run_id
 
-        removed_count = 0
-        for row in rows:
-            bvid, title, metadata_json = row
-            metadata = json.loads(metadata_json) if metadata_json else {}
-            raw = metadata.get("raw", {})
+    async def resume_run(self) -> Dict[str, Any]:
+        """Reopen the latest run if it did not finish; return None if there is nothing to resume."""
+        cursor = await self.conn.execute(
+            "SELECT id, started_at, status FROM scrape_runs ORDER BY id DESC LIMIT 1"
+        )
+        row = await cursor.fetchone()
+        if not row or row[2] not in RESUMABLE_STATUSES:
+            return None
+        await self.conn.execute(
+            "UPDATE scrape_runs SET status = 'running', finished_at = NULL, errors = NULL WHERE id = ?", (row[0],)
+        )
+        await self.conn.commit()
+        return {"id": row[0], "started_at": row[1], "status": row[2]}
 
-            # Check if video still matches current keywords
-            matches = set()
-            title_matches = await matcher.match(title or "")
-            matches.update(title_matches)
+    async def finish_run(self, run_id: int, finished_at: int, status: str, processed_count: int,
+                         errors: str = "", metrics: Dict[str, Any] = None):
+        await self.conn.execute(
+            "UPDATE scrape_runs SET finished_at=?, status=?, processed_count=?, errors=?, metrics_json=?"
+            " WHERE id = ?",
+            (finished_at, status, processed_count, errors,
+             json.dumps(metrics, ensure_ascii=False) if metrics else None, run_id),
+        )
+        if status == "success":
+            await self.conn.execute("DELETE FROM run_checkpoints WHERE run_id = ?", (run_id,))
+        await self.conn.commit()
 
-            desc = raw.get("description") or raw.get("desc") or ""
-            if desc:
-                desc_matches = await matcher.match(desc)
-                matches.update(desc_matches)
+    async def save_checkpoints(self, run_id: int, snapshots: List[Dict[str, Any]]):
+        """Store the latest paging snapshot per keyword for `run_id`."""
+        await self.conn.executemany(
+            "INSERT OR REPLACE INTO run_checkpoints(run_id,keyword,pn,newest_pubdate,newest_bvid,results,matched,done)"
+            " VALUES (?,?,?,?,?,?,?,?)",
+            [(run_id, c["keyword"], c["pn"], c["newest_pubdate"], c["newest_bvid"], c["results"],
+              c["matched"], int(c["done"])) for c in snapshots],
+        )
+        await self.conn.commit()
 
-            # If no matches found, remove the video
-            if not matches:
-                await self.conn.execute("DELETE FROM videos WHERE bvid = ?", (bvid,))
-                removed_count += 1
+    async def load_checkpoints(self, run_id: int) -> Dict[str, Dict[str, Any]]:
+        cursor = await self.conn.execute(
+            "SELECT keyword, pn, newest_pubdate, newest_bvid, results, matched, done"
+            " FROM run_checkpoints WHERE run_id = ?", (run_id,)
+        )
+        return {
+            r[0]: {"keyword": r[0], "pn": r[1], "newest_pubdate": r[2], "newest_bvid": r[3],
+                   "results": r[4], "matched": r[5], "done": bool(r[6])}
+            for r in await cursor.fetchall()
+        }
 
-        if removed_count > 0:
+    async def save_run_metrics(self, run_id: int, metrics: RunMetrics):
+        """Add a run's metrics to run_metrics, merging with what other processes stored for it."""
+        await self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in metrics.series():
+                labels = json.dumps(row["labels"], ensure_ascii=False, sort_keys=True)
+                if row["kind"] == "counter":
+                    await self.conn.execute(
+                        "INSERT INTO run_metrics(run_id,name,labels,kind,value) VALUES (?,?,?,'counter',?)"
+                        " ON CONFLICT(run_id,name,labels) DO UPDATE SET value = value + excluded.value",
+                        (run_id, row["name"], labels, row["value"]),
+                    )
+                    continue
+                hist = Histogram.from_dict(row["histogram"])
+                cursor = await self.conn.execute(
+                    "SELECT histogram FROM run_metrics WHERE run_id = ? AND name = ? AND labels = ?",
+                    (run_id, row["name"], labels),
+                )
+                existing = await cursor.fetchone()
+                if existing:
+                    hist.merge(json.loads(existing[0]))
+                await self.conn.execute(
+                    "INSERT OR REPLACE INTO run_metrics(run_id,name,labels,kind,value,histogram)"
+                    " VALUES (?,?,?,'histogram',?,?)",
+                    (run_id, row["name"], labels, hist.count, json.dumps(hist.to_dict())),
+                )
             await self.conn.commit()
+        except Exception:
+            await self.conn.rollback()
+            raise
+
+    async def load_run_metrics(self, run_id: int) -> List[Dict[str, Any]]:
+        cursor = await self.conn.execute(
+            "SELECT name, labels, kind, value, histogram FROM run_metrics WHERE run_id = ? ORDER BY name, labels",
+            (run_id,),
+        )
+        rows = []
+        for name, labels, kind, value, histogram in await cursor.fetchall():
+            row = {"name": name, "labels": json.loads(labels), "kind": kind, "value": value}
+            if histogram:
+                row["histogram"] = json.loads(histogram)
+            rows.append(row)
+        return rows
+
+    async def latest_metrics_run(self) -> Optional[int]:
+        """Id of the newest run that has stored metrics."""
+        cursor = await self.conn.execute("SELECT MAX(run_id) FROM run_metrics")
+        return (await cursor.fetchone())[0]
+
+    async def load_watermarks(self) -> Dict[str, int]:
+        """Return the newest stored pubdate per search keyword."""
+        cursor = await self.conn.execute("SELECT keyword, last_pubdate FROM keyword_state")
+        return {keyword: pubdate for keyword, pubdate in await cursor.fetchall() if pubdate is not None}
+
+    async def save_watermarks(self, newest: Dict[str, Tuple[int, str]], updated_at: int):
+        """Advance per-keyword watermarks; a watermark never moves backwards."""
+        # Rows written by save_keyword_stats alone have no watermark yet (NULL), which
+        # the first one saved must replace rather than compare against
+        await self.conn.executemany(
+            "INSERT INTO keyword_state(keyword,last_pubdate,last_bvid,updated_at) VALUES (?,?,?,?)"
+            " ON CONFLICT(keyword) DO UPDATE SET"
+            " last_bvid=CASE WHEN last_pubdate IS NULL OR excluded.last_pubdate >= last_pubdate"
+            " THEN excluded.last_bvid ELSE last_bvid END,"
+            " last_pubdate=MAX(COALESCE(last_pubdate, excluded.last_pubdate), excluded.last_pubdate),"
+            " updated_at=excluded.updated_at",
+            [(kw, pub, bvid, updated_at) for kw, (pub, bvid) in newest.items()],
+        )
+        await self.conn.commit()
+
+    async def save_video_sources(self, sources: Dict[str, Iterable[str]]):
+        """Attribute stored videos to the search keywords that surfaced them.
+
+        Overlapping keywords return the same videos, which the crawler extracts
+        and matches only once (see crawler.SeenIndex); this lists each of them
+        under every keyword whose search found it.
+        """
+        await self.conn.executemany(
+            "INSERT OR IGNORE INTO video_matches(bvid, keyword) SELECT bvid, ? FROM videos WHERE bvid = ?",
+            [(keyword, bvid) for bvid, keywords in sources.items() for keyword in keywords],
+        )
+        await self.conn.commit()
+
+    async def load_keyword_stats(self) -> Dict[str, Tuple[int, int]]:
+        """Return (results seen, results matched) per search keyword from its last crawl."""
+        cursor = await self.conn.execute(
+            "SELECT keyword, results_seen, results_matched FROM keyword_state WHERE results_seen > 0"
+        )
+        return {keyword: (seen, matched) for keyword, seen, matched in await cursor.fetchall()}
+
+    async def save_keyword_stats(self, progress: Dict[str, Dict[str, Any]], updated_at: int):
+        """Store per-keyword result/match counts of completed keywords."""
+        await self.conn.executemany(
+            "INSERT INTO keyword_state(keyword,updated_at,results_seen,results_matched) VALUES (?,?,?,?)"
+            " ON CONFLICT(keyword) DO UPDATE SET updated_at=excluded.updated_at,"
+            " results_seen=excluded.results_seen, results_matched=excluded.results_matched",
+            [(kw, updated_at, p["results"], p["matched"]) for kw, p in progress.items() if p["done"]],
+        )
+        await self.conn.commit()
+
+    async def count_videos(self, scraped_at: int = None) -> int:
+        """Count stored videos, or only those written by the run that started at `scraped_at`."""
+        if scraped_at is None:
+            cursor = await self.conn.execute("SELECT COUNT(*) FROM videos")
+        else:
+            cursor = await self.conn.execute("SELECT COUNT(*) FROM videos WHERE scraped_at = ?", (scraped_at,))
+        return (await cursor.fetchone())[0]
+
+    async def page_videos(self, limit: int = 20, after: str = None, before: str = None) -> Dict[str, Any]:
+        """Return one page of videos ordered by (hot DESC, scraped_at DESC, bvid).
+
+        Pages are addressed by keyset cursors (see `encode_cursor`) rather than
+        offsets, so every page is an index range scan regardless of its depth.
+        Pass `after` for the page following a cursor, `before` for the one preceding it.
+        """
+        if before:
+            hot, scraped_at, bvid = decode_cursor(before)
+            cursor = await self.conn.execute(
+                f"SELECT {_LIST_COLUMNS} FROM videos"
+                " WHERE hot >= ? AND (hot > ? OR scraped_at > ? OR (scraped_at = ? AND bvid < ?))"
+                " ORDER BY hot ASC, scraped_at ASC, bvid DESC LIMIT ?",
+                (hot, hot, scraped_at, scraped_at, bvid, limit + 1),
+            )
+            rows = await cursor.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit][::-1]
+            has_prev, has_next = has_more, True
+        elif after:
+            hot, scraped_at, bvid = decode_cursor(after)
+            cursor = await self.conn.execute(
+                f"SELECT {_LIST_COLUMNS} FROM videos"
+                " WHERE hot <= ? AND (hot < ? OR scraped_at < ? OR (scraped_at = ? AND bvid > ?))"
+                " ORDER BY hot DESC, scraped_at DESC, bvid ASC LIMIT ?",
+                (hot, hot, scraped_at, scraped_at, bvid, limit + 1),
+            )
+            rows = await cursor.fetchall()
+            has_prev, has_next = True, len(rows) > limit
+            rows = rows[:limit]
+        else:
+            cursor = await self.conn.execute(
+                f"SELECT {_LIST_COLUMNS} FROM videos ORDER BY hot DESC, scraped_at DESC, bvid ASC LIMIT ?",
+                (limit + 1,),
+            )
+            rows = await cursor.fetchall()
+            has_prev, has_next = False, len(rows) > limit
+            rows = rows[:limit]
+
+        items = [
+            {"bvid": r[0], "title": r[1], "pubdate": r[2], "url": r[3], "hot": r[4], "scraped_at": r[5]}
+            for r in rows
+        ]
+        return {
+            "items": items,
+            "next_cursor": encode_cursor(items[-1]) if items and has_next else None,
+            "prev_cursor": encode_cursor(items[0]) if items and has_prev else None,
+        }
+
+    async def rebuild_search_index(self, commit: bool = True):
+        """Re-create videos_fts and videos_fts_chars from the videos table."""
+        await self.conn.execute("DELETE FROM videos_fts")
+        await self.conn.execute(
+            f"INSERT INTO videos_fts(rowid, title, description)"
+            f" SELECT id, {_fts_text('title')}, {_fts_text('description')} FROM videos"
+        )
+        await self._index_chars()
+        await self.conn.execute(f"INSERT INTO videos_fts(videos_fts, rank) VALUES ('rank', '{_FTS_RANK}')")
+        await self._set_meta("fts_version", _FTS_VERSION)
+        if commit:
+            await self.conn.commit()
+
+    async def _index_chars(self):
+        await self.conn.execute("INSERT INTO videos_fts_chars(videos_fts_chars) VALUES ('delete-all')")
+        await self.conn.execute(
+            f"INSERT INTO videos_fts_chars(rowid, title, description)"
+            f" SELECT id, {_fts_chars('title')}, {_fts_chars('description')} FROM videos"
+        )
+
+    async def search_videos(self, q: str = "", keyword: str = None, pubdate_from: int = None,
+                            pubdate_to: int = None, min_hot: int = None, limit: int = 20,
+                            offset: int = 0) -> Dict[str, Any]:
+        """Full-text search over titles and descriptions, best matches first.
+
+        Whitespace-separated terms must all occur (as substrings). Terms of three
+        or more characters are answered by the trigram index and ranked with
+        bm25; shorter terms are checked with LIKE. Without a longer term results
+        are ordered by hot: the hottest SEARCH_PROBE_ROWS videos are checked
+        first, which fills the page for common terms, and otherwise the
+        candidates are looked up in videos_fts_chars, where rare terms have few.
+        Optional filters: a matched `keyword`, a pubdate range and a minimum hot.
+
+        Paginated by offset: ranked results have to be scored in full anyway,
+        so a keyset cursor would not save work.
+        """
+        terms = q.split()
+        indexed = [t for t in terms if len(t) >= 3]
+        short = [t for t in terms if len(t) < 3]
+        where, params = [], []
+        for term in short:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append("(f.title LIKE ? ESCAPE '\\' OR f.description LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        if keyword:
+            where.append("EXISTS (SELECT 1 FROM video_matches m WHERE m.bvid = v.bvid AND m.keyword = ?)")
+            params.append(keyword)
+        if pubdate_from is not None:
+            where.append("v.pubdate >= ?")
+            params.append(pubdate_from)
+        if pubdate_to is not None:
+            where.append("v.pubdate <= ?")
+            params.append(pubdate_to)
+        if min_hot is not None:
+            where.append("v.hot >= ?")
+            params.append(min_hot)
+
+        hot_order = "v.hot DESC, v.scraped_at DESC, v.bvid"
+        chars = _chars_match(short)
+        rows = None
+        if indexed:
+            match = " AND ".join('"' + t.replace('"', '""') + '"' for t in indexed)
+            rows = await self._search_rows("videos_fts f JOIN videos v ON v.id = f.rowid",
+                                           ["videos_fts MATCH ?"] + where, [match] + params, "f.rank",
+                                           limit + 1, offset)
+        elif chars:
+            # Common terms fill the page from the hottest videos alone
+            probe = await self._search_rows(
+                "(SELECT id, bvid, pubdate, url, hot, scraped_at FROM videos"
+                f" ORDER BY hot DESC, scraped_at DESC, bvid LIMIT {SEARCH_PROBE_ROWS}) v"
+                " CROSS JOIN videos_fts f ON f.rowid = v.id", where, params, hot_order, offset + limit + 1, 0)
+            if len(probe) > offset + limit:
+                rows = probe[offset:]
+            elif len(probe) <= limit:
+                # Few matches among the hottest videos: the terms are rare, so
+                # collecting their candidates from the character index is cheap
+                rows = await self._search_rows(
+                    "videos_fts_chars c JOIN videos v ON v.id = c.rowid JOIN videos_fts f ON f.rowid = v.id",
+                    ["videos_fts_chars MATCH ?"] + where, [chars] + params, hot_order,
+                    limit + 1, offset)
+        if rows is None:
+            # Walk idx_videos_rank in hot order and stop once the page is full
+            # (CROSS JOIN keeps SQLite from scanning videos_fts first)
+            rows = await self._search_rows("videos v CROSS JOIN videos_fts f ON f.rowid = v.id",
+                                           where, params, hot_order, limit + 1, offset)
+        items = [
+            {"bvid": r[0], "title": r[1], "snippet": r[2], "pubdate": r[3], "url": r[4], "hot": r[5],
+             "scraped_at": r[6]}
+            for r in rows[:limit]
+        ]
+        return {"items": items, "next_offset": offset + limit if len(rows) > limit else None}
+
+    async def _search_rows(self, source: str, where: List[str], params: List[Any], order: str,
+                           limit: int, offset: int) -> List[Tuple]:
+        """Search result rows from `source`, in the shape search_videos returns them."""
+        cursor = await self.conn.execute(
+            "SELECT v.bvid, highlight(videos_fts, 0, '<em class=\"keyword\">', '</em>'),"
+            " snippet(videos_fts, 1, '<em class=\"keyword\">', '</em>', '…', 24),"
+            f" v.pubdate, v.url, v.hot, v.scraped_at FROM {source}"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + f" ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        return await cursor.fetchall()
+
+    async def last_run(self) -> Dict[str, Any]:
+        cursor = await self.conn.execute(
+            "SELECT id, started_at, finished_at, status, processed_count, errors "
+            "FROM scrape_runs ORDER BY id DESC LIMIT 1"
+        )
+        return self._run_record(await cursor.fetchone())
+
+    async def get_run(self, run_id: int) -> Dict[str, Any]:
+        cursor = await self.conn.execute(
+            "SELECT id, started_at, finished_at, status, processed_count, errors "
+            "FROM scrape_runs WHERE id = ?", (run_id,)
+        )
+        return self._run_record(await cursor.fetchone())
+
+    @staticmethod
+    def _run_record(row: Tuple) -> Dict[str, Any]:
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "started_at": row[1],
+            "finished_at": row[2],
+            "status": row[3],
+            "processed_count": row[4],
+            "errors": row[5],
+        }
+
+    async def clear_videos(self) -> int:
+        """Delete all stored videos and the keyword watermarks that point at them."""
+        cursor = await self.conn.execute("DELETE FROM videos")
+        await self.conn.execute("DELETE FROM keyword_state")
+        await self.conn.commit()
+        return cursor.rowcount
+
+    async def get_meta(self, key: str) -> str:
+        cursor = await self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,))
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def _set_meta(self, key: str, value: str):
+        await self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?,?)", (key, value))
+
+    async def cleanup_unmatched_videos(self, matcher: KeywordMatcher, current_scraped_at: int):
+        """Remove videos that no longer match the current keywords configuration.
+
+        Work is driven by the keyword-set fingerprint stored by the previous call:
+        nothing happens if the keywords are unchanged, removed keywords are
+        dropped from video_matches with set-based DELETEs, and only newly added
+        keywords are matched against the stored titles and descriptions.
+        """
+        fingerprint = matcher.fingerprint
+        if await self.get_meta("keyword_fingerprint") == fingerprint:
+            return 0
+
+        current = set(matcher.keywords)
+        stored_json = await self.get_meta("keyword_set")
+        try:
+            if stored_json is None:
+                # No record of previous keywords (first run or pre-migration DB): match everything
+                await self.conn.execute(
+                    "DELETE FROM video_matches WHERE bvid IN (SELECT bvid FROM videos WHERE scraped_at < ?)",
+                    (current_scraped_at,),
+                )
+                await self._rematch(matcher, current_scraped_at)
+                prune = True
+            else:
+                stored = set(json.loads(stored_json))
+                removed = sorted(stored - current)
+                added = sorted(current - stored)
+                for i in range(0, len(removed), DEFAULT_BATCH_SIZE):
+                    chunk = removed[i:i + DEFAULT_BATCH_SIZE]
+                    await self.conn.execute(
+                        f"DELETE FROM video_matches WHERE keyword IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                if added:
+                    await self._rematch(KeywordMatcher(added), current_scraped_at)
+                prune = bool(removed)
+
+            removed_count = 0
+            if prune:
+                # If no matches are left, remove the video
+                cursor = await self.conn.execute(
+                    "DELETE FROM videos WHERE scraped_at < ?"
+                    " AND NOT EXISTS (SELECT 1 FROM video_matches m WHERE m.bvid = videos.bvid)",
+                    (current_scraped_at,),
+                )
+                removed_count = cursor.rowcount
+            await self._set_meta("keyword_fingerprint", fingerprint)
+            await self._set_meta("keyword_set", json.dumps(sorted(current), ensure_ascii=False))
+            await self.conn.commit()
+        except Exception:
+            await self.conn.rollback()
+            raise
 
         return removed_count
 
+    async def _rematch(self, matcher: KeywordMatcher, current_scraped_at: int):
+        """Record `matcher` keyword matches for older videos, in rowid-ordered chunks."""
+        last_rowid = 0
+        while True:
+            cursor = await self.conn.execute(
+                "SELECT rowid, bvid, title, description FROM videos"
+                " WHERE rowid > ? AND scraped_at < ? ORDER BY rowid LIMIT ?",
+                (last_rowid, current_scraped_at, DEFAULT_BATCH_SIZE),
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            texts = [title or "" for _, _, title, _ in rows] + [desc or "" for _, _, _, desc in rows]
+            # One matcher call per chunk: titles first, then descriptions
+            results = await matcher.match_many(texts)
+            n = len(rows)
+            await self.conn.executemany(
+                "INSERT OR IGNORE INTO video_matches(bvid, keyword) VALUES (?,?)",
+                [(row[1], kw) for i, row in enumerate(rows) for kw in results[i] | results[n + i]],
+            )
+
     async def cleanup_old_videos(self, retention_days: int = 30) -> dict:
         """Clear results.json file (delete its content)."""
-        out_path = DEFAULT_OUTPUT_FILE
+        out_path = settings().output_file
         try:
             # Write empty JSON array
-            os.makedirs(os.path.dirname(out_path), exist_ok=True)
-            with open(out_path, "w", encoding="utf-8") as f:
+            with atomic_write(out_path) as f:
                 json.dump([], f, ensure_ascii=False, indent=2)
             return {"status": "success", "message": "Results cleared", "file": out_path}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    async def export_json(self, out_path: str = None) -> str:
-        """Export all videos to JSON file."""
-        out_path = out_path or DEFAULT_OUTPUT_FILE
+    async def export_json(self, out_path: str = None, fmt: str = None,
+                          chunk_size: int = None) -> str:
+        """Export all videos to a JSON file.
+
+        Rows are streamed from the cursor in chunks and the stored metadata JSON
+        (decompressed if stored compressed) is spliced in verbatim, so memory use
+        is bounded by `chunk_size`. `fmt`
+        is "pretty" (indented array), "compact" (array, no whitespace) or
+        "ndjson" (one object per line). The file is replaced atomically.
+        """
+        out_path = out_path or settings().output_file
+        fmt = fmt or DEFAULT_EXPORT_FORMAT
+        if fmt not in ("pretty", "compact", "ndjson"):
+            raise ValueError(f"Unknown export format: {fmt}")
+        chunk_size = chunk_size or EXPORT_CHUNK_SIZE
         cursor = await self.conn.execute(
-            "SELECT bvid,title,pubdate,url,metadata_json,scraped_at,COALESCE(hot,0) "
-            "FROM videos ORDER BY hot DESC, scraped_at DESC"
-        )
-        rows = await cursor.fetchall()
-        result = []
-        for r in rows:
-            result.append({
-                "bvid": r[0],
-                "title": r[1],
-                "pubdate": r[2],
-                "url": r[3],
-                "metadata": json.loads(r[4]) if r[4] else {},
-                "scraped_at": r[5],
-                "hot": r[6],
-            })
-        
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+            "SELECT v.bvid,v.title,v.pubdate,v.url,r.metadata_json,v.scraped_at,COALESCE(v.hot,0),"
+            "r.metadata_zstd,r.codec_version "
+            "FROM videos v LEFT JOIN video_raw r ON r.bvid = v.bvid ORDER BY v.hot DESC, v.scraped_at DESC"
+        )
+        if fmt == "ndjson":
+            opening, first_sep, sep, closing = "", "", "\n", "\n"
+        elif fmt == "pretty":
+            opening, first_sep, sep, closing = "[", "\n", ",\n", "\n]"
+        else:
+            opening, first_sep, sep, closing = "[", "", ",", "]"
+        with atomic_write(out_path) as f:
+            f.write(opening)
+            first = True
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for r in rows:
+                    if r[7] is not None:
+                        r = r[:4] + (await self._decode_raw(r[4], r[7], r[8]),) + r[5:7]
+                    f.write(first_sep if first else sep)
+                    f.write(_export_record(r, fmt))
+                    first = False
+            if not first:
+                f.write(closing)
+            elif fmt != "ndjson":
+                f.write("]")
         return out_path
+
+
+_EXPORT_FIELDS = ("bvid", "title", "pubdate", "url", "metadata", "scraped_at", "hot")
+
+
+def _export_record(row: Tuple, fmt: str) -> str:
+    """Serialize one exported video, splicing the stored metadata JSON text as-is."""
+    parts = []
+    for name, value in zip(_EXPORT_FIELDS, row):
+        if name == "metadata":
+            encoded = value or "{}"
+        elif fmt == "pretty":
+            encoded = json.dumps(value, ensure_ascii=False)
+        else:
+            encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        parts.append(f'"{name}": {encoded}' if fmt == "pretty" else f'"{name}":{encoded}')
+    if fmt == "pretty":
+        return "  {\n    " + ",\n    ".join(parts) + "\n  }"
+    return "{" + ",".join(parts) + "}"
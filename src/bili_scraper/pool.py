@@ -0,0 +1,68 @@
+"""Long-lived SQLite connections shared by the web app's requests.
+
+Every aiosqlite connection runs its own thread, so opening one per request
+costs more than the queries it serves. The pool opens its connections once:
+several read-only readers, which WAL lets run alongside a writer, and a single
+writer handed to one request at a time.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+import aiosqlite
+from .persist import Persist, connect
+from .utils import DEFAULT_POOL_READERS, settings
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str = None, readers: int = None):
+        self.db_path = db_path or settings().db_path
+        self.size = readers or DEFAULT_POOL_READERS
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all: List[aiosqlite.Connection] = []
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+
+    async def open(self):
+        """Open the writer (creating the schema if needed) and the readers."""
+        self._writer = await connect(self.db_path)
+        self._all.append(self._writer)
+        persist = Persist(db_path=self.db_path, conn=self._writer)
+        await persist.init()
+        for _ in range(self.size):
+            conn = await connect(self.db_path)
+            await conn.execute("PRAGMA query_only=ON")
+            self._all.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._all:
+            await conn.close()
+        self._all.clear()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[Persist]:
+        """A Persist on a read-only connection; waits while all readers are busy."""
+        conn = await self._readers.get()
+        try:
+            yield Persist(db_path=self.db_path, conn=conn)
+        finally:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[Persist]:
+        """A Persist on the writer connection, held by one caller at a time."""
+        async with self._write_lock:
+            try:
+                yield Persist(db_path=self.db_path, conn=self._writer)
+            finally:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
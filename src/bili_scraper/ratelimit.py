@@ -0,0 +1,83 @@
+"""Adaptive request rate limiting driven by server feedback."""
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+from .utils import DEFAULT_RATE_LIMIT, MIN_RATE_LIMIT, MAX_RATE_LIMIT
+
+
+class AdaptiveLimiter:
+    """AIMD rate limiter shared by every request of a run.
+
+    Requests are started 1/rate seconds apart. Each healthy response raises the
+    rate additively (by `increase` requests/sec per second's worth of successes);
+    each throttle signal cuts it multiplicatively, at most once per `cooldown`
+    seconds so a burst of 429s from requests already in flight counts once.
+    A Retry-After hint pauses all requests until it has elapsed.
+
+    Usable as ``async with limiter:`` like aiolimiter.AsyncLimiter.
+    """
+
+    def __init__(self, rate: float = None, min_rate: float = None, max_rate: float = None,
+                 increase: float = 0.2, decrease: float = 0.5, cooldown: float = 1.0):
+        self.rate = float(rate or DEFAULT_RATE_LIMIT)
+        self.min_rate = float(min_rate or MIN_RATE_LIMIT)
+        self.max_rate = max(float(max_rate or MAX_RATE_LIMIT), self.rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.throttle_events = Counter()
+        self.successes = 0
+        self.wait_time = 0.0
+        self._last_request = float("-inf")
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._lowest_rate = self.rate
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        started = time.monotonic()
+        # Waiters queue on the (FIFO) lock; the head re-checks the rate and any
+        # Retry-After pause after every sleep, so changes apply immediately.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                slot = max(self._last_request + 1.0 / self.rate, self._blocked_until)
+                if slot <= now:
+                    break
+                await asyncio.sleep(slot - now)
+            self._last_request = now
+        self.wait_time += time.monotonic() - started
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return None
+
+    def on_success(self):
+        self.successes += 1
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, reason: str, retry_after: Optional[float] = None):
+        """Record a throttle signal (429, 5xx, -412/-799) and slow down."""
+        self.throttle_events[reason] += 1
+        now = time.monotonic()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        if now - self._last_decrease >= self.cooldown:
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._lowest_rate = min(self._lowest_rate, self.rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current rate and throttle counters, for the run record."""
+        return {
+            "current_rate": round(self.rate, 3),
+            "lowest_rate": round(self._lowest_rate, 3),
+            "successes": self.successes,
+            "throttle_events": sum(self.throttle_events.values()),
+            "throttle_by_reason": dict(self.throttle_events),
+            "wait_seconds": round(self.wait_time, 3),
+        }
@@ -1,62 +1,124 @@
 import asyncio
 import logging
+import os
 import sys
-import time
-import portalocker
 from datetime import datetime, timezone
-from .service import perform_scrape
-from .persist import Persist
-from .utils import LOG_DIR, LOCK_PATH, EXIT_SUCCESS, EXIT_PERMANENT_ERROR, EXIT_ALREADY_RUNNING
+from .utils import EXIT_SUCCESS, EXIT_PERMANENT_ERROR, EXIT_ALREADY_RUNNING, configure, settings
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
-    handlers=[
-        logging.FileHandler(
-            f"{LOG_DIR}/run_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.log",
-            encoding='utf-8'
-        ),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger("bili_scraper")
 
 
+def setup_logging():
+    """Log to stdout and to a new file in the log directory (created if needed)."""
+    log_dir = settings().log_dir
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
+        handlers=[
+            logging.FileHandler(
+                os.path.join(log_dir, f"run_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.log"),
+                encoding='utf-8'
+            ),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+
 async def main(args):
     """Run scraper with arguments."""
-    started_at = int(time.time())
     try:
-        result = await perform_scrape(
-            keywords_file=args.keywords,
-            db_path=args.db,
-            out_path=args.out
-        )
+        # Only the code path of the chosen mode is imported
+        if args.mode == "worker":
+            from .shard import work_scrape
+            stats = await work_scrape(
+                db_path=args.db,
+                rate_limit=args.rate_limit,
+                search_url=args.search_url,
+                concurrency=args.concurrency,
+                use_cache=not args.no_cache,
+                cache_ttl=args.cache_ttl,
+                lease_seconds=args.lease,
+                compress_raw=args.compress_raw
+            )
+            logger.info(f"Worker complete: {stats['keywords']} keywords, {stats['processed']} items")
+            return EXIT_SUCCESS
+        if args.mode == "coordinator":
+            from .shard import coordinate_scrape
+            result = await coordinate_scrape(
+                keywords_file=args.keywords,
+                db_path=args.db,
+                out_path=args.out,
+                incremental=not args.full,
+                export_format=args.format
+            )
+        else:
+            from .service import perform_scrape
+            result = await perform_scrape(
+                keywords_file=args.keywords,
+                db_path=args.db,
+                out_path=args.out,
+                rate_limit=args.rate_limit,
+                incremental=not args.full,
+                search_url=args.search_url,
+                concurrency=args.concurrency,
+                export_format=args.format,
+                use_cache=not args.no_cache,
+                cache_ttl=args.cache_ttl,
+                resume=args.resume,
+                compress_raw=args.compress_raw,
+                record_dir=args.record,
+                enrich=args.enrich,
+                detail_url=args.detail_url,
+                detail_rate_limit=args.detail_rate_limit
+            )
         logger.info(f"Scrape complete: {result['processed']} items, exported to {result['out']}")
         return EXIT_SUCCESS
-    except Exception as e:
+    except Exception:
+        # perform_scrape and coordinate_scrape record the failed run themselves
         logger.exception("Fatal error during run")
-        try:
-            persist = Persist(db_path=args.db)
-            await persist.init()
-            await persist.write_run(started_at, int(time.time()), "failed", 0, str(e))
-            await persist.close()
-        except Exception:
-            logger.exception("Failed to record failure in DB")
         return EXIT_PERMANENT_ERROR
 
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Bilibili scraper")
+    parser.add_argument("--mode", choices=["single", "coordinator", "worker"], default="single",
+                        help="single process, or the coordinator / a worker of a sharded run")
+    parser.add_argument("--root", help="project directory for the default db, keywords, output and logs "
+                                       "(default: $BILI_SCRAPER_ROOT or the working directory)")
     parser.add_argument("--keywords", help="path to keywords file")
     parser.add_argument("--db", help="path to sqlite db")
     parser.add_argument("--out", help="path to json output file")
+    parser.add_argument("--full", action="store_true", help="ignore keyword watermarks and crawl every page")
+    parser.add_argument("--concurrency", type=int, help="number of crawler workers (keywords at a time in worker mode)")
+    parser.add_argument("--rate-limit", type=float, help="initial search requests/sec")
+    parser.add_argument("--search-url", help="search API endpoint (e.g. a local stub server)")
+    parser.add_argument("--format", choices=["pretty", "compact", "ndjson"], help="json output format")
+    parser.add_argument("--no-cache", action="store_true", help="always fetch search pages from the network")
+    parser.add_argument("--cache-ttl", type=int, help="seconds a cached search page is reused")
+    parser.add_argument("--resume", action="store_true", help="continue the last run if it did not finish")
+    parser.add_argument("--compress-raw", action="store_true", default=None,
+                        help="store raw search hits zstd-compressed (needs zstandard)")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save every search page used to a replay corpus in DIR")
+    parser.add_argument("--enrich", action="store_true", default=None,
+                        help="fetch exact play/like counts of matched videos from the view API")
+    parser.add_argument("--detail-url", help="view API endpoint for --enrich (e.g. a local stub server)")
+    parser.add_argument("--detail-rate-limit", type=float, help="initial view API requests/sec for --enrich")
+    parser.add_argument("--lease", type=float, help="worker mode: seconds a claimed keyword is leased")
     args = parser.parse_args()
+    configure(root=args.root)
+    setup_logging()
+
+    if args.mode == "worker":
+        # Any number of workers may run at once; the work queue hands out keywords
+        sys.exit(asyncio.run(main(args)))
 
     # Acquire lock to prevent concurrent runs
+    import portalocker
     try:
-        lock = portalocker.Lock(LOCK_PATH, timeout=0)
+        lock = portalocker.Lock(settings().lock_path, timeout=0)
         lock.acquire()
     except portalocker.LockException:
         logger.warning("Another instance is running; exiting")
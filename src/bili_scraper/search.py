@@ -1,19 +1,114 @@
 import aiohttp
 import asyncio
-from typing import Dict, Any, Optional
-from aiolimiter import AsyncLimiter
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from .cache import ResponseCache
+from .corpus import ResponseCorpus
+from .metrics import RunMetrics
+from .ratelimit import AdaptiveLimiter
 from .utils import DEFAULT_HEADERS
 
 SEARCH_URL = "https://api.bilibili.com/x/web-interface/search/type"
 
+# Bilibili answers HTTP 200 with these codes when it wants clients to back off
+THROTTLE_CODES = {-412, -799}
+
+
+class ThrottledError(Exception):
+    """The API asked us to slow down (429, 5xx or a throttling `code`)."""
+
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(f"Throttled ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+# Transient failures worth another attempt; anything else is a bug or an unusable response
+RETRYABLE_ERRORS = (ThrottledError, aiohttp.ClientError, asyncio.TimeoutError)
+
+_network_backoff = wait_exponential(multiplier=1, min=1, max=8)
+
+
+def retry_wait(retry_state) -> float:
+    """tenacity wait: back off after network errors, but not after throttling.
+
+    A throttle signal has already slowed the limiter and, with a Retry-After,
+    paused it, so the retried request waits there and a second delay would
+    only stack on top.
+    """
+    if isinstance(retry_state.outcome.exception(), ThrottledError):
+        return 0
+    return _network_backoff(retry_state)
+
+
+def api_retry(api: str, attempts: int):
+    """tenacity retry for a Bilibili API client method, shared so the clients retry alike.
+
+    Retries RETRYABLE_ERRORS only, waits as retry_wait says and counts each
+    retry in the client's `<api>_retries_total` metric.
+    """
+    def record_retry(retry_state):
+        # args[0] is the client whose method is being retried
+        retry_state.args[0].metrics.inc(f"{api}_retries_total")
+
+    return retry(stop=stop_after_attempt(attempts), wait=retry_wait,
+                 retry=retry_if_exception_type(RETRYABLE_ERRORS), before_sleep=record_retry)
+
+
+def raise_if_throttled(limiter: AdaptiveLimiter, metrics: RunMetrics, api: str, status: int,
+                       headers: Mapping[str, str], code: Any = None):
+    """Raise ThrottledError if a response asks us to back off, after telling the limiter.
+
+    That is a 429 or 5xx status (with its Retry-After hint) or a THROTTLE_CODES
+    `code` in the JSON body of a 200. Counted in `<api>_throttled_total`.
+    """
+    if status == 429 or status >= 500:
+        reason = "http_429" if status == 429 else "http_5xx"
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+    elif code in THROTTLE_CODES:
+        reason, retry_after = f"code_{code}", None
+    else:
+        return
+    limiter.on_throttle(reason, retry_after)
+    metrics.inc(f"{api}_throttled_total", reason=reason)
+    raise ThrottledError(reason, retry_after)
+
+
 class BiliSearchClient:
-    def __init__(self, session: aiohttp.ClientSession, limiter: AsyncLimiter):
+    def __init__(self, session: aiohttp.ClientSession, limiter: AdaptiveLimiter,
+                 search_url: str = None, cache: Optional[ResponseCache] = None,
+                 metrics: RunMetrics = None, recorder: Optional[ResponseCorpus] = None):
         self.session = session
         self.limiter = limiter
+        self.search_url = search_url or SEARCH_URL
+        self.cache = cache
+        self.metrics = metrics or RunMetrics()
+        # Every page handed to the crawler is also saved here for offline replay
+        self.recorder = recorder
 
-    @retry(stop=stop_after_attempt(4), wait=wait_exponential(multiplier=1, min=1, max=8),
-           retry=retry_if_exception_type(Exception))
+    def _record(self, params: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.recorder is not None and isinstance(data, dict) and data.get("code") == 0:
+            self.recorder.save(params["keyword"], params["pn"], params["ps"], data)
+        return data
+
+    @api_retry("search", attempts=4)
     async def search_videos(self, keyword: str, pn: int = 1, ps: int = 20) -> Optional[Dict[str, Any]]:
         params = {
             "search_type": "video",
@@ -22,15 +117,53 @@ class BiliSearchClient:
             "ps": ps,
             "order": "pubdate",
         }
+        cache_key = None
+        cached = None
+        headers = DEFAULT_HEADERS
+        if self.cache is not None:
+            cache_key = self.cache.key(self.search_url, params)
+            cached = await self.cache.get(cache_key)
+            if cached is not None and cached.fresh:
+                self.metrics.inc("search_requests_total", outcome="cache_hit")
+                return self._record(params, cached.data)
+            if cached is not None:
+                # Revalidate the stale copy where the API supports validators
+                headers = dict(DEFAULT_HEADERS)
+                if cached.etag:
+                    headers["If-None-Match"] = cached.etag
+                if cached.last_modified:
+                    headers["If-Modified-Since"] = cached.last_modified
+
+        wait_start = time.perf_counter()
         async with self.limiter:
-            async with self.session.get(SEARCH_URL, params=params, headers=DEFAULT_HEADERS, timeout=20) as resp:
-                if resp.status >= 500:
-                    raise Exception(f"Server error: {resp.status}")
-                if resp.status == 429:
-                    raise Exception("Rate limited (429)")
-                if resp.status != 200:
-                    # Non-retryable for client errors
-                    text = await resp.text()
-                    return {"code": resp.status, "text": text}
-                data = await resp.json()
-                return data
+            started = time.perf_counter()
+            self.metrics.observe("limiter_wait_seconds", started - wait_start)
+            outcome = "error"
+            try:
+                async with self.session.get(self.search_url, params=params, headers=headers, timeout=20) as resp:
+                    if resp.status == 304 and cached is not None:
+                        outcome = "not_modified"
+                        self.limiter.on_success()
+                        await self.cache.refresh(cache_key)
+                        return self._record(params, cached.data)
+                    raise_if_throttled(self.limiter, self.metrics, "search", resp.status, resp.headers)
+                    if resp.status != 200:
+                        # Non-retryable for client errors
+                        outcome = f"http_{resp.status}"
+                        text = await resp.text()
+                        return {"code": resp.status, "text": text}
+                    data = await resp.json()
+                    code = data.get("code") if isinstance(data, dict) else None
+                    raise_if_throttled(self.limiter, self.metrics, "search", resp.status, resp.headers, code)
+                    outcome = "ok"
+                    self.limiter.on_success()
+                    if cache_key is not None and code == 0:
+                        await self.cache.put(cache_key, data, resp.headers.get("ETag"),
+                                             resp.headers.get("Last-Modified"))
+                    return self._record(params, data)
+            except ThrottledError as e:
+                outcome = e.reason
+                raise
+            finally:
+                self.metrics.observe("search_request_seconds", time.perf_counter() - started, outcome=outcome)
+                self.metrics.inc("search_requests_total", outcome=outcome)
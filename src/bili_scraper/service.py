@@ -1,72 +1,190 @@
+import asyncio
+import contextlib
 import time
-import os
-import json
 import aiohttp
 import logging
-from aiolimiter import AsyncLimiter
-from .keywords import KeywordMatcher
+from typing import List
+from .keywords import KeywordMatcher, read_keywords_file
 from .search import BiliSearchClient
-from .crawler import Crawler
+from .detail import BiliDetailClient
+from .enrich import Enricher
+from .crawler import Crawler, page_budgets
+from .ratelimit import AdaptiveLimiter
+from .cache import ResponseCache
+from .corpus import ResponseCorpus
 from .persist import Persist
-from .utils import KEYWORDS_PATH, DEFAULT_RATE_LIMIT, DEFAULT_OUTPUT_FILE
+from .metrics import RunMetrics
+from .events import EventBus
+from .utils import DEFAULT_RATE_LIMIT, DEFAULT_MAX_PAGES, DEFAULT_ENRICH, DETAIL_RATE_LIMIT, settings
 
 logger = logging.getLogger(__name__)
 
+def load_keywords(keywords_file: str = None) -> List[str]:
+    """Read the non-empty lines of the keywords file (config/keywords.txt by default)."""
+    keywords = read_keywords_file(keywords_file or settings().keywords_path)
+    shown = keywords if len(keywords) <= 20 else keywords[:20] + ["..."]
+    logger.info(f"Loaded {len(keywords)} keywords: {shown}")
+    return keywords
+
+
 async def perform_scrape(keywords_file: str = None, db_path: str = None, 
-                        out_path: str = None, rate_limit: int = None) -> dict:
+                        out_path: str = None, rate_limit: int = None,
+                        incremental: bool = True, search_url: str = None,
+                        concurrency: int = None, export_format: str = None,
+                        use_cache: bool = True, cache_ttl: int = None,
+                        resume: bool = False, compress_raw: bool = None,
+                        record_dir: str = None, events: EventBus = None,
+                        enrich: bool = None, detail_url: str = None,
+                        detail_rate_limit: float = None, matcher: KeywordMatcher = None) -> dict:
     """Perform a complete scrape: search → match → persist → export.
+
+    Matched videos are persisted in batches while the crawl is running, so a
+    crash mid-run keeps everything written up to that point.
     
-    Overwrites results.json with new results (not append).
+    Overwrites results.json with new results (not append) once the crawl has finished.
     Uses keywords from keywords.txt to filter results.
+    With `incremental`, paging for each keyword stops once it reaches videos
+    stored by a previous run (see keyword_state watermarks), and keywords with
+    low historical match rates get smaller page budgets.
+    With `use_cache`, search pages fetched within `cache_ttl` seconds are
+    served from the on-disk response cache instead of the network.
+    With `resume`, an unfinished last run is continued from its per-keyword
+    checkpoints instead of starting over; otherwise a new run is started.
+    With `compress_raw`, raw search hits are stored zstd-compressed.
+    With `record_dir`, every search page the crawl uses is saved to a
+    ResponseCorpus there, for replay by the stub server.
+    With `enrich`, exact play/like/danmaku counts of the persisted videos are
+    fetched from the view API (`detail_url`, starting at `detail_rate_limit`
+    requests/sec) in the background while the crawl
+    continues; the run waits for them before exporting.
+    Progress is published on `events` (run_started, the crawler's keyword and
+    page events, batch_persisted, run_finished / run_failed).
+    A long-running caller can pass its already compiled `matcher` (see
+    MatcherReloader) instead of having the keywords file read; otherwise the
+    automaton comes from the on-disk matcher cache when the list is unchanged.
     """
     started_at = int(time.time())
-    out_path = out_path or DEFAULT_OUTPUT_FILE
-    
-    # Clear results.json before starting scrape
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump([], f, ensure_ascii=False, indent=2)
-    
-    # Load keywords from file
-    kw_file = keywords_file or KEYWORDS_PATH
-    if not os.path.exists(kw_file):
-        raise ValueError(f"Keywords file not found: {kw_file}")
-    
-    with open(kw_file, "r", encoding="utf-8") as f:
-        keywords = [line.strip() for line in f if line.strip()]
-    
-    if not keywords:
-        raise ValueError(f"No keywords found in {kw_file}")
-    
-    logger.info(f"Loaded {len(keywords)} keywords: {keywords}")
-    
-    matcher = KeywordMatcher(keywords)
-    
-    # Perform search with rate limiting
-    limiter = AsyncLimiter(rate_limit or DEFAULT_RATE_LIMIT, 1)
-    timeout = aiohttp.ClientTimeout(total=30)
-    
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        search_client = BiliSearchClient(session=session, limiter=limiter)
-        crawler = Crawler(search_client=search_client, matcher=matcher)
-        logger.info(f"Starting crawl with {len(keywords)} keywords")
-        items = await crawler.crawl_all(keywords)
-        logger.info(f"Crawled {len(items)} videos matching keywords.txt")
-    
-    # Persist results
-    persist = Persist(db_path=db_path)
+    out_path = out_path or settings().output_file
+
+    # Timings and counters from the search client, crawler, matcher and
+    # database writes, stored in run_metrics when the run ends
+    run_metrics = RunMetrics()
+    events = events or EventBus()
+
+    # Open the database up front so matched videos are written while the
+    # search requests are still in flight
+    persist = Persist(db_path=db_path, compress_raw=compress_raw, metrics=run_metrics)
     await persist.init()
 
-    # Clean up videos that no longer match current keywords
-    await persist.cleanup_unmatched_videos(matcher, started_at)
+    checkpoints = {}
+    run = await persist.resume_run() if resume else None
+    if run:
+        run_id, started_at = run["id"], run["started_at"]
+        checkpoints = await persist.load_checkpoints(run_id)
+        logger.info(f"Resuming {run['status']} run {run_id} with {len(checkpoints)} keyword checkpoints")
+    else:
+        if resume:
+            logger.info("No unfinished run to resume; starting a new run")
+        run_id = await persist.start_run(started_at)
 
-    for item in items:
-        await persist.upsert_video(item, started_at)
+    processed = 0
+    try:
+        with run_metrics.time("phase_seconds", phase="keywords"):
+            if matcher is not None:
+                matcher = matcher.bind(run_metrics)
+            else:
+                matcher = KeywordMatcher.cached(load_keywords(keywords_file), metrics=run_metrics)
+        keywords = matcher.keywords
+        events.publish("run_started", run_id=run_id, keywords=len(keywords), resumed=bool(run))
 
-    await persist.write_run(started_at, int(time.time()), "success", len(items))
-    export_path = await persist.export_json(out_path=out_path or DEFAULT_OUTPUT_FILE)
-    await persist.close()
-    
-    logger.info(f"Scrape complete: {len(items)} videos exported to {export_path}")
+        # Perform search with rate limiting; the limiter adapts to throttling feedback
+        limiter = AdaptiveLimiter(rate=rate_limit or DEFAULT_RATE_LIMIT)
+        timeout = aiohttp.ClientTimeout(total=30)
+
+        # Clean up videos that no longer match current keywords
+        with run_metrics.time("phase_seconds", phase="cleanup"):
+            await persist.cleanup_unmatched_videos(matcher, started_at)
+
+        watermarks = {}
+        budgets = {}
+        if incremental:
+            watermarks = await persist.load_watermarks()
+            budgets = page_budgets(await persist.load_keyword_stats(), DEFAULT_MAX_PAGES)
+
+        # Crawl batches, checkpoints and the enricher's updates share one connection
+        write_lock = asyncio.Lock()
+
+        async def save_checkpoints(snapshots):
+            async with write_lock:
+                await persist.save_checkpoints(run_id, snapshots)
+
+        cache = ResponseCache(ttl=cache_ttl) if use_cache else None
+        enrich = DEFAULT_ENRICH if enrich is None else enrich
+        enricher = None
+        async with contextlib.AsyncExitStack() as stack:
+            session = await stack.enter_async_context(aiohttp.ClientSession(timeout=timeout))
+            if cache is not None:
+                await stack.enter_async_context(cache)
+            search_client = BiliSearchClient(session=session, limiter=limiter, search_url=search_url,
+                                             cache=cache, metrics=run_metrics,
+                                             recorder=ResponseCorpus(record_dir) if record_dir else None)
+            if enrich:
+                detail_client = BiliDetailClient(session=session, limiter=AdaptiveLimiter(rate=detail_rate_limit or DETAIL_RATE_LIMIT),
+                                                 view_url=detail_url, metrics=run_metrics)
+                enricher = await stack.enter_async_context(
+                    Enricher(detail_client, persist, started_at, metrics=run_metrics, write_lock=write_lock))
+            crawler = Crawler(search_client=search_client, matcher=matcher, watermarks=watermarks,
+                              budgets=budgets, concurrency=concurrency, checkpoints=checkpoints,
+                              keep_raw=persist.store_raw, metrics=run_metrics, events=events,
+                              on_checkpoint=save_checkpoints)
+            logger.info(f"Starting crawl with {len(keywords)} keywords")
+            with run_metrics.time("phase_seconds", phase="crawl"):
+                async for batch in crawler.iter_batches(keywords):
+                    async with write_lock:
+                        processed += await persist.upsert_videos(batch, started_at)
+                    if enricher is not None:
+                        enricher.submit(batch)
+                    events.publish("batch_persisted", size=len(batch), processed=processed)
+                    logger.debug(f"Persisted batch of {len(batch)} videos ({processed} total)")
+            if run:
+                # Include what the interrupted attempt already stored
+                processed = await persist.count_videos(scraped_at=started_at)
+            logger.info(f"Crawled {processed} videos matching keywords.txt")
+            if enricher is not None:
+                with run_metrics.time("phase_seconds", phase="enrich"):
+                    enrich_stats = await enricher.close()
+
+        await persist.save_video_sources(crawler.seen.matched_sources())
+        await persist.save_watermarks(crawler.newest, int(time.time()))
+        await persist.save_keyword_stats(crawler.progress, int(time.time()))
+        with run_metrics.time("phase_seconds", phase="stats"):
+            await persist.compact_video_stats()
+            await persist.refresh_trends()
+
+        metrics = {"limiter": limiter.snapshot()}
+        logger.info(f"Rate limiter: {metrics['limiter']}")
+        if enricher is not None:
+            metrics["enrich"] = enrich_stats
+        if cache is not None:
+            metrics["cache"] = cache.stats()
+            logger.info(f"Response cache: {metrics['cache']}")
+        await persist.finish_run(run_id, int(time.time()), "success", processed, metrics=metrics)
+        with run_metrics.time("phase_seconds", phase="export"):
+            export_path = await persist.export_json(out_path=out_path, fmt=export_format)
+        await persist.save_run_metrics(run_id, run_metrics)
+        events.publish("run_finished", run_id=run_id, processed=processed)
+    except Exception as e:
+        events.publish("run_failed", run_id=run_id, processed=processed, error=str(e))
+        # The run stays resumable; its checkpoints are kept until a successful finish
+        try:
+            await persist.finish_run(run_id, int(time.time()), "failed", processed, str(e))
+            await persist.save_run_metrics(run_id, run_metrics)
+        except Exception:
+            logger.exception("Failed to record failure in DB")
+        raise
+    finally:
+        await persist.close()
+
+    logger.info(f"Scrape complete: {processed} videos exported to {export_path}")
     
-    return {"processed": len(items), "out": export_path}
+    return {"processed": processed, "out": export_path, "metrics": metrics, "run_id": run_id}
@@ -0,0 +1,241 @@
+"""Sharded crawling: one coordinator and any number of worker processes.
+
+The coordinator starts a scrape run, enqueues one work item per keyword in the
+shared database (see workqueue.WorkQueue), waits for the workers to drain the
+queue and then runs the once-per-run steps: watermarks, keyword stats, the
+run record and the export. Each worker claims keywords under a lease, crawls
+them with its own session and rate limiter, and writes matched videos straight
+into the common videos table.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import time
+import aiohttp
+from typing import Any, Dict
+from .keywords import KeywordMatcher
+from .search import BiliSearchClient
+from .crawler import Crawler, page_budgets
+from .ratelimit import AdaptiveLimiter
+from .cache import ResponseCache
+from .persist import Persist
+from .metrics import RunMetrics
+from .service import load_keywords
+from .workqueue import WorkQueue
+from .utils import (DEFAULT_RATE_LIMIT, DEFAULT_MAX_PAGES, DEFAULT_CONCURRENCY,
+                    DEFAULT_LEASE_SECONDS, WORK_POLL_INTERVAL, WORKER_IDLE_TIMEOUT, WORKER_WAIT_TIMEOUT,
+                    settings)
+
+logger = logging.getLogger(__name__)
+
+
+async def coordinate_scrape(keywords_file: str = None, db_path: str = None, out_path: str = None,
+                            incremental: bool = True, export_format: str = None,
+                            poll_interval: float = None, wait_timeout: float = None) -> dict:
+    """Enqueue a run's keywords, wait until workers have crawled them all, then finalize the run.
+
+    Expired leases are reclaimed while waiting. If work is pending but no
+    worker has held a lease for `wait_timeout` seconds, the remaining items
+    are failed and the run finishes as failed instead of waiting forever.
+    """
+    started_at = int(time.time())
+    out_path = out_path or settings().output_file
+    poll_interval = poll_interval or WORK_POLL_INTERVAL
+    wait_timeout = WORKER_WAIT_TIMEOUT if wait_timeout is None else wait_timeout
+
+    run_metrics = RunMetrics()
+    persist = Persist(db_path=db_path, metrics=run_metrics)
+    await persist.init()
+    run_id = await persist.start_run(started_at)
+    processed = 0
+    try:
+        keywords = load_keywords(keywords_file)
+        await persist.cleanup_unmatched_videos(KeywordMatcher.cached(keywords), started_at)
+
+        watermarks = {}
+        budgets = {}
+        if incremental:
+            watermarks = await persist.load_watermarks()
+            budgets = page_budgets(await persist.load_keyword_stats(), DEFAULT_MAX_PAGES)
+
+        async with WorkQueue(db_path=db_path) as queue:
+            await queue.enqueue(run_id, [(kw, budgets.get(kw), watermarks.get(kw)) for kw in keywords])
+            logger.info(f"Run {run_id}: enqueued {len(keywords)} keywords, waiting for workers")
+            last_counts = None
+            last_active = time.monotonic()
+            while True:
+                expired = await queue.expire_leases(run_id)
+                if expired:
+                    logger.warning(f"Run {run_id}: {expired} leases expired without a heartbeat")
+                counts = await queue.counts(run_id)
+                if counts != last_counts:
+                    logger.info(f"Run {run_id} work items: {counts}")
+                    last_counts = counts
+                    last_active = time.monotonic()
+                if counts["pending"] + counts["leased"] == 0:
+                    break
+                if counts["leased"]:
+                    last_active = time.monotonic()
+                elif time.monotonic() - last_active >= wait_timeout:
+                    abandoned = await queue.abandon(run_id, f"no worker claimed it within {wait_timeout}s")
+                    logger.error(f"Run {run_id}: no live worker for {wait_timeout}s, failed {abandoned} items")
+                    continue
+                await asyncio.sleep(poll_interval)
+            items = await queue.items(run_id)
+
+        newest = {i["keyword"]: (i["newest_pubdate"], i["newest_bvid"])
+                  for i in items if i["status"] == "done" and i["newest_pubdate"] is not None}
+        progress = {i["keyword"]: {"results": i["results"], "matched": i["matched"], "done": i["status"] == "done"}
+                    for i in items}
+        await persist.save_watermarks(newest, int(time.time()))
+        await persist.save_keyword_stats(progress, int(time.time()))
+        with run_metrics.time("phase_seconds", phase="stats"):
+            await persist.compact_video_stats()
+            await persist.refresh_trends()
+
+        processed = await persist.count_videos(scraped_at=started_at)
+        failed = [i for i in items if i["status"] == "failed"]
+        metrics = {"shards": {
+            "items": len(items),
+            "failed": len(failed),
+            "workers": sorted({i["owner"] for i in items if i["owner"]}),
+        }}
+        errors = "; ".join(f"{i['keyword']}: {i['error']}" for i in failed)
+        status = "failed" if failed else "success"
+        await persist.finish_run(run_id, int(time.time()), status, processed, errors, metrics=metrics)
+        with run_metrics.time("phase_seconds", phase="export"):
+            export_path = await persist.export_json(out_path=out_path, fmt=export_format)
+        # Merged with the metrics each worker stored for this run
+        await persist.save_run_metrics(run_id, run_metrics)
+    except Exception as e:
+        try:
+            await persist.finish_run(run_id, int(time.time()), "failed", processed, str(e))
+        except Exception:
+            logger.exception("Failed to record failure in DB")
+        raise
+    finally:
+        await persist.close()
+
+    logger.info(f"Sharded run {run_id} {status}: {processed} videos exported to {export_path}")
+    return {"processed": processed, "out": export_path, "metrics": metrics, "run_id": run_id}
+
+
+async def work_scrape(db_path: str = None, rate_limit: float = None, search_url: str = None,
+                      concurrency: int = None, use_cache: bool = True, cache_ttl: int = None,
+                      lease_seconds: float = None, idle_timeout: float = None,
+                      worker_id: str = None, compress_raw: bool = None) -> dict:
+    """Claim and crawl keywords of the open sharded run until its queue is drained.
+
+    Up to `concurrency` keywords are crawled at a time, all sharing this
+    process's session and rate limiter. Leases are renewed every third of
+    `lease_seconds`; if a lease is lost (e.g. this process stalled and another
+    worker took the keyword over) the crawl of that keyword is abandoned.
+    """
+    owner = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    lease_seconds = lease_seconds or DEFAULT_LEASE_SECONDS
+    idle_timeout = WORKER_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+    slots = concurrency or DEFAULT_CONCURRENCY
+    stats = {"processed": 0, "keywords": 0, "lost": 0, "failed": 0}
+
+    run_metrics = RunMetrics()
+    persist = Persist(db_path=db_path, compress_raw=compress_raw, metrics=run_metrics)
+    await persist.init()
+    try:
+        async with WorkQueue(db_path=db_path) as queue:
+            deadline = time.monotonic() + idle_timeout
+            while True:
+                run_id = await queue.open_run()
+                if run_id is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    logger.info(f"Worker {owner}: no open run after {idle_timeout}s, exiting")
+                    return stats
+                await asyncio.sleep(WORK_POLL_INTERVAL)
+
+            started_at = (await persist.get_run(run_id))["started_at"]
+            matcher = KeywordMatcher.cached(await queue.keywords(run_id), metrics=run_metrics)
+            limiter = AdaptiveLimiter(rate=rate_limit or DEFAULT_RATE_LIMIT)
+            # Batches from concurrent keywords share one connection; keep their transactions apart
+            write_lock = asyncio.Lock()
+            logger.info(f"Worker {owner}: joined run {run_id} with {slots} slots")
+
+            cache = ResponseCache(ttl=cache_ttl) if use_cache else None
+            async with contextlib.AsyncExitStack() as stack:
+                session = await stack.enter_async_context(
+                    aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)))
+                if cache is not None:
+                    await stack.enter_async_context(cache)
+                search_client = BiliSearchClient(session=session, limiter=limiter, search_url=search_url,
+                                                 cache=cache, metrics=run_metrics)
+
+                async def crawl_item(item: Dict[str, Any]):
+                    keyword = item["keyword"]
+                    crawler = Crawler(
+                        search_client=search_client, matcher=matcher, concurrency=1, keep_raw=persist.store_raw,
+                        metrics=run_metrics,
+                        watermarks={keyword: item["watermark"]} if item["watermark"] is not None else {},
+                        budgets={keyword: item["budget"]} if item["budget"] else {},
+                    )
+
+                    async def crawl() -> int:
+                        written = 0
+                        async for batch in crawler.iter_batches([keyword]):
+                            async with write_lock:
+                                written += await persist.upsert_videos(batch, started_at)
+                        async with write_lock:
+                            await persist.save_video_sources(crawler.seen.matched_sources())
+                        return written
+
+                    task = asyncio.create_task(crawl())
+                    lost = False
+                    while not task.done():
+                        done, _ = await asyncio.wait({task}, timeout=lease_seconds / 3)
+                        if not done and not await queue.heartbeat(run_id, keyword, owner, lease_seconds):
+                            lost = True
+                            task.cancel()
+                    try:
+                        written = await task
+                    except asyncio.CancelledError:
+                        if not lost:
+                            raise
+                        stats["lost"] += 1
+                        logger.warning(f"Worker {owner}: lost the lease on '{keyword}', abandoning it")
+                        return
+                    except Exception as e:
+                        stats["failed"] += 1
+                        logger.exception(f"Worker {owner}: keyword '{keyword}' failed")
+                        await queue.fail(run_id, keyword, owner, str(e))
+                        return
+
+                    progress = crawler.progress[keyword]
+                    newest_pubdate, newest_bvid = crawler.newest.get(keyword, (None, None))
+                    if await queue.complete(run_id, keyword, owner, {
+                        "pages": progress["pages"], "results": progress["results"],
+                        "matched": progress["matched"], "processed": written,
+                        "newest_pubdate": newest_pubdate, "newest_bvid": newest_bvid,
+                    }):
+                        stats["keywords"] += 1
+                        stats["processed"] += written
+
+                async def slot():
+                    while True:
+                        item = await queue.claim(run_id, owner, lease_seconds)
+                        if item is None:
+                            counts = await queue.counts(run_id)
+                            if counts["pending"] + counts["leased"] == 0:
+                                return
+                            # Others still hold leases; wait in case one of them expires
+                            await asyncio.sleep(WORK_POLL_INTERVAL)
+                            continue
+                        await crawl_item(item)
+
+                await asyncio.gather(*(slot() for _ in range(slots)))
+            await persist.save_run_metrics(run_id, run_metrics)
+    finally:
+        await persist.close()
+
+    stats["limiter"] = limiter.snapshot()
+    logger.info(f"Worker {owner} finished run {run_id}: {stats}")
+    return stats
@@ -0,0 +1,192 @@
+"""Local stand-in for the Bilibili search API, for harness and benchmark scripts.
+
+Serves deterministic synthetic result pages and per-video view stats, or replays a ResponseCorpus of
+recorded pages (pages missing from the corpus come back empty). It can
+simulate throttling: once clients exceed `allowed_rate` requests/sec it
+answers with HTTP 429 (plus Retry-After) or with a Bilibili `code` of -412,
+and it can inject random 429s, 5xx errors and latency. Pages carry an ETag
+and honour If-None-Match.
+
+Run standalone with `python -m bili_scraper.stub_server --corpus DIR`.
+"""
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from aiohttp import web
+from .corpus import ResponseCorpus
+
+SEARCH_PATH = "/x/web-interface/search/type"
+VIEW_PATH = "/x/web-interface/view"
+
+
+def synthetic_page(keyword: str, pn: int, ps: int, total_pages: int,
+                   newest_pubdate: int = 1700000000) -> List[Dict[str, Any]]:
+    """Build a page of search hits ordered by pubdate, like `order=pubdate`."""
+    if pn > total_pages:
+        return []
+    results = []
+    for i in range(ps):
+        n = (pn - 1) * ps + i
+        bvid = f"BV{zlib.crc32(keyword.encode()) % 10**6:06d}{n:05d}"
+        results.append({
+            "type": "video",
+            "bvid": bvid,
+            "aid": n,
+            "author": "stub",
+            "title": f"{keyword} <em class=\"keyword\">测试</em> {n}",
+            "description": f"{keyword} stub video {n}",
+            "pubdate": newest_pubdate - n * 600,
+            "play": f"{n % 97}.{n % 10}万" if n % 3 else str(n * 11),
+            "like": n,
+        })
+    return results
+
+
+class StubSearchServer:
+    def __init__(self, total_pages: int = 5, latency: float = 0.0, error_rate: float = 0.0,
+                 allowed_rate: Optional[float] = None, throttle_mode: str = "429",
+                 retry_after: Optional[float] = None, seed: int = 0,
+                 throttle_rate: float = 0.0, corpus: Optional[ResponseCorpus] = None):
+        self.total_pages = total_pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.corpus = corpus
+        self.allowed_rate = allowed_rate
+        self.throttle_mode = throttle_mode
+        self.retry_after = retry_after
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._tokens = allowed_rate or 0.0
+        self._last_refill = time.monotonic()
+        self._runner = None
+        self.url = None
+        self.view_url = None
+
+    def _allow(self) -> bool:
+        """Token bucket with a one-second burst at `allowed_rate`."""
+        if not self.allowed_rate:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.allowed_rate, self._tokens + (now - self._last_refill) * self.allowed_rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def _fault(self) -> Optional[web.Response]:
+        """Apply latency, then return a throttling or error response if one is due."""
+        self.stats["requests"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not self._allow() or (self.throttle_rate and self._random.random() < self.throttle_rate):
+            self.stats["throttled"] += 1
+            if self.throttle_mode == "412":
+                return web.json_response({"code": -412, "message": "request was banned"})
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after else {}
+            return web.Response(status=429, headers=headers)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+        return None
+
+    async def handle_view(self, request: web.Request) -> web.Response:
+        fault = await self._fault()
+        if fault is not None:
+            return fault
+        self.stats["views"] += 1
+        bvid = request.query.get("bvid", "")
+        if not bvid:
+            return web.json_response({"code": -400, "message": "missing bvid"})
+        view = zlib.crc32(bvid.encode()) % 10**7
+        return web.json_response({"code": 0, "data": {
+            "bvid": bvid,
+            "stat": {"view": view, "like": view // 20, "danmaku": view // 100},
+        }})
+
+    async def handle_search(self, request: web.Request) -> web.Response:
+        fault = await self._fault()
+        if fault is not None:
+            return fault
+        keyword = request.query.get("keyword", "")
+        pn = int(request.query.get("pn", 1))
+        ps = int(request.query.get("ps", 20))
+        if self.corpus is not None:
+            data = self.corpus.load(keyword, pn)
+            self.stats["replayed" if data is not None else "missing"] += 1
+            data = data or {"code": 0, "data": {"result": []}}
+        else:
+            data = {"code": 0, "data": {"result": synthetic_page(keyword, pn, ps, self.total_pages)}}
+        body = json.dumps(data, ensure_ascii=False)
+        etag = '"%08x"' % zlib.crc32(body.encode("utf-8"))
+        if request.headers.get("If-None-Match") == etag:
+            self.stats["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        self.stats["ok"] += 1
+        return web.Response(text=body, content_type="application/json", headers={"ETag": etag})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(SEARCH_PATH, self.handle_search)
+        app.router.add_get(VIEW_PATH, self.handle_view)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}{SEARCH_PATH}"
+        self.view_url = f"http://{host}:{port}{VIEW_PATH}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+async def _serve(args):
+    corpus = ResponseCorpus(args.corpus) if args.corpus else None
+    server = StubSearchServer(total_pages=args.pages, latency=args.latency, error_rate=args.error_rate,
+                              throttle_rate=args.throttle_rate, allowed_rate=args.allowed_rate,
+                              retry_after=args.retry_after, corpus=corpus)
+    await server.start(args.host, args.port)
+    try:
+        print(f"Serving {'%d recorded pages' % len(corpus) if corpus else 'synthetic pages'} at {server.url}"
+              f" (view stats at {server.view_url})")
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local Bilibili search API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--corpus", help="replay recorded pages from this directory")
+    parser.add_argument("--pages", type=int, default=5, help="synthetic pages per keyword")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--allowed-rate", type=float, help="answer 429 above this many requests/sec")
+    parser.add_argument("--retry-after", type=float)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
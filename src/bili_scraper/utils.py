@@ -1,27 +1,127 @@
 """
 Shared utilities and configuration constants.
+
+Filesystem locations are not fixed at import time: they come from a
+`Settings` object built on first use (see `settings()`), so importing the
+package neither reads the working directory nor creates anything on disk.
 """
 import os
-from pathlib import Path
-
-# Paths
-PROJECT_ROOT = os.getcwd()
-CONFIG_DIR = os.path.join(PROJECT_ROOT, "config")
-OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output")
-LOG_DIR = os.path.join(PROJECT_ROOT, "logs")
-DB_PATH = os.path.join(PROJECT_ROOT, "data.sqlite")
-LOCK_PATH = os.path.join(PROJECT_ROOT, "run.lock")
-KEYWORDS_PATH = os.path.join(CONFIG_DIR, "keywords.txt")
-
-# Create directories if needed
-for directory in [CONFIG_DIR, OUTPUT_DIR, LOG_DIR]:
-    os.makedirs(directory, exist_ok=True)
+from contextlib import contextmanager
+
+
+class Settings:
+    """Paths the scraper reads and writes, resolved when first needed.
+
+    Everything is anchored at `root` (BILI_SCRAPER_ROOT, default: the working
+    directory); BILI_SCRAPER_DB, BILI_SCRAPER_KEYWORDS, BILI_SCRAPER_OUTPUT_DIR
+    and BILI_SCRAPER_LOG_DIR move single locations. Keyword arguments take
+    precedence over the environment. Directories are created by whoever
+    writes into them, not here.
+    """
+
+    def __init__(self, root: str = None, db_path: str = None, keywords_path: str = None,
+                 output_dir: str = None, log_dir: str = None):
+        env = os.environ
+        self.project_root = os.path.abspath(root or env.get("BILI_SCRAPER_ROOT") or os.getcwd())
+        self.config_dir = os.path.join(self.project_root, "config")
+        self.output_dir = output_dir or env.get("BILI_SCRAPER_OUTPUT_DIR") or os.path.join(self.project_root, "output")
+        self.log_dir = log_dir or env.get("BILI_SCRAPER_LOG_DIR") or os.path.join(self.project_root, "logs")
+        self.db_path = db_path or env.get("BILI_SCRAPER_DB") or os.path.join(self.project_root, "data.sqlite")
+        self.keywords_path = (keywords_path or env.get("BILI_SCRAPER_KEYWORDS")
+                              or os.path.join(self.config_dir, "keywords.txt"))
+        self.lock_path = os.path.join(self.project_root, "run.lock")
+        self.cache_path = os.path.join(self.project_root, "cache.sqlite")
+        self.matcher_cache_dir = os.path.join(self.project_root, "matcher_cache")
+        self.output_file = os.path.join(self.output_dir, "results.json")
+
+
+_settings = None
+
+
+def settings() -> Settings:
+    """The process-wide settings, resolved from the environment on first call."""
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def configure(**overrides) -> Settings:
+    """Replace the process-wide settings, e.g. from command-line options."""
+    global _settings
+    _settings = Settings(**overrides)
+    return _settings
+
+
+# The former path constants, still importable (resolved through settings()).
+# Code inside the package calls settings() where the path is used instead.
+_SETTING_ATTRS = {
+    "PROJECT_ROOT": "project_root",
+    "CONFIG_DIR": "config_dir",
+    "OUTPUT_DIR": "output_dir",
+    "LOG_DIR": "log_dir",
+    "DB_PATH": "db_path",
+    "LOCK_PATH": "lock_path",
+    "CACHE_PATH": "cache_path",
+    "KEYWORDS_PATH": "keywords_path",
+    "MATCHER_CACHE_DIR": "matcher_cache_dir",
+    "DEFAULT_OUTPUT_FILE": "output_file",
+}
+
+
+def __getattr__(name: str):
+    attr = _SETTING_ATTRS.get(name)
+    if attr is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(settings(), attr)
+
 
 # Default values
-DEFAULT_OUTPUT_FILE = os.path.join(OUTPUT_DIR, "results.json")
-DEFAULT_RATE_LIMIT = 2
+DEFAULT_EXPORT_FORMAT = "pretty"  # pretty | compact | ndjson
+EXPORT_CHUNK_SIZE = 1000
+DEFAULT_RATE_LIMIT = 2  # initial requests/sec; the adaptive limiter moves between the bounds below
+MIN_RATE_LIMIT = 0.2
+MAX_RATE_LIMIT = 10
 DEFAULT_PAGE_SIZE = 20
 DEFAULT_MAX_PAGES = 50
+DEFAULT_MIN_PAGES = 5  # page budget floor for keywords with low historical match rates
+DEFAULT_CONCURRENCY = 4  # crawler workers fetching pages across keywords
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 5  # seconds a partial batch may wait before being persisted
+DEFAULT_MATCH_CACHE_SIZE = 10000
+DEFAULT_COUNT_CACHE_SIZE = 4096  # memoized play/like count strings
+DEFAULT_CACHE_TTL = 3600  # seconds a cached search page is served without revalidation
+DEFAULT_CACHE_MAX_ENTRIES = 50000
+DEFAULT_COMPRESS_RAW = False  # store raw search hits zstd-compressed (requires zstandard)
+ZSTD_LEVEL = 3
+ZSTD_DICT_SIZE = 16384  # bytes of trained dictionary
+ZSTD_TRAIN_SAMPLES = 2000  # stored rows sampled when training a dictionary
+ZSTD_MIN_TRAIN_ROWS = 200  # rows needed before a dictionary is trained
+DEFAULT_WATERMARK_OVERLAP = 86400  # seconds re-crawled below a keyword's newest stored pubdate
+MATCH_THREAD_THRESHOLD = 1000  # texts per match_many call before offloading to a thread
+MATCHER_CACHE_KEEP = 4  # compiled keyword automatons kept in MATCHER_CACHE_DIR
+KEYWORDS_RELOAD_INTERVAL = 5  # seconds between keywords file checks in the web process
+DEFAULT_ENRICH = False  # fetch exact stats for matched videos from the view API
+DETAIL_CONCURRENCY = 2  # view API requests in flight
+DETAIL_RATE_LIMIT = 2  # initial view API requests/sec (adaptive, like search)
+DETAIL_TTL = 86400  # seconds exact stats are reused before a video is fetched again
+ENRICH_BATCH_SIZE = 100  # exact stats written per transaction
+STATS_FULL_RESOLUTION_DAYS = 30  # video_stats samples newer than this are all kept
+STATS_DOWNSAMPLE_SECONDS = 604800  # older samples are thinned to one per video per week
+STATS_RETENTION_DAYS = 365  # samples older than this are dropped
+TREND_WINDOWS = {"1d": 86400, "7d": 604800, "30d": 2592000}  # /api/trending windows (seconds)
+SEARCH_PROBE_ROWS = 2000  # hottest videos a short-term search checks before using the character index
+DEFAULT_POOL_READERS = 4  # read-only connections the web app keeps open
+EVENT_QUEUE_SIZE = 256  # progress events buffered per live subscriber before the oldest are dropped
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments on idle event streams
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+DEFAULT_LEASE_SECONDS = 60  # how long a sharded worker holds a keyword without a heartbeat
+DEFAULT_MAX_ATTEMPTS = 3  # claims per work item before it is given up
+WORK_POLL_INTERVAL = 2  # seconds between work-queue polls by coordinators and idle workers
+WORKER_IDLE_TIMEOUT = 30  # seconds a worker waits for a run with work before exiting
+WORKER_WAIT_TIMEOUT = 600  # seconds a coordinator waits with work pending and no live lease before giving up
+DB_BUSY_TIMEOUT = 30  # seconds a connection waits for another process's write lock
 
 # HTTP settings
 DEFAULT_HEADERS = {
@@ -35,3 +135,47 @@ EXIT_SUCCESS = 0
 EXIT_ALREADY_RUNNING = 4
 EXIT_PERMANENT_ERROR = 2
 EXIT_TRANSIENT_ERROR = 1
+
+
+# O_BINARY keeps Windows from translating newlines a second time below the text layer
+_TEMP_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
+
+def _create_temp(directory: str, name: str):
+    """Create a new temp file for `name` in `directory`; returns (fd, path).
+
+    Unlike mkstemp's 0600, the file gets the mode a plain open() gives it: the
+    kernel applies the umask to 0o666, so the process umask is never changed.
+    """
+    while True:
+        tmp_path = os.path.join(directory, f".tmp-{os.urandom(6).hex()}{name}")
+        try:
+            return os.open(tmp_path, _TEMP_FLAGS, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+@contextmanager
+def atomic_write(path: str, encoding: str = "utf-8"):
+    """Open a temp file next to `path` for writing and rename it over `path` on success.
+
+    Readers (e.g. the web UI serving results.json) never see a half-written file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = _create_temp(directory, name)
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            yield f
+        try:
+            # A replaced file keeps its permissions
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
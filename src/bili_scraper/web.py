@@ -1,34 +1,109 @@
+import asyncio
 import os
 import time
 import json
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
-import portalocker
 import aiosqlite
+import portalocker
 from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from .service import perform_scrape
 from .persist import Persist
-from .utils import LOCK_PATH, DB_PATH, DEFAULT_OUTPUT_FILE
+from .pool import ConnectionPool
+from .metrics import format_prometheus
+from .events import EventBus
+from .keywords import KeywordMatcher, MatcherReloader
+from .utils import SSE_KEEPALIVE, TREND_WINDOWS, atomic_write, settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared connection pool (creating the schema) and watch the keywords file for the app's lifetime."""
+    app.state.pool = ConnectionPool()
+    await app.state.pool.open()
+    logger.info("Database initialized successfully")
+    app.state.keywords = MatcherReloader(settings().keywords_path)
+    await app.state.keywords.start()
+    try:
+        yield
+    finally:
+        await app.state.keywords.close()
+        await app.state.pool.close()
+
 
-app = FastAPI(title="Bili Scraper UI")
+app = FastAPI(title="Bili Scraper UI", lifespan=lifespan)
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 logger = logging.getLogger("bili_scraper.web")
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup to ensure tables exist."""
+# COUNT(*) scans the whole table, while the total only changes when a scrape or
+# delete runs; cache it briefly (other processes may write too) and invalidate locally.
+VIDEO_TOTAL_TTL = 60
+_video_total = {"value": None, "expires": 0.0}
+
+
+async def _count_videos(persist: Persist) -> int:
+    now = time.monotonic()
+    if _video_total["value"] is None or now >= _video_total["expires"]:
+        _video_total["value"] = await persist.count_videos()
+        _video_total["expires"] = now + VIDEO_TOTAL_TTL
+    return _video_total["value"]
+
+
+def _invalidate_video_total():
+    _video_total["value"] = None
+
+
+# The index page shows the newest scrape_runs row on every load, but it only
+# changes when a run starts or finishes; cached the same way as the total.
+LAST_RUN_TTL = 60
+_last_run = {"value": None, "expires": 0.0}
+
+
+async def _get_last_run(persist: Persist) -> dict:
+    now = time.monotonic()
+    if now >= _last_run["expires"]:
+        _last_run["value"] = await persist.last_run()
+        _last_run["expires"] = now + LAST_RUN_TTL
+    return _last_run["value"]
+
+
+def _invalidate_last_run():
+    _last_run["expires"] = 0.0
+
+
+def _pool() -> ConnectionPool:
+    return app.state.pool
+
+
+async def _matcher() -> KeywordMatcher:
+    """The compiled keywords, re-checked against the file so a scrape never starts with a stale list."""
+    reloader: MatcherReloader = app.state.keywords
+    await reloader.refresh()
+    return reloader.matcher
+
+
+# Progress of scrapes started from this process, streamed by /api/scrape/events
+events = EventBus()
+_scrape_running = {"value": False}
+
+
+def _lock_held() -> bool:
+    """Whether some process (e.g. a scheduled CLI run) holds run.lock."""
     try:
-        persist = Persist()
-        await persist.init()
-        await persist.close()
-        logger.info("Database initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
+        lock_path = settings().lock_path
+        if not os.path.exists(lock_path):
+            return False
+        lock = portalocker.Lock(lock_path, timeout=0)
+        lock.acquire()
+        lock.release()
+        return False
+    except portalocker.LockException:
+        return True
 
 # Template filter to format unix timestamps
 def format_ts_filter(ts):
@@ -43,76 +118,137 @@ templates.env.filters['format_ts'] = format_ts_filter
 @app.get("/api/status")
 async def api_status():
     """Return whether a background scrape is currently running."""
-    try:
-        if not os.path.exists(LOCK_PATH):
-            return {"running": False}
-        lock = portalocker.Lock(LOCK_PATH, timeout=0)
-        lock.acquire()
-        lock.release()
-        return {"running": False}
-    except portalocker.LockException:
-        return {"running": True}
+    return {"running": _scrape_running["value"] or _lock_held()}
+
+
+@app.get("/api/keywords")
+async def api_keywords():
+    """The keyword list the next scrape started here will use."""
+    reloader: MatcherReloader = app.state.keywords
+    matcher = await _matcher()
+    if matcher is None:
+        raise HTTPException(status_code=404, detail=f"No keywords loaded from {reloader.keywords_file}")
+    return {"count": len(matcher.keywords), "digest": matcher.digest, "loaded_at": reloader.loaded_at}
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@app.get("/api/scrape/events")
+async def scrape_events(request: Request):
+    """Stream scrape progress as server-sent events.
+
+    The first event is `status`; after that every event published by a scrape
+    started from this process follows. A client that reads too slowly skips
+    events (visible as gaps in the ids) instead of slowing the scrape down.
+    """
+    async def stream():
+        with events.subscribe() as sub:
+            running = _scrape_running["value"] or await asyncio.to_thread(_lock_held)
+            yield _sse({"id": 0, "type": "status", "running": running, "in_process": _scrape_running["value"]})
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=SSE_KEEPALIVE)
+                yield _sse(event) if event is not None else ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/")
-async def index(request: Request, page: int = 1, per_page: int = 20):
-    """Main page with paginated video list from results.json."""
-    page = max(1, page)
-    offset = (page - 1) * per_page
-    
-    # Load data from results.json
-    if not os.path.exists(DEFAULT_OUTPUT_FILE):
-        all_videos = []
-        last_run = None
-    else:
+async def index(request: Request, per_page: int = 20, after: str = None, before: str = None):
+    """Main page with the hot-ordered video list, paginated by keyset cursors."""
+    per_page = min(max(1, per_page), 200)
+    async with _pool().reader() as persist:
         try:
-            with open(DEFAULT_OUTPUT_FILE, "r", encoding="utf-8") as f:
-                all_videos = json.load(f)
-        except Exception:
-            all_videos = []
-        
-        # Get last run from database
-        try:
-            async with aiosqlite.connect(DB_PATH) as db:
-                cur = await db.execute(
-                    "SELECT id, started_at, finished_at, status, processed_count, errors "
-                    "FROM scrape_runs ORDER BY id DESC LIMIT 1"
-                )
-                last_run_row = await cur.fetchone()
-                
-                last_run = (
-                    {
-                        "id": last_run_row[0],
-                        "started_at": last_run_row[1],
-                        "finished_at": last_run_row[2],
-                        "status": last_run_row[3],
-                        "processed_count": last_run_row[4],
-                        "errors": last_run_row[5]
-                    }
-                    if last_run_row else None
-                )
-        except Exception as e:
-            logger.error(f"Failed to query database: {e}")
-            last_run = None
-    
-    # Get pagination
-    total = len(all_videos)
-    videos = all_videos[offset:offset + per_page]
-    total_pages = (total + per_page - 1) // per_page if total > 0 else 0
-    pagination = {"page": page, "per_page": per_page, "total": total, "total_pages": total_pages}
-    
+            page = await persist.page_videos(limit=per_page, after=after, before=before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        total = await _count_videos(persist)
+        last_run = await _get_last_run(persist)
+
+    pagination = {
+        "per_page": per_page,
+        "total": total,
+        "next_cursor": page["next_cursor"],
+        "prev_cursor": page["prev_cursor"],
+    }
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "videos": videos,
+        "videos": page["items"],
         "last_run": last_run,
         "pagination": pagination
     })
 
+
+@app.get("/api/videos")
+async def api_videos(limit: int = 20, after: str = None, before: str = None):
+    """Page through stored videos as JSON; follow `next_cursor` with `after=`."""
+    limit = min(max(1, limit), 200)
+    async with _pool().reader() as persist:
+        try:
+            return await persist.page_videos(limit=limit, after=after, before=before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/api/search")
+async def api_search(q: str = "", keyword: str = None, pubdate_from: int = None, pubdate_to: int = None,
+                     min_hot: int = None, limit: int = 20, offset: int = 0):
+    """Full-text search over stored titles and descriptions; follow `next_offset` with `offset=`."""
+    limit = min(max(1, limit), 200)
+    async with _pool().reader() as persist:
+        try:
+            return await persist.search_videos(q=q, keyword=keyword, pubdate_from=pubdate_from,
+                                               pubdate_to=pubdate_to, min_hot=min_hot, limit=limit,
+                                               offset=max(0, offset))
+        except aiosqlite.OperationalError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
+
+@app.get("/api/trending")
+async def api_trending(window: str = "7d", limit: int = 20, keyword: str = None):
+    """Videos ranked by play growth over the window (1d, 7d or 30d)."""
+    if window not in TREND_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(TREND_WINDOWS)}")
+    limit = min(max(1, limit), 200)
+    async with _pool().reader() as persist:
+        items = await persist.trending(TREND_WINDOWS[window], limit=limit, keyword=keyword)
+    return {"window": window, "items": items}
+
+
+@app.get("/api/runs/{run_id}/metrics")
+async def api_run_metrics(run_id: int):
+    """Timings and counters recorded during one scrape run."""
+    async with _pool().reader() as persist:
+        run = await persist.get_run(run_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+        return {"run": run, "metrics": await persist.load_run_metrics(run_id)}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Metrics of the latest run with recorded metrics, in the Prometheus text format."""
+    async with _pool().reader() as persist:
+        run_id = await persist.latest_metrics_run()
+        if run_id is None:
+            return PlainTextResponse("", media_type="text/plain; version=0.0.4")
+        run = await persist.get_run(run_id)
+        series = await persist.load_run_metrics(run_id)
+    gauges = {
+        "last_run_id": run_id,
+        "last_run_start_timestamp_seconds": run["started_at"] or 0,
+        "last_run_duration_seconds": (run["finished_at"] or run["started_at"] or 0) - (run["started_at"] or 0),
+        "last_run_processed": run["processed_count"] or 0,
+        "last_run_success": int(run["status"] == "success"),
+    }
+    return PlainTextResponse(format_prometheus(series, gauges), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/scrape")
 async def start_scrape(request: Request, background_tasks: BackgroundTasks):
     """Start a background scrape operation."""
     try:
-        lock = portalocker.Lock(LOCK_PATH, timeout=0)
+        lock = portalocker.Lock(settings().lock_path, timeout=0)
         lock.acquire()
     except portalocker.LockException:
         raise HTTPException(status_code=409, detail="Scrape already running")
@@ -123,32 +259,43 @@ async def start_scrape(request: Request, background_tasks: BackgroundTasks):
         body = {}
     
     mode = body.get('mode', 'recent')
+    resume = bool(body.get('resume', False))
+    matcher = await _matcher()
 
     async def _scrape_task():
         try:
-            logger.info(f"Background scrape started mode={mode}")
-            await perform_scrape(out_path=DEFAULT_OUTPUT_FILE)
+            # The crawl stack (aiohttp, tenacity, ...) is only loaded once a scrape is started
+            from .service import perform_scrape
+
+            logger.info(f"Background scrape started mode={mode} resume={resume}")
+            await perform_scrape(out_path=settings().output_file, resume=resume, events=events, matcher=matcher)
             logger.info("Background scrape finished")
+            _invalidate_video_total()
         except Exception:
             logger.exception("Background scrape failed")
         finally:
+            _scrape_running["value"] = False
+            _invalidate_last_run()
             try:
                 lock.release()
             except Exception:
                 pass
 
+    _scrape_running["value"] = True
     background_tasks.add_task(_scrape_task)
-    return {"status": "started", "mode": mode}
+    return {"status": "started", "mode": mode, "resume": resume}
 
 
 @app.post("/api/delete-results")
 async def delete_results():
-    """Delete/clear the results.json file."""
+    """Delete stored videos and clear the results.json file."""
     try:
         logger.info("Delete results started")
-        # Clear results.json
-        os.makedirs(os.path.dirname(DEFAULT_OUTPUT_FILE), exist_ok=True)
-        with open(DEFAULT_OUTPUT_FILE, "w", encoding="utf-8") as f:
+        # The index page lists the videos table, so clear it along with results.json
+        async with _pool().writer() as persist:
+            await persist.clear_videos()
+        _invalidate_video_total()
+        with atomic_write(settings().output_file) as f:
             json.dump([], f, ensure_ascii=False, indent=2)
         logger.info("Results cleared successfully")
         return {"status": "success", "message": "Results cleared"}
@@ -160,10 +307,11 @@ async def delete_results():
 @app.get("/results.json")
 async def get_results():
     """Download results as JSON file."""
-    if not os.path.exists(DEFAULT_OUTPUT_FILE):
+    out_path = settings().output_file
+    if not os.path.exists(out_path):
         raise HTTPException(status_code=404, detail="Results not found")
     return FileResponse(
-        DEFAULT_OUTPUT_FILE,
+        out_path,
         media_type='application/json',
         filename='results.json'
     )
@@ -0,0 +1,226 @@
+"""SQLite-backed queue of per-keyword work items for sharded crawling.
+
+A coordinator enqueues one item per keyword for a scrape run. Worker processes,
+on this host or on others sharing the database file, claim items under a lease
+that they keep alive with heartbeats. A lease that is not renewed expires and
+the item can be claimed by another worker, up to `max_attempts` claims.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import aiosqlite
+from .utils import DB_BUSY_TIMEOUT, DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, settings
+
+_CREATE_WORK_ITEMS = """
+CREATE TABLE IF NOT EXISTS work_items (
+    run_id INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    seq INTEGER,
+    budget INTEGER,
+    watermark INTEGER,
+    status TEXT DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER DEFAULT 0,
+    error TEXT,
+    pages INTEGER,
+    results INTEGER,
+    matched INTEGER,
+    processed INTEGER,
+    newest_pubdate INTEGER,
+    newest_bvid TEXT,
+    finished_at INTEGER,
+    PRIMARY KEY (run_id, keyword)
+)
+"""
+
+_CREATE_WORK_ITEMS_INDEX = "CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items(run_id, status)"
+
+_ITEM_FIELDS = ("keyword", "budget", "watermark", "status", "owner", "attempts", "error", "pages",
+                "results", "matched", "processed", "newest_pubdate", "newest_bvid")
+_ITEM_COLUMNS = ", ".join(_ITEM_FIELDS)
+
+
+def _item(row: Tuple) -> Dict[str, Any]:
+    return dict(zip(_ITEM_FIELDS, row))
+
+
+class WorkQueue:
+    """Lease-based work queue stored in the scraper database.
+
+    Every state change runs in a `BEGIN IMMEDIATE` transaction, so concurrent
+    claims from several processes are serialized by SQLite's write lock and an
+    item is never handed to two live workers.
+    """
+
+    def __init__(self, db_path: str = None, max_attempts: int = None):
+        self.db_path = db_path or settings().db_path
+        self.max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+        self.conn = None
+        self._lock = None
+
+    async def open(self):
+        self._lock = asyncio.Lock()
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE.
+        # The timeout is how long to wait for another process holding the write lock.
+        self.conn = await aiosqlite.connect(self.db_path, timeout=DB_BUSY_TIMEOUT, isolation_level=None)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA synchronous=NORMAL")
+        await self.conn.execute(_CREATE_WORK_ITEMS)
+        await self.conn.execute(_CREATE_WORK_ITEMS_INDEX)
+
+    async def close(self):
+        if self.conn:
+            await self.conn.close()
+            self.conn = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _transaction(self, statements) -> Any:
+        """Run `statements(conn)` inside BEGIN IMMEDIATE ... COMMIT."""
+        async with self._lock:
+            await self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = await statements(self.conn)
+            except BaseException:
+                await self.conn.execute("ROLLBACK")
+                raise
+            await self.conn.execute("COMMIT")
+            return result
+
+    async def enqueue(self, run_id: int, items: Iterable[Tuple[str, Optional[int], Optional[int]]]):
+        """Add (keyword, page budget, watermark) work items for `run_id`."""
+        rows = [(run_id, keyword, seq, budget, watermark) for seq, (keyword, budget, watermark) in enumerate(items)]
+
+        async def statements(conn):
+            await conn.executemany(
+                "INSERT OR IGNORE INTO work_items(run_id, keyword, seq, budget, watermark) VALUES (?,?,?,?,?)", rows
+            )
+        await self._transaction(statements)
+
+    async def open_run(self) -> Optional[int]:
+        """Return the newest run that still has unfinished work items."""
+        cursor = await self.conn.execute(
+            "SELECT MAX(run_id) FROM work_items WHERE status IN ('pending', 'leased')"
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def keywords(self, run_id: int) -> List[str]:
+        cursor = await self.conn.execute("SELECT keyword FROM work_items WHERE run_id = ? ORDER BY seq", (run_id,))
+        return [row[0] for row in await cursor.fetchall()]
+
+    async def claim(self, run_id: int, owner: str, lease_seconds: float = None) -> Optional[Dict[str, Any]]:
+        """Lease the next pending (or expired) item to `owner`; None if nothing is claimable."""
+        lease_seconds = lease_seconds or DEFAULT_LEASE_SECONDS
+
+        async def statements(conn):
+            now = time.time()
+            # Expired leases that used up their attempts are not retried again
+            await conn.execute(
+                "UPDATE work_items SET status = 'failed', error = COALESCE(error, 'lease expired')"
+                " WHERE run_id = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (run_id, now, self.max_attempts),
+            )
+            cursor = await conn.execute(
+                f"SELECT {_ITEM_COLUMNS} FROM work_items WHERE run_id = ?"
+                " AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))"
+                " ORDER BY attempts, seq LIMIT 1",
+                (run_id, now),
+            )
+            row = await cursor.fetchone()
+            if not row:
+                return None
+            item = _item(row)
+            await conn.execute(
+                "UPDATE work_items SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1"
+                " WHERE run_id = ? AND keyword = ?",
+                (owner, now + lease_seconds, run_id, item["keyword"]),
+            )
+            item.update(status="leased", owner=owner, attempts=item["attempts"] + 1)
+            return item
+        return await self._transaction(statements)
+
+    async def heartbeat(self, run_id: int, keyword: str, owner: str, lease_seconds: float = None) -> bool:
+        """Extend a lease; False means `owner` no longer holds it and should stop."""
+        lease_seconds = lease_seconds or DEFAULT_LEASE_SECONDS
+
+        async def statements(conn):
+            cursor = await conn.execute(
+                "UPDATE work_items SET lease_expires = ? WHERE run_id = ? AND keyword = ?"
+                " AND owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, run_id, keyword, owner),
+            )
+            return cursor.rowcount == 1
+        return await self._transaction(statements)
+
+    async def complete(self, run_id: int, keyword: str, owner: str, result: Dict[str, Any]) -> bool:
+        """Mark an item done with its crawl summary, if `owner` still holds the lease."""
+        async def statements(conn):
+            cursor = await conn.execute(
+                "UPDATE work_items SET status = 'done', error = NULL, pages = ?, results = ?, matched = ?,"
+                " processed = ?, newest_pubdate = ?, newest_bvid = ?, finished_at = ?"
+                " WHERE run_id = ? AND keyword = ? AND owner = ? AND status = 'leased'",
+                (result["pages"], result["results"], result["matched"], result["processed"],
+                 result.get("newest_pubdate"), result.get("newest_bvid"), int(time.time()),
+                 run_id, keyword, owner),
+            )
+            return cursor.rowcount == 1
+        return await self._transaction(statements)
+
+    async def fail(self, run_id: int, keyword: str, owner: str, error: str):
+        """Release a lease after an error; the item is retried until it runs out of attempts."""
+        async def statements(conn):
+            await conn.execute(
+                "UPDATE work_items SET error = ?, lease_expires = NULL,"
+                " status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END"
+                " WHERE run_id = ? AND keyword = ? AND owner = ? AND status = 'leased'",
+                (error, self.max_attempts, run_id, keyword, owner),
+            )
+        await self._transaction(statements)
+
+    async def expire_leases(self, run_id: int) -> int:
+        """Return expired leases to pending (or fail them once out of attempts); returns how many expired.
+
+        Workers do this when they claim; the coordinator does it too, so a run
+        whose workers all died still sees its leases lapse.
+        """
+        async def statements(conn):
+            cursor = await conn.execute(
+                "UPDATE work_items SET lease_expires = NULL,"
+                " status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " error = CASE WHEN attempts >= ? THEN COALESCE(error, 'lease expired') ELSE error END"
+                " WHERE run_id = ? AND status = 'leased' AND lease_expires < ?",
+                (self.max_attempts, self.max_attempts, run_id, time.time()),
+            )
+            return cursor.rowcount
+        return await self._transaction(statements)
+
+    async def abandon(self, run_id: int, error: str) -> int:
+        """Fail every pending item of a run; returns how many there were."""
+        async def statements(conn):
+            cursor = await conn.execute(
+                "UPDATE work_items SET status = 'failed', error = ? WHERE run_id = ? AND status = 'pending'",
+                (error, run_id),
+            )
+            return cursor.rowcount
+        return await self._transaction(statements)
+
+    async def counts(self, run_id: int) -> Dict[str, int]:
+        cursor = await self.conn.execute(
+            "SELECT status, COUNT(*) FROM work_items WHERE run_id = ? GROUP BY status", (run_id,)
+        )
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update({status: n for status, n in await cursor.fetchall()})
+        return counts
+
+    async def items(self, run_id: int) -> List[Dict[str, Any]]:
+        cursor = await self.conn.execute(
+            f"SELECT {_ITEM_COLUMNS} FROM work_items WHERE run_id = ? ORDER BY seq", (run_id,)
+        )
+        return [_item(row) for row in await cursor.fetchall()]
@@ -0,0 +1,27 @@
+"""Import-time budget of the entry modules, enforced with scripts/bench_import.py."""
+import os
+import subprocess
+import sys
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS)
+import bench_import  # noqa: E402
+from subprocess_env import child_env  # noqa: E402
+
+
+@pytest.mark.parametrize("module", sorted(bench_import.DEFERRED))
+def test_heavy_imports_are_deferred(module, tmp_path):
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=child_env(),
+                            capture_output=True, text=True, check=True).stdout.split()
+    assert not bench_import.DEFERRED[module] & set(loaded)
+    assert os.listdir(tmp_path) == []
+
+
+def test_import_time_budget():
+    # BENCH_IMPORT_SCALE multiplies the budgets on slow machines, like --scale
+    proc = subprocess.run([sys.executable, os.path.join(SCRIPTS, "bench_import.py"), "--check",
+                           "--scale", os.environ.get("BENCH_IMPORT_SCALE", "1.0")],
+                          env=child_env(), capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
@@ -0,0 +1,35 @@
+import asyncio
+from bili_scraper.persist import Persist
+
+
+def run_with_persist(tmp_path, steps):
+    async def main():
+        persist = Persist(str(tmp_path / "data.sqlite"))
+        await persist.init()
+        try:
+            return await steps(persist)
+        finally:
+            await persist.close()
+    return asyncio.run(main())
+
+
+def test_watermarks_never_move_backwards(tmp_path):
+    async def steps(persist):
+        await persist.save_watermarks({"kw": (200, "BV2")}, updated_at=1)
+        await persist.save_watermarks({"kw": (100, "BV1")}, updated_at=2)
+        return await persist.load_watermarks()
+
+    assert run_with_persist(tmp_path, steps) == {"kw": 200}
+
+
+def test_watermark_saved_after_keyword_stats(tmp_path):
+    # A keyword whose first crawl found nothing gets a keyword_state row without a watermark
+    async def steps(persist):
+        await persist.save_keyword_stats({"kw": {"results": 0, "matched": 0, "done": True}}, updated_at=1)
+        await persist.save_watermarks({"kw": (100, "BV1")}, updated_at=2)
+        cursor = await persist.conn.execute("SELECT last_pubdate, last_bvid FROM keyword_state WHERE keyword='kw'")
+        return await persist.load_watermarks(), await cursor.fetchone()
+
+    watermarks, row = run_with_persist(tmp_path, steps)
+    assert watermarks == {"kw": 100}
+    assert tuple(row) == (100, "BV1")